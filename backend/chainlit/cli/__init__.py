@@ -1,5 +1,6 @@
 import asyncio
 import os
+import socket
 
 import click
 import nest_asyncio
@@ -87,19 +88,26 @@ def run_chainlit(target: str):
 
     log_level = "debug" if config.run.debug else "error"
 
+    server_config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        ws=ws_protocol,
+        log_level=log_level,
+        ws_per_message_deflate=ws_per_message_deflate,
+        ssl_keyfile=ssl_keyfile,
+        ssl_certfile=ssl_certfile,
+    )
+
+    if config.run.workers > 1:
+        from chainlit.cli.workers import Supervisor
+
+        Supervisor(server_config, config.run.workers).run()
+        return
+
     # Start the server
     async def start():
-        config = uvicorn.Config(
-            app,
-            host=host,
-            port=port,
-            ws=ws_protocol,
-            log_level=log_level,
-            ws_per_message_deflate=ws_per_message_deflate,
-            ssl_keyfile=ssl_keyfile,
-            ssl_certfile=ssl_certfile,
-        )
-        server = uvicorn.Server(config)
+        server = uvicorn.Server(server_config)
         await server.serve()
 
     # Run the asyncio event loop instead of uvloop to enable re entrance
@@ -161,6 +169,13 @@ def run_chainlit(target: str):
     envvar="CHAINLIT_SSL_KEY",
     help="Specify the file path for the SSL key",
 )
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    envvar="CHAINLIT_WORKERS",
+    help="Number of worker processes, sessions stick to the worker they started on.",
+)
 @click.option("--host", help="Specify a different host to run the server on")
 @click.option("--port", help="Specify a different port to run the server on")
 @click.option("--root-path", help="Specify a different root path to run the server on")
@@ -173,6 +188,7 @@ def chainlit_run(
     no_cache,
     ssl_cert,
     ssl_key,
+    workers,
     host,
     port,
     root_path,
@@ -190,6 +206,13 @@ def chainlit_run(
         os.environ["CHAINLIT_SSL_KEY"] = ssl_key
     if root_path:
         os.environ["CHAINLIT_ROOT_PATH"] = root_path
+    if workers < 1:
+        raise click.UsageError("--workers must be at least 1.")
+    if workers > 1:
+        if watch:
+            raise click.UsageError("--watch can't be used with several workers.")
+        if not hasattr(socket, "send_fds"):
+            raise click.UsageError("Several workers are only supported on Unix.")
     if ci:
         logger.info("Running in CI mode")
 
@@ -204,6 +227,7 @@ def chainlit_run(
     config.run.watch = watch
     config.run.ssl_cert = ssl_cert
     config.run.ssl_key = ssl_key
+    config.run.workers = workers
 
     run_chainlit(target)
 
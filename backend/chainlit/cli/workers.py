@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import uvicorn
+
+from chainlit.auth.jwt import get_jwt_secret
+from chainlit.config import config as chainlit_config
+from chainlit.logger import logger
+
+if TYPE_CHECKING:
+    from uvicorn._types import ASGIApplication
+
+# Cookie set by the frontend with its session id before connecting the socket
+SESSION_COOKIE = "X-Chainlit-Session-id"
+
+# Exit code of a worker that must not be restarted
+EXIT_CONFIG_ERROR = 3
+
+# How long to wait for the head of a request before routing it blindly
+HEADERS_TIMEOUT = 1.0
+MAX_HEADERS_SIZE = 65536
+
+
+def get_affinity_key(request: bytes) -> Optional[str]:
+    """
+    Return the session id a request belongs to, from the `sessionId` or
+    `session_id` query parameter, or else the session cookie, if any.
+
+    The query parameter comes first: it is set per socket while the cookie is
+    shared by all the tabs of a browser.
+    """
+    head = request.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+    request_line, *headers = head.split("\r\n")
+
+    parts = request_line.split(" ")
+    if len(parts) == 3:
+        query = parse_qs(urlsplit(parts[1]).query)
+        for name in ("sessionId", "session_id"):
+            if query.get(name):
+                return query[name][0]
+
+    for header in headers:
+        name, _, value = header.partition(":")
+        if name.strip().lower() != "cookie":
+            continue
+        for cookie in value.split(";"):
+            cookie_name, _, cookie_value = cookie.strip().partition("=")
+            if cookie_name == SESSION_COOKIE and cookie_value:
+                return cookie_value
+
+    return None
+
+
+class CloseConnectionMiddleware:
+    """
+    Close the connection after each HTTP response.
+
+    Connections are routed once, from their first request. The next request of
+    a kept-alive or pooled connection may belong to another session, closing it
+    sends that request through the supervisor again. Websockets are untouched.
+    """
+
+    def __init__(self, app: "ASGIApplication"):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_closing(message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() != b"connection"
+                ]
+                message = {**message, "headers": [*headers, (b"connection", b"close")]}
+            await send(message)
+
+        return await self.app(scope, receive, send_closing)
+
+
+def secret_digest() -> str:
+    return hashlib.sha256((get_jwt_secret() or "").encode()).hexdigest()
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    Uvicorn server serving the connections the supervisor hands over on
+    `channel`, instead of accepting them from a listening socket.
+    """
+
+    def __init__(self, config: uvicorn.Config, channel: socket.socket, digest: str):
+        super().__init__(config)
+        self.channel = channel
+        self.digest = digest
+
+    def create_protocol(
+        self, _loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> asyncio.Protocol:
+        return self.config.http_protocol_class(  # type: ignore[call-arg]
+            config=self.config,
+            server_state=self.server_state,
+            app_state=self.lifespan.state,
+            _loop=_loop,
+        )
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        self.config.loaded_app = CloseConnectionMiddleware(self.config.loaded_app)
+        await super().startup(sockets=[])
+
+        # Tokens and signed URLs issued by a worker must be valid on the others
+        if secret_digest() != self.digest:
+            logger.error(
+                "CHAINLIT_AUTH_SECRET differs from the other workers, set it in the environment."
+            )
+            sys.exit(EXIT_CONFIG_ERROR)
+
+        self.channel.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.channel.fileno(), self.receive)
+
+    def receive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                _, fds, _, _ = socket.recv_fds(self.channel, 1, 1)
+            except BlockingIOError:
+                return
+            if not fds:
+                # The supervisor is gone
+                loop.remove_reader(self.channel.fileno())
+                self.should_exit = True
+                return
+            connection = socket.socket(fileno=fds[0])
+            connection.setblocking(False)
+            loop.create_task(
+                loop.connect_accepted_socket(
+                    self.create_protocol, connection, ssl=self.config.ssl
+                )
+            )
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        asyncio.get_running_loop().remove_reader(self.channel.fileno())
+        await super().shutdown(sockets=[])
+
+
+def run_worker(
+    config: uvicorn.Config,
+    index: int,
+    channel: socket.socket,
+    digest: str,
+    inherited: List[socket.socket],
+):
+    # Drop the sockets of the supervisor copied by fork
+    for sock in inherited:
+        sock.close()
+    if index:
+        # Only open the browser once
+        chainlit_config.run.headless = True
+    asyncio.run(WorkerServer(config, channel, digest).serve())
+
+
+class Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.channel: Optional[socket.socket] = None
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+
+    @property
+    def is_alive(self) -> bool:
+        return bool(self.process and self.process.is_alive())
+
+
+class Supervisor:
+    """
+    Pre-fork supervisor running the app on several worker processes.
+
+    The supervisor accepts the connections and passes each one to a worker,
+    picked from the session id of its first request so the socket.io polling
+    requests, the websocket upgrade and the REST calls of a session are served
+    by the worker holding it. Requests without a session id are spread evenly.
+    Behind TLS the requests can't be read, the client address is used instead.
+
+    Dead workers are restarted.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = [Worker(index) for index in range(workers)]
+        self.round_robin = itertools.cycle(range(workers))
+        self.selector = selectors.DefaultSelector()
+        self.pending: Dict[socket.socket, float] = {}
+        self.partial: List[socket.socket] = []
+        self.digest = ""
+        self.exit_signal: Optional[int] = None
+        self.should_exit = False
+        self.failed = False
+        self.context = multiprocessing.get_context("fork")
+
+    def spawn(self, worker: Worker, listener: socket.socket):
+        if worker.channel:
+            worker.channel.close()
+        worker.channel, child_channel = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM
+        )
+        worker.channel.settimeout(HEADERS_TIMEOUT)
+        inherited = [listener, *self.pending, *self.partial] + [
+            w.channel for w in self.workers if w.channel
+        ]
+        worker.process = self.context.Process(
+            target=run_worker,
+            args=(self.config, worker.index, child_channel, self.digest, inherited),
+            name=f"chainlit-worker-{worker.index}",
+        )
+        worker.process.start()
+        child_channel.close()
+        logger.info(f"Started worker {worker.index} [{worker.process.pid}]")
+
+    def check_workers(self, listener: socket.socket):
+        for worker in self.workers:
+            if worker.is_alive or not worker.process:
+                continue
+            if worker.process.exitcode == EXIT_CONFIG_ERROR:
+                self.failed = self.should_exit = True
+                return
+            logger.warning(
+                f"Worker {worker.index} exited with code {worker.process.exitcode}, restarting it"
+            )
+            self.spawn(worker, listener)
+
+    def dispatch(self, connection: socket.socket, key: Optional[str]):
+        self.pending.pop(connection, None)
+        index = (
+            zlib.crc32(key.encode()) % len(self.workers)
+            if key
+            else next(self.round_robin)
+        )
+        # Fall back to the next live worker while one restarts
+        for offset in range(len(self.workers)):
+            worker = self.workers[(index + offset) % len(self.workers)]
+            if worker.is_alive and worker.channel:
+                try:
+                    socket.send_fds(worker.channel, [b"c"], [connection.fileno()])
+                    break
+                except OSError as e:
+                    logger.warning(f"Failed to pass a connection to worker: {e}")
+        connection.close()
+
+    def peek(self, connection: socket.socket):
+        try:
+            head = connection.recv(MAX_HEADERS_SIZE, socket.MSG_PEEK)
+        except BlockingIOError:
+            self.selector.register(connection, selectors.EVENT_READ)
+            return
+        except OSError:
+            head = b""
+        if not head:
+            # Closed before sending anything
+            self.pending.pop(connection, None)
+            connection.close()
+        elif b"\r\n\r\n" in head or len(head) >= MAX_HEADERS_SIZE:
+            self.dispatch(connection, get_affinity_key(head))
+        elif time.monotonic() >= self.pending[connection]:
+            self.dispatch(connection, None)
+        else:
+            # Check again on the next tick, the socket stays readable meanwhile
+            self.partial.append(connection)
+
+    def accept(self, listener: socket.socket):
+        while True:
+            try:
+                connection, address = listener.accept()
+            except BlockingIOError:
+                return
+            if self.config.is_ssl:
+                self.dispatch(connection, str(address[0]) if address else None)
+            else:
+                connection.setblocking(False)
+                self.pending[connection] = time.monotonic() + HEADERS_TIMEOUT
+                self.selector.register(connection, selectors.EVENT_READ)
+
+    def handle_exit(self, sig: int, frame: Any):
+        self.exit_signal = sig
+        self.should_exit = True
+
+    def run(self):
+        listener = self.config.bind_socket()
+        listener.listen(self.config.backlog)
+        listener.setblocking(False)
+
+        # Generate a secret shared by the workers if none is configured
+        if not get_jwt_secret():
+            from chainlit.secret import random_secret
+
+            os.environ["CHAINLIT_AUTH_SECRET"] = random_secret()
+        self.digest = secret_digest()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.handle_exit)
+
+        for worker in self.workers:
+            self.spawn(worker, listener)
+
+        self.selector.register(listener, selectors.EVENT_READ)
+        try:
+            while not self.should_exit:
+                partial, self.partial = self.partial, []
+                for key, _ in self.selector.select(0.01 if partial else 0.5):
+                    if key.fileobj is listener:
+                        self.accept(listener)
+                    else:
+                        connection = key.fileobj
+                        self.selector.unregister(connection)
+                        self.peek(connection)  # type: ignore[arg-type]
+                for connection in partial:
+                    self.peek(connection)
+                self.check_workers(listener)
+        finally:
+            self.shutdown(listener)
+
+        if self.failed:
+            sys.exit(EXIT_CONFIG_ERROR)
+
+    def shutdown(self, listener: socket.socket):
+        logger.info("Shutting down workers")
+        self.selector.close()
+        listener.close()
+        for connection in list(self.pending):
+            connection.close()
+        for worker in self.workers:
+            # Ctrl+C already reached the whole process group
+            if worker.is_alive and worker.process and self.exit_signal != signal.SIGINT:
+                # Let them save their sessions and close their pools
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                worker.process.join(self.config.timeout_graceful_shutdown or 30)
+                if worker.process.is_alive():
+                    worker.process.kill()
+            if worker.channel:
+                worker.channel.close()
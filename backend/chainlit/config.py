@@ -75,6 +75,12 @@ session_timeout = 3600
 # Duration (in seconds) of the user session expiry
 user_session_timeout = 1296000  # 15 days
 
+# Maximum number of sessions kept in memory, the least recently disconnected ones are dropped first
+# max_sessions = 10000
+
+# Approximate memory (in bytes) the sessions may hold before the least recently disconnected ones are dropped
+# max_sessions_memory = 1073741824  # 1 GiB
+
 # Enable third parties caching (e.g., LangChain cache)
 cache = false
 
@@ -236,6 +242,7 @@ class RunSettings(BaseModel):
     no_cache: bool = False
     debug: bool = False
     ci: bool = False
+    workers: int = 1
 
 
 class PaletteOptions(BaseModel):
@@ -411,6 +418,10 @@ class ProjectSettings(BaseModel):
     session_timeout: int = 300
     # Duration (in seconds) of the user session expiry
     user_session_timeout: int = 1296000  # 15 days
+    # Maximum number of sessions kept in memory, the least recently disconnected ones are dropped first
+    max_sessions: Optional[int] = None
+    # Approximate memory (in bytes) the sessions may hold before the least recently disconnected ones are dropped
+    max_sessions_memory: Optional[int] = None
     # Enable third parties caching (e.g LangChain cache)
     cache: bool = False
     # Whether to persist user environment variables (API keys) to the database
@@ -1,6 +1,6 @@
 import os
 import warnings
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from .base import BaseDataLayer
 from .utils import (
@@ -11,6 +11,16 @@ _data_layer: Optional[BaseDataLayer] = None
 _data_layer_initialized = False
 
 
+def get_step_buffer_settings() -> Dict[str, Any]:
+    """Settings of the opt-in step buffer of the data layers, from the environment."""
+    return {
+        "buffer_steps": os.getenv("DATA_LAYER_BUFFER_STEPS", "false").lower()
+        in ["true", "1", "yes"],
+        "step_buffer_size": int(os.getenv("DATA_LAYER_STEP_BUFFER_SIZE", 100)),
+        "step_flush_interval": float(os.getenv("DATA_LAYER_STEP_FLUSH_INTERVAL", 0.5)),
+    }
+
+
 def get_data_layer():
     global _data_layer, _data_layer_initialized
 
@@ -95,6 +105,23 @@ def get_data_layer():
                         storage_account=azure_storage_account,
                         storage_key=azure_storage_key,
                     )
+                elif local_storage_path := os.getenv("LOCAL_STORAGE_PATH"):
+                    from chainlit.data.storage_clients.local import (
+                        LocalStorageClient,
+                    )
+
+                    storage_client = LocalStorageClient(root=local_storage_path)
+
+                # Opt-in cache of the generated read URLs
+                url_cache_size = int(os.getenv("STORAGE_URL_CACHE_SIZE", 0))
+                if storage_client is not None and url_cache_size > 0:
+                    from chainlit.data.storage_clients.cache import (
+                        CachedStorageClient,
+                    )
+
+                    storage_client = CachedStorageClient(
+                        storage_client, max_size=url_cache_size
+                    )
 
                 parsed = urlparse(database_url)
                 scheme = parsed.scheme or ""
@@ -115,7 +142,9 @@ def get_data_layer():
                     from .chainlit_data_layer import ChainlitDataLayer
 
                     _data_layer = ChainlitDataLayer(
-                        database_url=database_url, storage_client=storage_client
+                        database_url=database_url,
+                        storage_client=storage_client,
+                        **get_step_buffer_settings(),
                     )
             elif api_key := os.environ.get("LITERAL_API_KEY"):
                 # When LITERAL_API_KEY is defined, use Literal AI data layer
@@ -125,7 +154,9 @@ def get_data_layer():
                 server = os.environ.get("LITERAL_API_URL") or os.environ.get(
                     "LITERAL_SERVER"
                 )
-                _data_layer = LiteralDataLayer(api_key=api_key, server=server)
+                _data_layer = LiteralDataLayer(
+                    api_key=api_key, server=server, **get_step_buffer_settings()
+                )
 
         _data_layer_initialized = True
 
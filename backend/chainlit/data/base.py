@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
 
 from chainlit.types import (
     Feedback,
@@ -20,6 +21,11 @@ if TYPE_CHECKING:
 class BaseDataLayer(ABC):
     """Base class for data persistence."""
 
+    # Whether update_thread merges the given metadata into the stored one, in
+    # which case only the changed top-level keys are sent. Such layers return
+    # True from update_thread once the write is committed.
+    merges_thread_metadata = False
+
     @abstractmethod
     async def get_user(self, identifier: str) -> Optional["PersistedUser"]:
         pass
@@ -87,6 +93,10 @@ class BaseDataLayer(ABC):
     ) -> "PaginatedResponse[ThreadDict]":
         pass
 
+    async def count_threads(self, filters: "ThreadFilter") -> Optional[int]:
+        """Count the threads matching the filters, None if not supported."""
+        return None
+
     @abstractmethod
     async def get_thread(self, thread_id: str) -> "Optional[ThreadDict]":
         pass
@@ -105,3 +115,19 @@ class BaseDataLayer(ABC):
     @abstractmethod
     async def build_debug_url(self) -> str:
         pass
+
+    async def connect(self) -> None:
+        """Open connections ahead of the first request on app startup."""
+        pass
+
+    async def close(self) -> None:
+        """Flush pending writes and release resources on app shutdown."""
+        pass
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[None]:
+        """
+        Group the writes issued within the block, including those of the tasks
+        it spawns, into a single commit when the data layer supports it.
+        """
+        yield
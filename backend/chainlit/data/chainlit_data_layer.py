@@ -1,17 +1,23 @@
 import asyncio
 import atexit
 import json
+import os
+import re
 import signal
 import uuid
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import aiofiles
 import asyncpg  # type: ignore
 
 from chainlit.data.base import BaseDataLayer
 from chainlit.data.storage_clients.base import BaseStorageClient
-from chainlit.data.utils import queue_until_user_message
+from chainlit.data.utils import (
+    decode_cursor,
+    encode_cursor,
+    queue_until_user_message,
+)
+from chainlit.data.write_buffer import WriteBuffer, merge_non_null
 from chainlit.element import ElementDict
 from chainlit.logger import logger
 from chainlit.step import StepDict
@@ -23,43 +29,169 @@ from chainlit.types import (
     Pagination,
     ThreadDict,
     ThreadFilter,
+    ThreadSearchMatchDict,
 )
 from chainlit.user import PersistedUser, User
 
-# Import for runtime usage (isinstance checks)
-try:
-    from chainlit.data.storage_clients.gcs import GCSStorageClient
-except ImportError:
-    GCSStorageClient = None  # type: ignore[assignment,misc]
-
 if TYPE_CHECKING:
-    from chainlit.data.storage_clients.gcs import GCSStorageClient
     from chainlit.element import Element, ElementDict
     from chainlit.step import StepDict
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Missing threads and parent steps are created as placeholder rows in
+# data-modifying CTEs, so that an upsert costs a single round-trip instead of
+# existence checks followed by conditional inserts. Existing rows are left
+# untouched by the placeholders.
+STEP_UPSERT_QUERY = """
+WITH thread AS (
+    INSERT INTO "Thread" (id, metadata, "updatedAt")
+    SELECT $2, '{}', $9
+    WHERE $2 IS NOT NULL
+    ON CONFLICT (id) DO NOTHING
+), parent AS (
+    INSERT INTO "Step" (
+        id, metadata, type, "startTime", "endTime", "showInput", "isError"
+    )
+    SELECT $3, '{}', 'run', $9, $9, 'json', false
+    WHERE $3 IS NOT NULL
+    ON CONFLICT (id) DO NOTHING
+)
+INSERT INTO "Step" (
+    id, "threadId", "parentId", input, metadata, name, output,
+    type, "startTime", "endTime", "showInput", "isError"
+) VALUES (
+    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12
+)
+ON CONFLICT (id) DO UPDATE SET
+    "parentId" = COALESCE(EXCLUDED."parentId", "Step"."parentId"),
+    input = COALESCE(EXCLUDED.input, "Step".input),
+    metadata = CASE
+        WHEN EXCLUDED.metadata <> '{}' THEN EXCLUDED.metadata
+        ELSE "Step".metadata
+    END,
+    name = COALESCE(EXCLUDED.name, "Step".name),
+    output = COALESCE(EXCLUDED.output, "Step".output),
+    type = CASE
+        WHEN EXCLUDED.type = 'run' THEN "Step".type
+        ELSE EXCLUDED.type
+    END,
+    "threadId" = COALESCE(EXCLUDED."threadId", "Step"."threadId"),
+    "endTime" = COALESCE(EXCLUDED."endTime", "Step"."endTime"),
+    "startTime" = LEAST(EXCLUDED."startTime", "Step"."startTime"),
+    "showInput" = COALESCE(EXCLUDED."showInput", "Step"."showInput"),
+    "isError" = COALESCE(EXCLUDED."isError", "Step"."isError")
+"""
+
+ELEMENT_UPSERT_QUERY = """
+WITH thread AS (
+    INSERT INTO "Thread" (id, metadata, "updatedAt")
+    SELECT $2, '{}', $15
+    WHERE $2 IS NOT NULL
+    ON CONFLICT (id) DO NOTHING
+), step AS (
+    INSERT INTO "Step" (
+        id, metadata, type, "startTime", "endTime", "showInput", "isError"
+    )
+    SELECT $3, '{}', 'run', $15, $15, 'json', false
+    WHERE $3 IS NOT NULL
+    ON CONFLICT (id) DO NOTHING
+)
+INSERT INTO "Element" (
+    id, "threadId", "stepId", metadata, mime, name, "objectKey", url,
+    "chainlitKey", display, size, language, page, props
+) VALUES (
+    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14
+)
+ON CONFLICT (id) DO UPDATE SET
+    props = EXCLUDED.props
+"""
+
 
 class ChainlitDataLayer(BaseDataLayer):
+    merges_thread_metadata = True
+
     def __init__(
         self,
         database_url: str,
         storage_client: Optional[BaseStorageClient] = None,
         show_logger: bool = False,
+        buffer_steps: bool = False,
+        step_buffer_size: int = 100,
+        step_flush_interval: float = 0.5,
+        pool_min_size: Optional[int] = None,
+        pool_max_size: Optional[int] = None,
+        statement_cache_size: Optional[int] = None,
+        pool_max_queries: Optional[int] = None,
+        pool_idle_timeout: Optional[float] = None,
+        full_text_search: Optional[bool] = None,
     ):
         self.database_url = database_url
         self.pool: Optional[asyncpg.Pool] = None
         self.storage_client = storage_client
         self.show_logger = show_logger
 
+        # Pool settings, falling back to environment variables then to the
+        # asyncpg defaults. Connections are recycled after `pool_max_queries`
+        # queries and closed after `pool_idle_timeout` seconds of inactivity.
+        self.pool_min_size = _get_setting(pool_min_size, "DATABASE_POOL_MIN_SIZE", 10)
+        self.pool_max_size = _get_setting(pool_max_size, "DATABASE_POOL_MAX_SIZE", 10)
+        self.statement_cache_size = _get_setting(
+            statement_cache_size, "DATABASE_STATEMENT_CACHE_SIZE", 100
+        )
+        self.pool_max_queries = _get_setting(
+            pool_max_queries, "DATABASE_POOL_MAX_QUERIES", 50000
+        )
+        self.pool_idle_timeout = float(
+            _get_setting(pool_idle_timeout, "DATABASE_POOL_IDLE_TIMEOUT", 300.0)
+        )
+        self._pool_lock = asyncio.Lock()
+
+        # Search threads through the "searchVector" columns added by
+        # postgres_schema.sql. Detected on the first search when None.
+        self.full_text_search = full_text_search
+
+        # Write-behind buffer coalescing step creates/updates by step id. The
+        # steps of every thread share it, a flush writes them in one batch.
+        # Disabled by default since buffered steps are lost on a hard crash.
+        self.step_buffer: Optional[WriteBuffer[StepDict]] = (
+            WriteBuffer(
+                self._flush_steps,
+                max_size=step_buffer_size,
+                flush_interval=step_flush_interval,
+                merge_fn=merge_non_null,
+            )
+            if buffer_steps
+            else None
+        )
+
         # Register cleanup handlers for application termination
         atexit.register(self._sync_cleanup)
         for sig in (signal.SIGINT, signal.SIGTERM):
             signal.signal(sig, self._signal_handler)
 
     async def connect(self):
-        if not self.pool:
-            self.pool = await asyncpg.create_pool(self.database_url)
+        async with self._pool_lock:
+            if not self.pool:
+                self.pool = await asyncpg.create_pool(
+                    self.database_url,
+                    min_size=min(self.pool_min_size, self.pool_max_size),
+                    max_size=self.pool_max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    max_queries=self.pool_max_queries,
+                    max_inactive_connection_lifetime=self.pool_idle_timeout,
+                    init=self._init_connection,
+                )
+
+    async def _init_connection(self, connection: asyncpg.Connection):
+        # Let asyncpg encode/decode json columns (metadata, props) natively
+        for json_type in ("json", "jsonb"):
+            await connection.set_type_codec(
+                json_type,
+                encoder=json.dumps,
+                decoder=json.loads,
+                schema="pg_catalog",
+            )
 
     async def get_current_timestamp(self) -> datetime:
         return datetime.now()
@@ -105,7 +237,7 @@ class ChainlitDataLayer(BaseDataLayer):
             id=str(row.get("id")),
             identifier=str(row.get("identifier")),
             createdAt=row.get("createdAt").isoformat(),  # type: ignore
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=row.get("metadata") or {},
         )
 
     async def create_user(self, user: User) -> Optional[PersistedUser]:
@@ -120,7 +252,7 @@ class ChainlitDataLayer(BaseDataLayer):
         params = {
             "id": str(uuid.uuid4()),
             "identifier": user.identifier,
-            "metadata": json.dumps(user.metadata),
+            "metadata": user.metadata,
             "created_at": now,
             "updated_at": now,
         }
@@ -131,7 +263,7 @@ class ChainlitDataLayer(BaseDataLayer):
             id=str(row.get("id")),
             identifier=str(row.get("identifier")),
             createdAt=row.get("createdAt").isoformat(),  # type: ignore
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=row.get("metadata") or {},
         )
 
     async def delete_feedback(self, feedback_id: str) -> bool:
@@ -171,33 +303,11 @@ class ChainlitDataLayer(BaseDataLayer):
         if not element.for_id:
             return
 
-        if element.thread_id:
-            query = 'SELECT id FROM "Thread" WHERE id = $1'
-            results = await self.execute_query(query, {"thread_id": element.thread_id})
-            if not results:
-                await self.update_thread(thread_id=element.thread_id)
-
-        if element.for_id:
-            query = 'SELECT id FROM "Step" WHERE id = $1'
-            results = await self.execute_query(query, {"step_id": element.for_id})
-            if not results:
-                await self.create_step(
-                    {
-                        "id": element.for_id,
-                        "metadata": {},
-                        "type": "run",
-                        "start_time": await self.get_current_timestamp(),
-                        "end_time": await self.get_current_timestamp(),
-                    }
-                )
-        content: Optional[Union[bytes, str]] = None
+        if self.step_buffer is not None:
+            # Make sure the step the element is attached to is written first
+            await self.step_buffer.flush()
 
-        if element.path:
-            async with aiofiles.open(element.path, "rb") as f:
-                content = await f.read()
-        elif element.content:
-            content = element.content
-        elif not element.url:
+        if not (element.path or element.content or element.url):
             raise ValueError("Element url, path or content must be provided")
 
         if element.thread_id:
@@ -205,46 +315,37 @@ class ChainlitDataLayer(BaseDataLayer):
         else:
             path = f"files/{element.id}"
 
-        if content is not None:
-            content_disposition = (
-                f'attachment; filename="{element.name}"'
-                if not (
-                    GCSStorageClient is not None
-                    and isinstance(self.storage_client, GCSStorageClient)
-                )
-                else None
+        # Clients that cannot store it, like GCS, ignore it
+        content_disposition = f'attachment; filename="{element.name}"'
+        if element.path:
+            # Streamed from disk, the file is never loaded in memory
+            await self.storage_client.upload_path(
+                object_key=path,
+                path=element.path,
+                mime=element.mime or "application/octet-stream",
+                overwrite=True,
+                content_disposition=content_disposition,
             )
+        elif element.content:
             await self.storage_client.upload_file(
                 object_key=path,
-                data=content,
+                data=element.content,
                 mime=element.mime or "application/octet-stream",
                 overwrite=True,
                 content_disposition=content_disposition,
             )
 
-        query = """
-        INSERT INTO "Element" (
-            id, "threadId", "stepId", metadata, mime, name, "objectKey", url,
-            "chainlitKey", display, size, language, page, props
-        ) VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14
-        )
-        ON CONFLICT (id) DO UPDATE SET
-            props = EXCLUDED.props
-        """
         params = {
             "id": element.id,
             "thread_id": element.thread_id,
             "step_id": element.for_id,
-            "metadata": json.dumps(
-                {
-                    "size": element.size,
-                    "language": element.language,
-                    "display": element.display,
-                    "type": element.type,
-                    "page": getattr(element, "page", None),
-                }
-            ),
+            "metadata": {
+                "size": element.size,
+                "language": element.language,
+                "display": element.display,
+                "type": element.type,
+                "page": getattr(element, "page", None),
+            },
             "mime": element.mime,
             "name": element.name,
             "object_key": path,
@@ -254,9 +355,10 @@ class ChainlitDataLayer(BaseDataLayer):
             "size": element.size,
             "language": element.language,
             "page": getattr(element, "page", None),
-            "props": json.dumps(getattr(element, "props", {})),
+            "props": getattr(element, "props", {}),
+            "timestamp": await self.get_current_timestamp(),
         }
-        await self.execute_query(query, params)
+        await self.execute_query(ELEMENT_UPSERT_QUERY, params)
 
     async def get_element(
         self, thread_id: str, element_id: str
@@ -273,7 +375,7 @@ class ChainlitDataLayer(BaseDataLayer):
             return None
 
         row = results[0]
-        metadata = json.loads(row.get("metadata", "{}"))
+        metadata = row.get("metadata") or {}
 
         return ElementDict(
             id=str(row["id"]),
@@ -291,7 +393,7 @@ class ChainlitDataLayer(BaseDataLayer):
             page=row["page"],
             autoPlay=row.get("autoPlay"),
             playerConfig=row.get("playerConfig"),
-            props=json.loads(row.get("props", "{}")),
+            props=row.get("props") or {},
         )
 
     @queue_until_user_message()
@@ -321,67 +423,25 @@ class ChainlitDataLayer(BaseDataLayer):
 
     @queue_until_user_message()
     async def create_step(self, step_dict: StepDict):
-        if step_dict.get("threadId"):
-            thread_query = 'SELECT id FROM "Thread" WHERE id = $1'
-            thread_results = await self.execute_query(
-                thread_query, {"thread_id": step_dict["threadId"]}
-            )
-            if not thread_results:
-                await self.update_thread(thread_id=step_dict["threadId"])
+        if self.step_buffer is not None:
+            await self.step_buffer.put(step_dict["id"], step_dict)
+            return
 
-        if step_dict.get("parentId"):
-            parent_query = 'SELECT id FROM "Step" WHERE id = $1'
-            parent_results = await self.execute_query(
-                parent_query, {"parent_id": step_dict["parentId"]}
-            )
-            if not parent_results:
-                await self.create_step(
-                    {
-                        "id": step_dict["parentId"],
-                        "metadata": {},
-                        "type": "run",
-                        "createdAt": step_dict.get("createdAt"),
-                    }
-                )
-
-        query = """
-        INSERT INTO "Step" (
-            id, "threadId", "parentId", input, metadata, name, output,
-            type, "startTime", "endTime", "showInput", "isError"
-        ) VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12
-        )
-        ON CONFLICT (id) DO UPDATE SET
-            "parentId" = COALESCE(EXCLUDED."parentId", "Step"."parentId"),
-            input = COALESCE(EXCLUDED.input, "Step".input),
-            metadata = CASE 
-                WHEN EXCLUDED.metadata <> '{}' THEN EXCLUDED.metadata 
-                ELSE "Step".metadata 
-            END,
-            name = COALESCE(EXCLUDED.name, "Step".name),
-            output = COALESCE(EXCLUDED.output, "Step".output),
-            type = CASE 
-                WHEN EXCLUDED.type = 'run' THEN "Step".type 
-                ELSE EXCLUDED.type 
-            END,
-            "threadId" = COALESCE(EXCLUDED."threadId", "Step"."threadId"),
-            "endTime" = COALESCE(EXCLUDED."endTime", "Step"."endTime"),
-            "startTime" = LEAST(EXCLUDED."startTime", "Step"."startTime"),
-            "showInput" = COALESCE(EXCLUDED."showInput", "Step"."showInput"),
-            "isError" = COALESCE(EXCLUDED."isError", "Step"."isError")
-        """
+        params = await self._get_step_params(step_dict)
+        await self.execute_query(STEP_UPSERT_QUERY, params)
 
+    async def _get_step_params(self, step_dict: StepDict) -> Dict[str, Any]:
         timestamp = await self.get_current_timestamp()
         created_at = step_dict.get("createdAt")
         if created_at:
             timestamp = datetime.strptime(created_at, ISO_FORMAT)
 
-        params = {
+        return {
             "id": step_dict["id"],
             "thread_id": step_dict.get("threadId"),
             "parent_id": step_dict.get("parentId"),
             "input": step_dict.get("input"),
-            "metadata": json.dumps(step_dict.get("metadata", {})),
+            "metadata": step_dict.get("metadata", {}),
             "name": step_dict.get("name"),
             "output": step_dict.get("output"),
             "type": step_dict["type"],
@@ -390,7 +450,22 @@ class ChainlitDataLayer(BaseDataLayer):
             "show_input": str(step_dict.get("showInput", "json")),
             "is_error": step_dict.get("isError", False),
         }
-        await self.execute_query(query, params)
+
+    async def _flush_steps(self, step_dicts: List[StepDict]):
+        """Write a batch of buffered steps in a single transaction."""
+        if self.show_logger:
+            logger.info(f"asyncpg: flushing {len(step_dicts)} buffered steps")
+
+        step_params = [await self._get_step_params(step) for step in step_dicts]
+
+        if not self.pool:
+            await self.connect()
+
+        async with self.pool.acquire() as connection:  # type: ignore
+            async with connection.transaction():
+                await connection.executemany(
+                    STEP_UPSERT_QUERY, [tuple(p.values()) for p in step_params]
+                )
 
     @queue_until_user_message()
     async def update_step(self, step_dict: StepDict):
@@ -398,6 +473,10 @@ class ChainlitDataLayer(BaseDataLayer):
 
     @queue_until_user_message()
     async def delete_step(self, step_id: str):
+        if self.step_buffer is not None:
+            self.step_buffer.discard(lambda key, _: key == step_id)
+            await self.step_buffer.flush()
+
         # Delete associated elements and feedbacks first
         await self.execute_query(
             'DELETE FROM "Element" WHERE "stepId" = $1', {"step_id": step_id}
@@ -423,6 +502,9 @@ class ChainlitDataLayer(BaseDataLayer):
         return results[0]["identifier"]
 
     async def delete_thread(self, thread_id: str):
+        if self.step_buffer is not None:
+            self.step_buffer.discard(lambda _, step: step.get("threadId") == thread_id)
+
         elements_query = """
         SELECT * FROM "Element" 
         WHERE "threadId" = $1
@@ -431,50 +513,114 @@ class ChainlitDataLayer(BaseDataLayer):
             elements_query, {"thread_id": thread_id}
         )
 
-        if self.storage_client is not None:
-            for elem in elements_results:
-                if elem["objectKey"]:
-                    await self.storage_client.delete_file(object_key=elem["objectKey"])
-
         await self.execute_query(
             'DELETE FROM "Thread" WHERE id = $1', {"thread_id": thread_id}
         )
 
-    async def list_threads(
-        self, pagination: Pagination, filters: ThreadFilter
-    ) -> PaginatedResponse[ThreadDict]:
-        query = """
-        SELECT 
-            t.*, 
-            u.identifier as user_identifier,
-            (SELECT COUNT(*) FROM "Thread" WHERE "userId" = t."userId") as total
-        FROM "Thread" t
-        LEFT JOIN "User" u ON t."userId" = u.id
-        WHERE t."deletedAt" IS NULL
-        """
-        params: Dict[str, Any] = {}
-        param_count = 1
+        object_keys = [
+            elem["objectKey"] for elem in elements_results if elem["objectKey"]
+        ]
+        if self.storage_client is not None and object_keys:
+            # Files are deleted in the background, the thread is already gone
+            self.storage_client.purge_files(object_keys)
+
+    async def _use_full_text_search(self) -> bool:
+        if self.full_text_search is None:
+            results = await self.execute_query(
+                """
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'Step' AND column_name = 'searchVector'
+                """
+            )
+            self.full_text_search = bool(results)
+        return self.full_text_search
+
+    async def _build_thread_filters(
+        self, filters: ThreadFilter, params: Dict[str, Any]
+    ) -> str:
+        conditions = ['t."deletedAt" IS NULL']
 
         if filters.search:
-            query += f" AND t.name ILIKE ${param_count}"
-            params["name"] = f"%{filters.search}%"
-            param_count += 1
+            tsquery = to_prefix_tsquery(filters.search)
+            if tsquery and await self._use_full_text_search():
+                params["tsquery"] = tsquery
+                query = f"to_tsquery('simple', ${len(params)})"
+                conditions.append(
+                    f"""(
+                    t."searchVector" @@ {query}
+                    -- Correlated so only the steps of the user's threads are matched
+                    OR EXISTS (
+                        SELECT 1 FROM "Step" s
+                        WHERE s."threadId" = t.id AND s."searchVector" @@ {query}
+                    )
+                )"""
+                )
+            else:
+                params["name"] = f"%{filters.search}%"
+                conditions.append(f"t.name ILIKE ${len(params)}")
 
         if filters.userId:
-            query += f' AND t."userId" = ${param_count}'
             params["user_id"] = filters.userId
-            param_count += 1
+            conditions.append(f't."userId" = ${len(params)}')
+
+        return " AND ".join(conditions)
+
+    async def list_threads(
+        self, pagination: Pagination, filters: ThreadFilter
+    ) -> PaginatedResponse[ThreadDict]:
+        params: Dict[str, Any] = {}
+        where = await self._build_thread_filters(filters, params)
 
+        # Keyset pagination on ("updatedAt", id), served by the
+        # "Thread_userId_updatedAt_id_idx" index (see postgres_schema.sql)
         if pagination.cursor:
-            query += f' AND t."updatedAt" < (SELECT "updatedAt" FROM "Thread" WHERE id = ${param_count})'
-            params["cursor"] = pagination.cursor
-            param_count += 1
+            cursor = decode_cursor(pagination.cursor)
+            if cursor is not None:
+                # Start from the first page when the cursor is not a valid one
+                if keyset := parse_thread_keyset(cursor):
+                    params["cursor_updated_at"], params["cursor_id"] = keyset
+                    where += (
+                        f' AND (t."updatedAt", t.id) < '
+                        f"(${len(params) - 1}, ${len(params)})"
+                    )
+            else:
+                # Legacy cursor holding a bare thread id
+                params["cursor"] = pagination.cursor
+                where += f""" AND (t."updatedAt", t.id) < (
+                    SELECT "updatedAt", id FROM "Thread" WHERE id = ${len(params)}
+                )"""
+
+        search_columns = ""
+        if "tsquery" in params:
+            # Rank and highlight the best match, computed for the page only
+            query = f"to_tsquery('simple', ${list(params).index('tsquery') + 1})"
+            best_step = f"""
+                FROM "Step" s
+                WHERE s."threadId" = t.id AND s."searchVector" @@ {query}
+                ORDER BY ts_rank(s."searchVector", {query}) DESC
+                LIMIT 1
+            """
+            search_columns = f""",
+            GREATEST(
+                ts_rank(t."searchVector", {query}),
+                COALESCE((SELECT ts_rank(s."searchVector", {query}) {best_step}), 0)
+            ) AS search_rank,
+            COALESCE(
+                (SELECT ts_headline('simple', s.output, {query}, '{TS_HEADLINE_OPTIONS}') {best_step}),
+                ts_headline('simple', t.name, {query}, '{TS_HEADLINE_OPTIONS}')
+            ) AS search_snippet"""
 
-        query += f' ORDER BY t."updatedAt" DESC LIMIT ${param_count}'
         params["limit"] = pagination.first + 1
+        query = f"""
+        SELECT t.*, u.identifier as user_identifier{search_columns}
+        FROM "Thread" t
+        LEFT JOIN "User" u ON t."userId" = u.id
+        WHERE {where}
+        ORDER BY t."updatedAt" DESC, t.id DESC
+        LIMIT ${len(params)}
+        """
 
-        results = await self.execute_query(query, params)
-        threads = results
+        threads = await self.execute_query(query, params)
 
         has_next_page = len(threads) > pagination.first
         if has_next_page:
@@ -488,23 +634,41 @@ class ChainlitDataLayer(BaseDataLayer):
                 name=thread["name"],
                 userId=str(thread["userId"]) if thread["userId"] else None,
                 userIdentifier=thread["user_identifier"],
-                metadata=json.loads(thread["metadata"]),
+                metadata=thread["metadata"] or {},
                 steps=[],
                 elements=[],
                 tags=[],
             )
+            if "search_rank" in thread:
+                thread_dict["search"] = ThreadSearchMatchDict(
+                    rank=thread["search_rank"],
+                    snippet=thread["search_snippet"],
+                )
             thread_dicts.append(thread_dict)
 
+        def to_cursor(thread: Dict[str, Any]) -> str:
+            return encode_cursor([thread["updatedAt"].isoformat(), str(thread["id"])])
+
         return PaginatedResponse(
             pageInfo=PageInfo(
                 hasNextPage=has_next_page,
-                startCursor=thread_dicts[0]["id"] if thread_dicts else None,
-                endCursor=thread_dicts[-1]["id"] if thread_dicts else None,
+                startCursor=to_cursor(threads[0]) if threads else None,
+                endCursor=to_cursor(threads[-1]) if threads else None,
             ),
             data=thread_dicts,
         )
 
+    async def count_threads(self, filters: ThreadFilter) -> Optional[int]:
+        params: Dict[str, Any] = {}
+        where = await self._build_thread_filters(filters, params)
+        query = f'SELECT COUNT(*) AS total FROM "Thread" t WHERE {where}'
+        results = await self.execute_query(query, params)
+        return results[0]["total"]
+
     async def get_thread(self, thread_id: str) -> Optional[ThreadDict]:
+        if self.step_buffer is not None:
+            await self.step_buffer.flush()
+
         query = """
         SELECT t.*, u.identifier as user_identifier
         FROM "Thread" t
@@ -520,7 +684,9 @@ class ChainlitDataLayer(BaseDataLayer):
 
         # Get steps and related feedback
         steps_query = """
-        SELECT  s.*, 
+        SELECT  s.id, s."threadId", s."parentId", s.name, s.type, s.input,
+                s.output, s.metadata, s."createdAt", s."startTime",
+                s."endTime", s."showInput", s."isError",
                 f.id feedback_id, 
                 f.value feedback_value, 
                 f."comment" feedback_comment
@@ -540,11 +706,17 @@ class ChainlitDataLayer(BaseDataLayer):
         )
 
         if self.storage_client is not None:
-            for elem in elements_results:
-                if not elem["url"] and elem["objectKey"]:
-                    elem["url"] = await self.storage_client.get_read_url(
-                        object_key=elem["objectKey"],
-                    )
+            unsigned = [
+                elem
+                for elem in elements_results
+                if not elem["url"] and elem["objectKey"]
+            ]
+            if unsigned:
+                urls = await self.storage_client.get_read_urls(
+                    [elem["objectKey"] for elem in unsigned]
+                )
+                for elem in unsigned:
+                    elem["url"] = urls.get(elem["objectKey"], elem["url"])
 
         return ThreadDict(
             id=str(thread["id"]),
@@ -552,7 +724,7 @@ class ChainlitDataLayer(BaseDataLayer):
             name=thread["name"],
             userId=str(thread["userId"]) if thread["userId"] else None,
             userIdentifier=thread["user_identifier"],
-            metadata=json.loads(thread["metadata"]),
+            metadata=thread["metadata"] or {},
             steps=[self._convert_step_row_to_dict(step) for step in steps_results],
             elements=[
                 self._convert_element_row_to_dict(elem) for elem in elements_results
@@ -582,7 +754,7 @@ class ChainlitDataLayer(BaseDataLayer):
             "name": thread_name,
             "userId": user_id,
             "tags": tags,
-            "metadata": json.dumps(metadata or {}),
+            "metadata": metadata or {},
             "updatedAt": datetime.now(),
         }
 
@@ -594,23 +766,25 @@ class ChainlitDataLayer(BaseDataLayer):
         placeholders = [f"${i + 1}" for i in range(len(data))]
         values = list(data.values())
 
-        update_sets = [f'"{k}" = EXCLUDED."{k}"' for k in data.keys() if k != "id"]
+        update_sets = [
+            f'"{k}" = EXCLUDED."{k}"'
+            for k in data.keys()
+            if k not in ("id", "metadata")
+        ]
+        # Merge the top-level keys in the database, without reading them
+        update_sets.append(
+            '"metadata" = COALESCE("Thread"."metadata", \'{}\') || EXCLUDED."metadata"'
+        )
 
-        if update_sets:
-            query = f"""
-                INSERT INTO "Thread" ({", ".join(columns)})
-                VALUES ({", ".join(placeholders)})
-                ON CONFLICT (id) DO UPDATE
-                SET {", ".join(update_sets)};
-            """
-        else:
-            query = f"""
-                INSERT INTO "Thread" ({", ".join(columns)})
-                VALUES ({", ".join(placeholders)})
-                ON CONFLICT (id) DO NOTHING
-            """
+        query = f"""
+            INSERT INTO "Thread" ({", ".join(columns)})
+            VALUES ({", ".join(placeholders)})
+            ON CONFLICT (id) DO UPDATE
+            SET {", ".join(update_sets)};
+        """
 
         await self.execute_query(query, {str(i + 1): v for i, v in enumerate(values)})
+        return True
 
     def _extract_feedback_dict_from_step_row(self, row: Dict) -> Optional[FeedbackDict]:
         if row["feedback_id"] is not None:
@@ -631,7 +805,7 @@ class ChainlitDataLayer(BaseDataLayer):
             type=row["type"],
             input=row.get("input", {}),
             output=row.get("output", {}),
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=row.get("metadata") or {},
             createdAt=row["createdAt"].isoformat() if row.get("createdAt") else None,
             start=row["startTime"].isoformat() if row.get("startTime") else None,
             showInput=row.get("showInput"),
@@ -641,7 +815,7 @@ class ChainlitDataLayer(BaseDataLayer):
         )
 
     def _convert_element_row_to_dict(self, row: Dict) -> ElementDict:
-        metadata = json.loads(row.get("metadata", "{}"))
+        metadata = row.get("metadata") or {}
         return ElementDict(
             id=str(row["id"]),
             threadId=str(row["threadId"]) if row.get("threadId") else None,
@@ -658,12 +832,18 @@ class ChainlitDataLayer(BaseDataLayer):
             page=row["page"],
             autoPlay=row.get("autoPlay"),
             playerConfig=row.get("playerConfig"),
-            props=json.loads(row.get("props") or "{}"),
+            props=row.get("props") or {},
         )
 
     async def build_debug_url(self) -> str:
         return ""
 
+    async def close(self) -> None:
+        """Drain buffered writes and close database connections"""
+        if self.step_buffer is not None:
+            await self.step_buffer.close()
+        await self.cleanup()
+
     async def cleanup(self):
         """Cleanup database connections"""
         if self.pool:
@@ -674,12 +854,12 @@ class ChainlitDataLayer(BaseDataLayer):
         if self.pool and not self.pool.is_closing():
             loop = asyncio.get_event_loop()
             if loop.is_running():
-                loop.create_task(self.cleanup())
+                loop.create_task(self.close())
             else:
                 try:
                     cleanup_loop = asyncio.new_event_loop()
                     asyncio.set_event_loop(cleanup_loop)
-                    cleanup_loop.run_until_complete(self.cleanup())
+                    cleanup_loop.run_until_complete(self.close())
                     cleanup_loop.close()
                 except Exception as e:
                     logger.error(f"Error during sync cleanup: {e}")
@@ -692,5 +872,30 @@ class ChainlitDataLayer(BaseDataLayer):
         signal.default_int_handler(sig, frame)
 
 
+TS_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=20"
+
+
+def to_prefix_tsquery(search: str) -> str:
+    """Build a tsquery matching every word of the search as a prefix."""
+    return " & ".join(f"{word}:*" for word in re.findall(r"\w+", search.lower()))
+
+
+def parse_thread_keyset(values: List[Any]) -> Optional[Tuple[datetime, str]]:
+    """Read the ("updatedAt", id) of a thread cursor, None if it is not one."""
+    if len(values) != 2 or not all(isinstance(value, str) for value in values):
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), values[1]
+    except ValueError:
+        return None
+
+
+def _get_setting(value, env_var: str, default):
+    if value is not None:
+        return value
+    env_value = os.environ.get(env_var)
+    return type(default)(env_value) if env_value else default
+
+
 def truncate(text: Optional[str], max_length: int = 255) -> Optional[str]:
     return None if text is None else text[:max_length]
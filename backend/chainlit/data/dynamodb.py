@@ -1,22 +1,25 @@
 import asyncio
+import functools
 import json
 import logging
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from datetime import datetime
 from decimal import Decimal
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, TypeVar, Union
 
-import aiofiles
 import aiohttp
 import boto3  # type: ignore
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config  # type: ignore
 
 from chainlit.context import context
 from chainlit.data.base import BaseDataLayer
 from chainlit.data.storage_clients.base import BaseStorageClient
-from chainlit.data.utils import queue_until_user_message
+from chainlit.data.utils import decode_cursor, encode_cursor, queue_until_user_message
+from chainlit.data.write_buffer import WriteBuffer, merge_non_null
 from chainlit.element import ElementDict
 from chainlit.logger import logger
 from chainlit.step import StepDict
@@ -39,6 +42,11 @@ if TYPE_CHECKING:
 _logger = logger.getChild("DynamoDB")
 _logger.setLevel(logging.WARNING)
 
+T = TypeVar("T")
+
+# Maximum number of requests of a BatchWriteItem call
+BATCH_ITEM_SIZE = 25
+
 
 class DynamoDBDataLayer(BaseDataLayer):
     def __init__(
@@ -47,12 +55,38 @@ class DynamoDBDataLayer(BaseDataLayer):
         client: Optional["DynamoDBClient"] = None,
         storage_provider: Optional[BaseStorageClient] = None,
         user_thread_limit: int = 10,
+        max_workers: int = 10,
+        buffer_writes: bool = False,
+        write_buffer_size: int = 100,
+        write_flush_interval: float = 0.5,
     ):
         if client:
             self.client = client
         else:
             region_name = os.environ.get("AWS_REGION", "us-east-1")
-            self.client = boto3.client("dynamodb", region_name=region_name)  # type: ignore
+            self.client = boto3.client(  # type: ignore
+                "dynamodb",
+                region_name=region_name,
+                # Keep one connection per worker alive
+                config=Config(max_pool_connections=max_workers),
+            )
+
+        # boto3 is blocking, its calls run on a bounded pool of threads sharing
+        # the client so that they don't stall the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chainlit-dynamodb"
+        )
+
+        # Opt-in write-behind buffer for step and element puts, written with
+        # BatchWriteItem. Updates of a pending step are merged into its put.
+        self.write_buffer: Optional[WriteBuffer[Dict[str, Any]]] = None
+        if buffer_writes:
+            self.write_buffer = WriteBuffer(
+                self._flush_writes,
+                max_size=write_buffer_size,
+                flush_interval=write_flush_interval,
+                merge_fn=merge_non_null,
+            )
 
         self.table_name = table_name
         self.storage_provider = storage_provider
@@ -61,6 +95,74 @@ class DynamoDBDataLayer(BaseDataLayer):
         self._type_deserializer = TypeDeserializer()
         self._type_serializer = TypeSerializer()
 
+    async def _run(self, method: Callable[..., T], **kwargs) -> T:
+        """Call a client method on the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(method, **kwargs)
+        )
+
+    async def close(self) -> None:
+        if self.write_buffer is not None:
+            await self.write_buffer.close()
+        self._executor.shutdown(wait=False)
+
+    async def _put_item(self, item: Dict[str, Any]):
+        if self.write_buffer is not None:
+            await self.write_buffer.put(f"{item['PK']}#{item['SK']}", item)
+        else:
+            await self._run(
+                self.client.put_item,
+                TableName=self.table_name,
+                Item=self._serialize_item(item),
+            )
+
+    async def _flush_writes(self, items: List[Dict[str, Any]]):
+        await self._batch_write_item(
+            [{"PutRequest": {"Item": self._serialize_item(item)}} for item in items]
+        )
+
+    async def _flush_pending(self, pk: str, sk: str):
+        """Write the buffered item before it is read or partially updated."""
+        if self.write_buffer is not None:
+            if f"{pk}#{sk}" in self.write_buffer:
+                await self.write_buffer.flush()
+            else:
+                await self.write_buffer.wait_for_flush()
+
+    async def _discard_pending(self, pk: str, sk: str = ""):
+        """Drop the buffered items of the key, or key prefix, before a delete."""
+        if self.write_buffer is not None:
+            self.write_buffer.discard(lambda key, _: key.startswith(f"{pk}#{sk}"))
+            await self.write_buffer.wait_for_flush()
+
+    async def _batch_write_item(self, requests: List[Dict[str, Any]]):
+        chunks = [
+            requests[i : i + BATCH_ITEM_SIZE]
+            for i in range(0, len(requests), BATCH_ITEM_SIZE)
+        ]
+        await asyncio.gather(*(self._batch_write_chunk(chunk) for chunk in chunks))
+
+    async def _batch_write_chunk(self, chunk: List[Dict[str, Any]]):
+        response = await self._run(
+            self.client.batch_write_item,
+            RequestItems={
+                self.table_name: chunk,  # type: ignore
+            },
+        )
+
+        backoff_time = 1
+        while response.get("UnprocessedItems"):
+            backoff_time *= 2
+            # Cap the backoff time at 32 seconds & add jitter
+            delay = min(backoff_time, 32) + random.uniform(0, 1)
+            await asyncio.sleep(delay)
+
+            response = await self._run(
+                self.client.batch_write_item,
+                RequestItems=response["UnprocessedItems"],
+            )
+
     def _get_current_timestamp(self) -> str:
         return datetime.now().isoformat() + "Z"
 
@@ -96,7 +198,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             for key, value in item.items()
         }
 
-    def _update_item(self, key: Dict[str, Any], updates: Dict[str, Any]):
+    async def _update_item(self, key: Dict[str, Any], updates: Dict[str, Any]):
         update_expr: List[str] = []
         expression_attribute_names = {}
         expression_attribute_values = {}
@@ -110,7 +212,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             expression_attribute_names[k] = attr
             expression_attribute_values[v] = value
 
-        self.client.update_item(
+        await self._run(
+            self.client.update_item,
             TableName=self.table_name,
             Key=self._serialize_item(key),
             UpdateExpression="SET " + ", ".join(update_expr),
@@ -125,7 +228,8 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def get_user(self, identifier: str) -> Optional["PersistedUser"]:
         _logger.info("DynamoDB: get_user identifier=%s", identifier)
 
-        response = self.client.get_item(
+        response = await self._run(
+            self.client.get_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"USER#{identifier}"},
@@ -160,7 +264,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             "createdAt": ts,
         }
 
-        self.client.put_item(
+        await self._run(
+            self.client.put_item,
             TableName=self.table_name,
             Item=self._serialize_item(item),
         )
@@ -180,7 +285,9 @@ class DynamoDBDataLayer(BaseDataLayer):
         thread_id = thread_id.strip("THREAD#")
         step_id = step_id.strip("STEP#")
 
-        self.client.update_item(
+        await self._flush_pending(f"THREAD#{thread_id}", f"STEP#{step_id}")
+        await self._run(
+            self.client.update_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -208,7 +315,11 @@ class DynamoDBDataLayer(BaseDataLayer):
         feedback.id = f"THREAD#{feedback.threadId}::STEP#{feedback.forId}"
         serialized_feedback = self._type_serializer.serialize(asdict(feedback))
 
-        self.client.update_item(
+        await self._flush_pending(
+            f"THREAD#{feedback.threadId}", f"STEP#{feedback.forId}"
+        )
+        await self._run(
+            self.client.update_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{feedback.threadId}"},
@@ -240,15 +351,20 @@ class DynamoDBDataLayer(BaseDataLayer):
             )
             return
 
+        if not element.mime:
+            element.mime = "application/octet-stream"
+
+        context_user = self.context.session.user
+        user_folder = getattr(context_user, "id", "unknown")
+        file_object_key = f"{user_folder}/{element.thread_id}/{element.id}"
+
         content: Optional[Union[bytes, str]] = None
 
         if element.content:
             content = element.content
 
         elif element.path:
-            _logger.debug("DynamoDB: create_element reading file %s", element.path)
-            async with aiofiles.open(element.path, "rb") as f:
-                content = await f.read()
+            _logger.debug("DynamoDB: create_element streaming file %s", element.path)
 
         elif element.url:
             _logger.debug("DynamoDB: create_element http %s", element.url)
@@ -264,22 +380,23 @@ class DynamoDBDataLayer(BaseDataLayer):
         else:
             raise ValueError("Element url, path or content must be provided")
 
-        if content is None:
+        if content is not None:
+            uploaded_file = await self.storage_provider.upload_file(
+                object_key=file_object_key,
+                data=content,
+                mime=element.mime,
+                overwrite=True,
+            )
+        elif element.path:
+            uploaded_file = await self.storage_provider.upload_path(
+                object_key=file_object_key,
+                path=element.path,
+                mime=element.mime,
+                overwrite=True,
+            )
+        else:
             raise ValueError("Content is None, cannot upload file")
 
-        if not element.mime:
-            element.mime = "application/octet-stream"
-
-        context_user = self.context.session.user
-        user_folder = getattr(context_user, "id", "unknown")
-        file_object_key = f"{user_folder}/{element.thread_id}/{element.id}"
-
-        uploaded_file = await self.storage_provider.upload_file(
-            object_key=file_object_key,
-            data=content,
-            mime=element.mime,
-            overwrite=True,
-        )
         if not uploaded_file:
             raise ValueError(
                 "DynamoDB Error: create_element, Failed to persist data in storage_provider",
@@ -295,10 +412,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             }
         )
 
-        self.client.put_item(
-            TableName=self.table_name,
-            Item=self._serialize_item(element_dict),
-        )
+        await self._put_item(element_dict)
 
     async def get_element(
         self, thread_id: str, element_id: str
@@ -307,7 +421,9 @@ class DynamoDBDataLayer(BaseDataLayer):
             "DynamoDB: get_element thread=%s element=%s", thread_id, element_id
         )
 
-        response = self.client.get_item(
+        await self._flush_pending(f"THREAD#{thread_id}", f"ELEMENT#{element_id}")
+        response = await self._run(
+            self.client.get_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -327,7 +443,9 @@ class DynamoDBDataLayer(BaseDataLayer):
             "DynamoDB: delete_element thread=%s element=%s", thread_id, element_id
         )
 
-        self.client.delete_item(
+        await self._discard_pending(f"THREAD#{thread_id}", f"ELEMENT#{element_id}")
+        await self._run(
+            self.client.delete_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -353,10 +471,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             }
         )
 
-        self.client.put_item(
-            TableName=self.table_name,
-            Item=self._serialize_item(item),
-        )
+        await self._put_item(item)
 
     @queue_until_user_message()
     async def update_step(self, step_dict: "StepDict"):
@@ -367,21 +482,31 @@ class DynamoDBDataLayer(BaseDataLayer):
         )
         _logger.debug("DynamoDB: update_step: %s", step_dict)
 
-        self._update_item(
-            key={
-                # ignore type, dynamo needs these so we want to fail if not set
-                "PK": f"THREAD#{step_dict['threadId']}",  # type: ignore
-                "SK": f"STEP#{step_dict['id']}",  # type: ignore
-            },
-            updates=step_dict,  # type: ignore
-        )
+        key = {
+            # ignore type, dynamo needs these so we want to fail if not set
+            "PK": f"THREAD#{step_dict['threadId']}",  # type: ignore
+            "SK": f"STEP#{step_dict['id']}",  # type: ignore
+        }
+
+        if (
+            self.write_buffer is not None
+            and f"{key['PK']}#{key['SK']}" in self.write_buffer
+        ):
+            # Coalesce with the pending put of the step
+            await self._put_item({**step_dict, **key})
+            return
+
+        await self._flush_pending(key["PK"], key["SK"])
+        await self._update_item(key=key, updates=step_dict)  # type: ignore
 
     @queue_until_user_message()
     async def delete_step(self, step_id: str):
         thread_id = self.context.session.thread_id
         _logger.info("DynamoDB: delete_feedback thread=%s step=%s", thread_id, step_id)
 
-        self.client.delete_item(
+        await self._discard_pending(f"THREAD#{thread_id}", f"STEP#{step_id}")
+        await self._run(
+            self.client.delete_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -392,7 +517,8 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def get_thread_author(self, thread_id: str) -> str:
         _logger.info("DynamoDB: get_thread_author thread=%s", thread_id)
 
-        response = self.client.get_item(
+        response = await self._run(
+            self.client.get_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -410,6 +536,7 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def delete_thread(self, thread_id: str):
         _logger.info("DynamoDB: delete_thread thread=%s", thread_id)
 
+        await self._discard_pending(f"THREAD#{thread_id}")
         thread = await self.get_thread(thread_id)
         if not thread:
             return
@@ -424,27 +551,10 @@ class DynamoDBDataLayer(BaseDataLayer):
             req = {"DeleteRequest": {"Key": key}}
             delete_requests.append(req)
 
-        BATCH_ITEM_SIZE = 25  # pylint: disable=invalid-name
-        for i in range(0, len(delete_requests), BATCH_ITEM_SIZE):
-            chunk = delete_requests[i : i + BATCH_ITEM_SIZE]
-            response = self.client.batch_write_item(
-                RequestItems={
-                    self.table_name: chunk,  # type: ignore
-                }
-            )
+        await self._batch_write_item(delete_requests)
 
-            backoff_time = 1
-            while response.get("UnprocessedItems"):
-                backoff_time *= 2
-                # Cap the backoff time at 32 seconds & add jitter
-                delay = min(backoff_time, 32) + random.uniform(0, 1)
-                await asyncio.sleep(delay)
-
-                response = self.client.batch_write_item(
-                    RequestItems=response["UnprocessedItems"]
-                )
-
-        self.client.delete_item(
+        await self._run(
+            self.client.delete_item,
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -467,56 +577,106 @@ class DynamoDBDataLayer(BaseDataLayer):
             ),
         )
 
+        user_thread_pk = f"USER#{filters.userId}"
         query_args: Dict[str, Any] = {
             "TableName": self.table_name,
             "IndexName": "UserThread",
             "ScanIndexForward": False,
             "Limit": self.user_thread_limit,
             "KeyConditionExpression": "#UserThreadPK = :pk",
+            # Only read what the thread list needs
+            "ProjectionExpression": "PK, UserThreadSK, #name",
             "ExpressionAttributeNames": {
                 "#UserThreadPK": "UserThreadPK",
+                "#name": "name",
             },
             "ExpressionAttributeValues": {
-                ":pk": {"S": f"USER#{filters.userId}"},
+                ":pk": {"S": user_thread_pk},
             },
         }
 
-        if pagination.cursor:
-            query_args["ExclusiveStartKey"] = json.loads(pagination.cursor)
+        if pagination.cursor and (
+            start_key := self._decode_thread_cursor(pagination.cursor, user_thread_pk)
+        ):
+            query_args["ExclusiveStartKey"] = start_key
 
         if filters.search:
             query_args["FilterExpression"] = "contains(#name, :search)"
-            query_args["ExpressionAttributeNames"]["#name"] = "name"
             query_args["ExpressionAttributeValues"][":search"] = {"S": filters.search}
 
-        response = self.client.query(**query_args)  # type: ignore
+        # The filter applies after Limit, keep querying to fill the page
+        items: List[Dict[str, Any]] = []
+        while True:
+            response = await self._run(self.client.query, **query_args)  # type: ignore
+            items.extend(map(self._deserialize_item, response["Items"]))
+            if (
+                len(items) >= self.user_thread_limit
+                or "LastEvaluatedKey" not in response
+            ):
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
-        if "LastEvaluatedKey" in response:
+        if len(items) > self.user_thread_limit or "LastEvaluatedKey" in response:
+            items = items[: self.user_thread_limit]
+            last_item = items[-1]
             paginated_response.pageInfo.hasNextPage = True
-            paginated_response.pageInfo.endCursor = json.dumps(
-                response["LastEvaluatedKey"]
+            paginated_response.pageInfo.endCursor = encode_cursor(
+                [last_item["UserThreadSK"], last_item["PK"].removeprefix("THREAD#")]
             )
 
-        for item in response["Items"]:
-            deserialized_item: Dict[str, Any] = self._deserialize_item(item)
+        for item in items:
             thread = ThreadDict(  # type: ignore
-                id=deserialized_item["PK"].strip("THREAD#"),
-                createdAt=deserialized_item["UserThreadSK"].strip("TS#"),
-                name=deserialized_item["name"],
+                id=item["PK"].removeprefix("THREAD#"),
+                createdAt=item["UserThreadSK"].removeprefix("TS#"),
+                name=item.get("name"),
             )
             paginated_response.data.append(thread)
 
         return paginated_response
 
+    def _decode_thread_cursor(self, cursor: str, user_thread_pk: str) -> Optional[Dict]:
+        """
+        Build the UserThread index key to resume the thread list from, None
+        to start from the first page when the cursor is not a valid one.
+        """
+        values = decode_cursor(cursor)
+        if values is None:
+            # Cursors used to be the raw LastEvaluatedKey
+            try:
+                key = json.loads(cursor)
+            except ValueError:
+                key = None
+            if not isinstance(key, dict):
+                _logger.warning("DynamoDB: ignoring invalid thread cursor")
+                return None
+            return key
+
+        if len(values) != 2 or not all(isinstance(value, str) for value in values):
+            _logger.warning("DynamoDB: ignoring invalid thread cursor")
+            return None
+        user_thread_sk, thread_id = values
+        return self._serialize_item(
+            {
+                "PK": f"THREAD#{thread_id}",
+                "SK": "THREAD",
+                "UserThreadPK": user_thread_pk,
+                "UserThreadSK": user_thread_sk,
+            }
+        )
+
     async def get_thread(self, thread_id: str) -> "Optional[ThreadDict]":
         _logger.info("DynamoDB: get_thread thread=%s", thread_id)
 
+        if self.write_buffer is not None:
+            await self.write_buffer.flush()
+
         # Get all thread records
         thread_items: List[Any] = []
 
         cursor: Dict[str, Any] = {}
         while True:
-            response = self.client.query(
+            response = await self._run(
+                self.client.query,
                 TableName=self.table_name,
                 KeyConditionExpression="#pk = :pk",
                 ExpressionAttributeNames={"#pk": "PK"},
@@ -544,10 +704,6 @@ class DynamoDBDataLayer(BaseDataLayer):
                 thread_dict = item
 
             elif item["SK"].startswith("ELEMENT"):
-                if self.storage_provider is not None:
-                    item["url"] = await self.storage_provider.get_read_url(
-                        object_key=item["objectKey"],
-                    )
                 elements.append(item)
 
             elif item["SK"].startswith("STEP"):
@@ -562,6 +718,14 @@ class DynamoDBDataLayer(BaseDataLayer):
                 )
             return None
 
+        if self.storage_provider is not None:
+            object_keys = [e["objectKey"] for e in elements if e.get("objectKey")]
+            if object_keys:
+                urls = await self.storage_provider.get_read_urls(object_keys)
+                for element in elements:
+                    if element.get("objectKey"):
+                        element["url"] = urls[element["objectKey"]]
+
         steps.sort(key=lambda i: i["createdAt"])
         thread_dict.update(
             {
@@ -604,7 +768,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             # user_id may be None on subsequent calls, don't update UserThreadPK to "USER#{None}"
             item["UserThreadPK"] = f"USER#{user_id}"
 
-        self._update_item(
+        await self._update_item(
             key={
                 "PK": f"THREAD#{thread_id}",
                 "SK": "THREAD",
@@ -18,6 +18,7 @@ from literalai.observability.step import StepDict as LiteralStepDict
 
 from chainlit.data.base import BaseDataLayer
 from chainlit.data.utils import queue_until_user_message
+from chainlit.data.write_buffer import WriteBuffer, merge_non_null
 from chainlit.element import Audio, Element, ElementDict, File, Image, Pdf, Text, Video
 from chainlit.logger import logger
 from chainlit.step import (
@@ -218,10 +219,30 @@ class LiteralToChainlitConverter:
 
 
 class LiteralDataLayer(BaseDataLayer):
-    def __init__(self, api_key: str, server: Optional[str]):
+    def __init__(
+        self,
+        api_key: str,
+        server: Optional[str],
+        buffer_steps: bool = False,
+        step_buffer_size: int = 100,
+        step_flush_interval: float = 0.5,
+    ):
         from literalai import AsyncLiteralClient
 
         self.client = AsyncLiteralClient(api_key=api_key, url=server)
+
+        # Opt-in export of the steps in batches. Updates of a pending step
+        # are merged into it so a streamed message is sent once.
+        self.step_buffer: Optional[WriteBuffer[LiteralStepDict]] = (
+            WriteBuffer(
+                self.safely_send_steps,
+                max_size=step_buffer_size,
+                flush_interval=step_flush_interval,
+                merge_fn=merge_non_null,
+            )
+            if buffer_steps
+            else None
+        )
         logger.info("Chainlit data layer initialized")
 
     async def build_debug_url(self) -> str:
@@ -314,6 +335,10 @@ class LiteralDataLayer(BaseDataLayer):
         if not element.for_id:
             return
 
+        if self.step_buffer is not None:
+            # Make sure the step the element is attached to is sent first
+            await self.step_buffer.flush()
+
         object_key = None
 
         if not element.url:
@@ -389,7 +414,10 @@ class LiteralDataLayer(BaseDataLayer):
         if step_dict.get("isError"):
             step["error"] = step_dict.get("output")
 
-        await self.safely_send_steps([step])
+        if self.step_buffer is not None:
+            await self.step_buffer.put(str(step["id"]), step)
+        else:
+            await self.safely_send_steps([step])
 
     @queue_until_user_message()
     async def update_step(self, step_dict: "StepDict"):
@@ -397,6 +425,9 @@ class LiteralDataLayer(BaseDataLayer):
 
     @queue_until_user_message()
     async def delete_step(self, step_id: str):
+        if self.step_buffer is not None:
+            self.step_buffer.discard(lambda key, _: key == step_id)
+            await self.step_buffer.flush()
         await self.client.api.delete_step(id=step_id)
 
     async def get_thread_author(self, thread_id: str) -> str:
@@ -410,6 +441,8 @@ class LiteralDataLayer(BaseDataLayer):
         return user_identifier
 
     async def delete_thread(self, thread_id: str):
+        if self.step_buffer is not None:
+            self.step_buffer.discard(lambda _, step: step.get("threadId") == thread_id)
         await self.client.api.delete_thread(id=thread_id)
 
     async def list_threads(
@@ -467,6 +500,9 @@ class LiteralDataLayer(BaseDataLayer):
         )
 
     async def get_thread(self, thread_id: str) -> Optional[ThreadDict]:
+        if self.step_buffer is not None:
+            await self.step_buffer.flush()
+
         thread = await self.client.api.get_thread(id=thread_id)
         if not thread:
             return None
@@ -515,3 +551,8 @@ class LiteralDataLayer(BaseDataLayer):
             metadata=metadata,
             tags=tags,
         )
+
+    async def close(self) -> None:
+        """Send the buffered steps."""
+        if self.step_buffer is not None:
+            await self.step_buffer.close()
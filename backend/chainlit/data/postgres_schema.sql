@@ -0,0 +1,27 @@
+-- Optional additions to the Postgres schema used by ChainlitDataLayer
+-- (backend/chainlit/data/chainlit_data_layer.py).
+-- The base tables are managed by the chainlit-datalayer migrations; apply this
+-- file on top of them: psql "$DATABASE_URL" -f postgres_schema.sql
+
+-- Keyset pagination of the thread history sidebar.
+-- list_threads orders by ("updatedAt", id) DESC for a given user, so each page
+-- is an index range scan regardless of its depth.
+CREATE INDEX IF NOT EXISTS "Thread_userId_updatedAt_id_idx"
+  ON "Thread" ("userId", "updatedAt" DESC, "id" DESC)
+  WHERE "deletedAt" IS NULL;
+
+-- Full-text search over the thread history. When the "searchVector" columns
+-- exist, thread search matches thread names and step outputs through these GIN
+-- indexes and returns a rank and a highlighted snippet with every thread.
+-- Word prefixes are matched, so the 'simple' configuration (no stemming) is used.
+ALTER TABLE "Thread" ADD COLUMN IF NOT EXISTS "searchVector" tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple', coalesce("name", ''))) STORED;
+
+ALTER TABLE "Step" ADD COLUMN IF NOT EXISTS "searchVector" tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple', coalesce("output", ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS "Thread_searchVector_idx"
+  ON "Thread" USING GIN ("searchVector");
+
+CREATE INDEX IF NOT EXISTS "Step_searchVector_idx"
+  ON "Step" USING GIN ("searchVector");
@@ -1,11 +1,14 @@
+import asyncio
 import json
+import re
 import ssl
 import uuid
-from dataclasses import asdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-import aiofiles
 import aiohttp
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
@@ -13,8 +16,13 @@ from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engin
 from sqlalchemy.orm import sessionmaker
 
 from chainlit.data.base import BaseDataLayer
+from chainlit.data.sqlite_writer import SQLiteWriter, set_sqlite_pragmas
 from chainlit.data.storage_clients.base import BaseStorageClient
-from chainlit.data.utils import queue_until_user_message
+from chainlit.data.utils import (
+    decode_cursor,
+    encode_cursor,
+    queue_until_user_message,
+)
 from chainlit.element import ElementDict
 from chainlit.logger import logger
 from chainlit.step import StepDict
@@ -26,6 +34,7 @@ from chainlit.types import (
     Pagination,
     ThreadDict,
     ThreadFilter,
+    ThreadSearchMatchDict,
 )
 from chainlit.user import PersistedUser, User
 
@@ -34,7 +43,57 @@ if TYPE_CHECKING:
     from chainlit.step import StepDict
 
 
+# Sort key of a thread: its latest step, or its creation time if it has none
+THREAD_UPDATED_AT = """COALESCE(
+    (SELECT MAX(s."createdAt") FROM steps s WHERE s."threadId" = t."id"),
+    t."createdAt",
+    ''
+)"""
+
+
+# SQLITE_MAX_VARIABLE_NUMBER of SQLite builds older than 3.32
+MAX_BOUND_PARAMETERS = 999
+
+# Best full-text match of a thread in the list_threads page
+BEST_STEP_MATCH = """
+    FROM steps_fts JOIN steps s ON s.rowid = steps_fts.rowid
+    WHERE steps_fts MATCH :fts_query AND s."threadId" = page.thread_id
+    ORDER BY bm25(steps_fts)
+    LIMIT 1
+"""
+THREAD_NAME_MATCH = """
+    FROM threads_fts
+    WHERE threads_fts MATCH :fts_query AND threads_fts.rowid = page.thread_rowid
+"""
+FTS5_SNIPPET_ARGS = "'<mark>', '</mark>', '...', 16"
+
+
+def to_fts5_query(search: str) -> str:
+    """Build an FTS5 query matching every word of the search as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", search))
+
+
+def is_read_query(query: str) -> bool:
+    return query.lstrip().upper().startswith("SELECT")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass
+class UnitOfWork:
+    """Writes deferred until the end of a `unit_of_work` block."""
+
+    statements: List[Tuple[str, Dict]] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    committed: asyncio.Event = field(default_factory=asyncio.Event)
+    closed: bool = False
+
+
 class SQLAlchemyDataLayer(BaseDataLayer):
+    merges_thread_metadata = True
+
     def __init__(
         self,
         conninfo: str,
@@ -43,10 +102,15 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         storage_provider: Optional[BaseStorageClient] = None,
         user_thread_limit: Optional[int] = 1000,
         show_logger: Optional[bool] = False,
+        full_text_search: Optional[bool] = None,
+        sqlite_writer: Optional[bool] = None,
     ):
         self._conninfo = conninfo
         self.user_thread_limit = user_thread_limit
         self.show_logger = show_logger
+        # Search threads through the FTS5 tables of sqlite_schema.sql.
+        # Detected on the first search when None.
+        self.full_text_search = full_text_search
         if connect_args is None:
             connect_args = {}
         if ssl_require:
@@ -58,9 +122,26 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         self.engine: AsyncEngine = create_async_engine(
             self._conninfo, connect_args=connect_args
         )
+        # Route the writes to file-based SQLite databases through a single
+        # writer, reads keep using the engine's pool. Enabled when None.
+        self.sqlite_writer: Optional[SQLiteWriter] = None
+        if sqlite_writer is None:
+            sqlite_writer = self.engine.dialect.name == "sqlite" and (
+                self.engine.url.database not in (None, "", ":memory:")
+            )
+        if sqlite_writer:
+            set_sqlite_pragmas(self.engine)
+            write_engine = create_async_engine(
+                self._conninfo, connect_args=connect_args, pool_size=1, max_overflow=0
+            )
+            set_sqlite_pragmas(write_engine)
+            self.sqlite_writer = SQLiteWriter(write_engine)
         self.async_session = sessionmaker(
             bind=self.engine, expire_on_commit=False, class_=AsyncSession
         )  # type: ignore
+        self._unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar(
+            f"sqlalchemy_unit_of_work_{id(self)}", default=None
+        )
         if storage_provider:
             self.storage_provider: Optional[BaseStorageClient] = storage_provider
             if self.show_logger:
@@ -78,6 +159,30 @@ class SQLAlchemyDataLayer(BaseDataLayer):
     async def execute_sql(
         self, query: str, parameters: dict
     ) -> Union[List[Dict[str, Any]], int, None]:
+        unit = self._unit_of_work.get()
+        if unit and unit.closed:
+            # Late writes of the tasks spawned in the unit keep their order
+            await unit.committed.wait()
+        elif unit and is_read_query(query):
+            # Reads see the writes of their unit of work
+            await self._commit_unit_of_work(unit)
+        elif unit:
+            # Deferred, its row count is unknown
+            unit.statements.append((query, parameters))
+            return None
+
+        if self.sqlite_writer and not is_read_query(query):
+            try:
+                return self.clean_result(
+                    await self.sqlite_writer.execute(query, parameters)
+                )
+            except SQLAlchemyError as e:
+                logger.warning(f"An error occurred: {e}")
+                return None
+            except Exception as e:
+                logger.warning(f"An unexpected error occurred: {e}")
+                return None
+
         parameterized_query = text(query)
         async with self.async_session() as session:
             try:
@@ -102,6 +207,58 @@ class SQLAlchemyDataLayer(BaseDataLayer):
                 logger.warning(f"An unexpected error occurred: {e}")
                 return None
 
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[None]:
+        """
+        Defer the writes issued within the block, including those of the tasks
+        it spawns, and commit them in a single transaction at the end of the
+        block. Reads within the block first commit the pending writes.
+        """
+        if self._unit_of_work.get() is not None:
+            # Nested blocks join the outer unit of work
+            yield
+            return
+
+        unit = UnitOfWork()
+        token = self._unit_of_work.set(unit)
+        try:
+            yield
+            # Let the tasks spawned last, like a final step update, queue
+            # their writes before committing
+            await asyncio.sleep(0)
+        finally:
+            self._unit_of_work.reset(token)
+            unit.closed = True
+            await self._commit_unit_of_work(unit)
+            unit.committed.set()
+
+    async def _commit_unit_of_work(self, unit: UnitOfWork):
+        async with unit.lock:
+            statements, unit.statements = unit.statements, []
+            if not statements:
+                return
+            if self.sqlite_writer:
+                try:
+                    await self.sqlite_writer.execute_atomic(statements)
+                except Exception:
+                    # Logged by the writer
+                    pass
+                return
+            async with self.async_session() as session:
+                try:
+                    async with session.begin():
+                        for query, parameters in statements:
+                            await session.execute(text(query), parameters)
+                except Exception as e:
+                    logger.warning(
+                        f"Failed to commit {len(statements)} statements: {e}"
+                    )
+
+    async def close(self) -> None:
+        if self.sqlite_writer:
+            await self.sqlite_writer.close()
+        await self.engine.dispose()
+
     async def get_current_timestamp(self) -> str:
         return datetime.now().isoformat() + "Z"
 
@@ -231,22 +388,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             user_identifier = await self._get_user_identifer_by_id(user_id)
 
         if metadata is not None:
-            existing = await self.execute_sql(
-                query='SELECT "metadata" FROM threads WHERE "id" = :id',
-                parameters={"id": thread_id},
-            )
-            base = {}
-            if isinstance(existing, list) and existing:
-                raw = existing[0].get("metadata") or {}
-                if isinstance(raw, str):
-                    try:
-                        base = json.loads(raw)
-                    except json.JSONDecodeError:
-                        base = {}
-                elif isinstance(raw, dict):
-                    base = raw
-            incoming = {k: v for k, v in metadata.items() if v is not None}
-            metadata = {**base, **incoming}
+            metadata = {k: v for k, v in metadata.items() if v is not None}
 
         name_value = name
         if name_value is None and metadata:
@@ -269,16 +411,31 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         }  # Remove keys with None values
         columns = ", ".join(f'"{key}"' for key in parameters.keys())
         values = ", ".join(f":{key}" for key in parameters.keys())
-        updates = ", ".join(
-            f'"{key}" = EXCLUDED."{key}"' for key in parameters.keys() if key != "id"
-        )
+        updates = [
+            f'"{key}" = EXCLUDED."{key}"'
+            for key in parameters.keys()
+            if key not in ("id", "metadata")
+        ]
+        if metadata:
+            # Merge the top-level keys in the database, without reading them
+            if self.engine.dialect.name == "postgresql":
+                merged = 'COALESCE(threads."metadata", \'{}\') || EXCLUDED."metadata"'
+            else:
+                merged = """json_set(COALESCE(threads."metadata", '{}')"""
+                for i, (key, value) in enumerate(metadata.items()):
+                    parameters[f"metadata_key_{i}"] = f'$."{key}"'
+                    parameters[f"metadata_value_{i}"] = json.dumps(value)
+                    merged += f", :metadata_key_{i}, json(:metadata_value_{i})"
+                merged += ")"
+            updates.append(f'"metadata" = {merged}')
         query = f"""
             INSERT INTO threads ({columns})
             VALUES ({values})
             ON CONFLICT ("id") DO UPDATE
-            SET {updates};
+            SET {", ".join(updates)};
         """
-        await self.execute_sql(query=query, parameters=parameters)
+        # None when the write failed, or is deferred to a unit of work
+        return await self.execute_sql(query=query, parameters=parameters) is not None
 
     async def delete_thread(self, thread_id: str):
         if self.show_logger:
@@ -287,10 +444,6 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         elements_query = """SELECT * FROM elements WHERE "threadId" = :id"""
         elements = await self.execute_sql(elements_query, {"id": thread_id})
 
-        if self.storage_provider is not None and isinstance(elements, list):
-            for elem in filter(lambda x: x["objectKey"], elements):
-                await self.storage_provider.delete_file(object_key=elem["objectKey"])
-
         # Delete feedbacks/elements/steps/thread
         feedbacks_query = """DELETE FROM feedbacks WHERE "forId" IN (SELECT "id" FROM steps WHERE "threadId" = :id)"""
         elements_query = """DELETE FROM elements WHERE "threadId" = :id"""
@@ -302,6 +455,12 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         await self.execute_sql(query=steps_query, parameters=parameters)
         await self.execute_sql(query=thread_query, parameters=parameters)
 
+        if self.storage_provider is not None and isinstance(elements, list):
+            object_keys = [elem["objectKey"] for elem in elements if elem["objectKey"]]
+            if object_keys:
+                # Files are deleted in the background, the thread is already gone
+                self.storage_provider.purge_files(object_keys)
+
     async def list_threads(
         self, pagination: Pagination, filters: ThreadFilter
     ) -> PaginatedResponse:
@@ -311,58 +470,188 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             )
         if not filters.userId:
             raise ValueError("userId is required")
-        all_user_threads: List[ThreadDict] = (
-            await self.get_all_user_threads(user_id=filters.userId) or []
-        )
 
-        search_keyword = filters.search.lower() if filters.search else None
-        feedback_value = int(filters.feedback) if filters.feedback else None
-
-        filtered_threads = []
-        for thread in all_user_threads:
-            keyword_match = True
-            feedback_match = True
-            if search_keyword or feedback_value is not None:
-                if search_keyword:
-                    keyword_match = any(
-                        search_keyword in step["output"].lower()
-                        for step in thread["steps"]
-                        if "output" in step
+        # Threads are sorted by their latest step, falling back to their creation
+        parameters: Dict[str, Any] = {
+            "user_id": filters.userId,
+            "limit": pagination.first + 1,
+        }
+        conditions = ['t."userId" = :user_id']
+        fts_query = to_fts5_query(filters.search) if filters.search else None
+        if fts_query and await self._use_full_text_search():
+            parameters["fts_query"] = fts_query
+            conditions.append(
+                """(
+                    t."id" IN (
+                        SELECT s."threadId" FROM steps_fts
+                        JOIN steps s ON s.rowid = steps_fts.rowid
+                        WHERE steps_fts MATCH :fts_query
+                    )
+                    OR t.rowid IN (
+                        SELECT rowid FROM threads_fts WHERE threads_fts MATCH :fts_query
                     )
-                if feedback_value is not None:
-                    feedback_match = False  # Assume no match until found
-                    for step in thread["steps"]:
-                        feedback = step.get("feedback")
-                        if feedback and feedback.get("value") == feedback_value:
-                            feedback_match = True
-                            break
-            if keyword_match and feedback_match:
-                filtered_threads.append(thread)
-
-        start = 0
+                )"""
+            )
+        elif filters.search:
+            parameters["search"] = f"%{escape_like(filters.search.lower())}%"
+            conditions.append(
+                """EXISTS (
+                    SELECT 1 FROM steps s
+                    WHERE s."threadId" = t."id"
+                    AND LOWER(s."output") LIKE :search ESCAPE '\\'
+                )"""
+            )
+        if filters.feedback is not None:
+            parameters["feedback"] = int(filters.feedback)
+            conditions.append(
+                """EXISTS (
+                    SELECT 1 FROM feedbacks f
+                    JOIN steps s ON s."id" = f."forId"
+                    WHERE s."threadId" = t."id" AND f."value" = :feedback
+                )"""
+            )
+
+        keyset = ""
         if pagination.cursor:
-            for i, thread in enumerate(filtered_threads):
-                if (
-                    thread["id"] == pagination.cursor
-                ):  # Find the start index using pagination.cursor
-                    start = i + 1
-                    break
-        end = start + pagination.first
-        paginated_threads = filtered_threads[start:end] or []
-
-        has_next_page = len(filtered_threads) > end
-        start_cursor = paginated_threads[0]["id"] if paginated_threads else None
-        end_cursor = paginated_threads[-1]["id"] if paginated_threads else None
+            cursor = decode_cursor(pagination.cursor)
+            if not cursor or len(cursor) != 2:
+                # Legacy cursor holding a bare thread id
+                cursor = await self._get_thread_sort_key(pagination.cursor)
+            if cursor:
+                parameters["cursor_updated_at"], parameters["cursor_id"] = cursor
+                keyset = (
+                    "WHERE (thread_updatedat, thread_id) < "
+                    "(:cursor_updated_at, :cursor_id)"
+                )
+
+        query = f"""
+            SELECT * FROM (
+                SELECT
+                    t."id" AS thread_id,
+                    t."createdAt" AS thread_createdat,
+                    t."name" AS thread_name,
+                    t."userId" AS user_id,
+                    t."userIdentifier" AS user_identifier,
+                    t."tags" AS thread_tags,
+                    t."metadata" AS thread_metadata,
+                    {THREAD_UPDATED_AT} AS thread_updatedat
+                    {", t.rowid AS thread_rowid" if "fts_query" in parameters else ""}
+                FROM threads t
+                WHERE {" AND ".join(conditions)}
+            ) user_threads
+            {keyset}
+            ORDER BY thread_updatedat DESC, thread_id DESC
+            LIMIT :limit
+        """
+        if "fts_query" in parameters:
+            # Rank and highlight the best match, computed for the page only
+            query = f"""
+                SELECT
+                    page.*,
+                    COALESCE(
+                        (SELECT -bm25(steps_fts) {BEST_STEP_MATCH}),
+                        (SELECT -bm25(threads_fts) {THREAD_NAME_MATCH})
+                    ) AS search_rank,
+                    COALESCE(
+                        (SELECT snippet(steps_fts, 0, {FTS5_SNIPPET_ARGS}) {BEST_STEP_MATCH}),
+                        (SELECT snippet(threads_fts, 0, {FTS5_SNIPPET_ARGS}) {THREAD_NAME_MATCH})
+                    ) AS search_snippet
+                FROM ({query}) page
+                ORDER BY thread_updatedat DESC, thread_id DESC
+            """
+        user_threads = await self.execute_sql(query=query, parameters=parameters)
+        if not isinstance(user_threads, list):
+            user_threads = []
+
+        has_next_page = len(user_threads) > pagination.first
+        user_threads = user_threads[: pagination.first]
+
+        threads = []
+        for thread in user_threads:
+            thread_dict = ThreadDict(
+                id=thread["thread_id"],
+                createdAt=thread["thread_createdat"],
+                name=thread["thread_name"],
+                userId=thread["user_id"],
+                userIdentifier=thread["user_identifier"],
+                tags=thread["thread_tags"],
+                metadata=thread["thread_metadata"],
+                steps=[],
+                elements=[],
+            )
+            if "search_rank" in thread:
+                thread_dict["search"] = ThreadSearchMatchDict(
+                    rank=thread["search_rank"],
+                    snippet=thread["search_snippet"],
+                )
+            threads.append(thread_dict)
+
+        def to_cursor(thread: Dict[str, Any]) -> str:
+            return encode_cursor([thread["thread_updatedat"], thread["thread_id"]])
 
         return PaginatedResponse(
             pageInfo=PageInfo(
                 hasNextPage=has_next_page,
-                startCursor=start_cursor,
-                endCursor=end_cursor,
+                startCursor=to_cursor(user_threads[0]) if user_threads else None,
+                endCursor=to_cursor(user_threads[-1]) if user_threads else None,
             ),
-            data=paginated_threads,
+            data=threads,
         )
 
+    async def _select_by_thread_ids(
+        self, query: str, thread_ids: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run a query filtered by `{thread_ids}` with the ids as bound parameters,
+        so the statement text stays the same whatever the ids.
+        """
+        if self.engine.dialect.name == "postgresql":
+            result = await self.execute_sql(
+                query=query.format(thread_ids="= ANY(:thread_ids)"),
+                parameters={"thread_ids": thread_ids},
+            )
+            return result if isinstance(result, list) else []
+
+        # Other databases get IN lists, chunked below their bound parameters limit
+        chunks = [
+            thread_ids[i : i + MAX_BOUND_PARAMETERS]
+            for i in range(0, len(thread_ids), MAX_BOUND_PARAMETERS)
+        ]
+        results = await asyncio.gather(
+            *(
+                self.execute_sql(
+                    query=query.format(
+                        thread_ids="IN ("
+                        + ", ".join(f":thread_id_{i}" for i in range(len(chunk)))
+                        + ")"
+                    ),
+                    parameters={
+                        f"thread_id_{i}": thread_id for i, thread_id in enumerate(chunk)
+                    },
+                )
+                for chunk in chunks
+            )
+        )
+        return [row for result in results if isinstance(result, list) for row in result]
+
+    async def _use_full_text_search(self) -> bool:
+        if self.full_text_search is None:
+            self.full_text_search = False
+            if self.engine.dialect.name == "sqlite":
+                result = await self.execute_sql(
+                    query="SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'steps_fts'",
+                    parameters={},
+                )
+                self.full_text_search = bool(result)
+        return self.full_text_search
+
+    async def _get_thread_sort_key(self, thread_id: str) -> Optional[List[Any]]:
+        query = f"""SELECT {THREAD_UPDATED_AT} AS thread_updatedat FROM threads t WHERE t."id" = :id"""
+        result = await self.execute_sql(query=query, parameters={"id": thread_id})
+        if isinstance(result, list) and result:
+            return [result[0]["thread_updatedat"], thread_id]
+        return None
+
     ###### Steps ######
     @queue_until_user_message()
     async def create_step(self, step_dict: "StepDict"):
@@ -499,8 +788,8 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         content: Optional[Union[bytes, str]] = None
 
         if element.path:
-            async with aiofiles.open(element.path, "rb") as f:
-                content = await f.read()
+            # Files on disk are streamed to the storage provider below
+            pass
         elif element.url:
             async with aiohttp.ClientSession() as session:
                 async with session.get(element.url) as response:
@@ -512,7 +801,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             content = element.content
         else:
             raise ValueError("Element url, path or content must be provided")
-        if content is None:
+        if content is None and not element.path:
             raise ValueError("Content is None, cannot upload file")
 
         user_id: str = await self._get_user_id_by_thread(element.thread_id) or "unknown"
@@ -523,9 +812,20 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         if not element.mime:
             element.mime = "application/octet-stream"
 
-        uploaded_file = await self.storage_provider.upload_file(
-            object_key=file_object_key, data=content, mime=element.mime, overwrite=True
-        )
+        if content is None:
+            uploaded_file = await self.storage_provider.upload_path(
+                object_key=file_object_key,
+                path=element.path,  # type: ignore[arg-type]
+                mime=element.mime,
+                overwrite=True,
+            )
+        else:
+            uploaded_file = await self.storage_provider.upload_file(
+                object_key=file_object_key,
+                data=content,
+                mime=element.mime,
+                overwrite=True,
+            )
         if not uploaded_file:
             raise ValueError(
                 "SQLAlchemy Error: create_element, Failed to persist data in storage_provider"
@@ -613,14 +913,9 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             return None
         if not user_threads:
             return []
-        else:
-            thread_ids = (
-                "('"
-                + "','".join(map(str, [thread["thread_id"] for thread in user_threads]))
-                + "')"
-            )
+        thread_ids = [thread["thread_id"] for thread in user_threads]
 
-        steps_feedbacks_query = f"""
+        steps_feedbacks_query = """
             SELECT
                 s."id" AS step_id,
                 s."name" AS step_name,
@@ -644,14 +939,11 @@ class SQLAlchemyDataLayer(BaseDataLayer):
                 f."comment" AS feedback_comment,
                 f."id" AS feedback_id
             FROM steps s LEFT JOIN feedbacks f ON s."id" = f."forId"
-            WHERE s."threadId" IN {thread_ids}
+            WHERE s."threadId" {thread_ids}
             ORDER BY s."createdAt" ASC
         """
-        steps_feedbacks = await self.execute_sql(
-            query=steps_feedbacks_query, parameters={}
-        )
 
-        elements_query = f"""
+        elements_query = """
             SELECT
                 e."id" AS element_id,
                 e."threadId" as element_threadid,
@@ -668,9 +960,12 @@ class SQLAlchemyDataLayer(BaseDataLayer):
                 e."mime" AS element_mime,
                 e."props" AS props
             FROM elements e
-            WHERE e."threadId" IN {thread_ids}
+            WHERE e."threadId" {thread_ids}
         """
-        elements = await self.execute_sql(query=elements_query, parameters={})
+        steps_feedbacks, elements = await asyncio.gather(
+            self._select_by_thread_ids(steps_feedbacks_query, thread_ids),
+            self._select_by_thread_ids(elements_query, thread_ids),
+        )
 
         thread_dicts = {}
         for thread in user_threads:
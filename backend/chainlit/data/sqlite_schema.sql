@@ -81,7 +81,49 @@ CREATE INDEX IF NOT EXISTS idx_users_identifier ON users("identifier");
 CREATE INDEX IF NOT EXISTS idx_threads_userId ON threads("userId");
 CREATE INDEX IF NOT EXISTS idx_steps_threadId ON steps("threadId");
 CREATE INDEX IF NOT EXISTS idx_steps_parentId ON steps("parentId");
+-- Covers the latest step lookup used to sort the thread history
+CREATE INDEX IF NOT EXISTS idx_steps_threadId_createdAt ON steps("threadId", "createdAt");
 CREATE INDEX IF NOT EXISTS idx_elements_threadId ON elements("threadId");
 CREATE INDEX IF NOT EXISTS idx_elements_forId ON elements("forId");
 CREATE INDEX IF NOT EXISTS idx_feedbacks_forId ON feedbacks("forId");
 CREATE INDEX IF NOT EXISTS idx_feedbacks_threadId ON feedbacks("threadId");
+
+-- Full-text search over the thread history (requires SQLite built with FTS5).
+-- When steps_fts exists, thread search matches thread names and step outputs
+-- through these external content tables and returns a rank and a highlighted
+-- snippet with every thread. The triggers keep them in sync with the tables.
+CREATE VIRTUAL TABLE IF NOT EXISTS steps_fts USING fts5(
+  "output", content='steps', content_rowid='rowid'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS threads_fts USING fts5(
+  "name", content='threads', content_rowid='rowid'
+);
+
+CREATE TRIGGER IF NOT EXISTS steps_fts_insert AFTER INSERT ON steps BEGIN
+  INSERT INTO steps_fts(rowid, "output") VALUES (new.rowid, new."output");
+END;
+CREATE TRIGGER IF NOT EXISTS steps_fts_delete AFTER DELETE ON steps BEGIN
+  INSERT INTO steps_fts(steps_fts, rowid, "output") VALUES ('delete', old.rowid, old."output");
+END;
+CREATE TRIGGER IF NOT EXISTS steps_fts_update AFTER UPDATE OF "output" ON steps BEGIN
+  INSERT INTO steps_fts(steps_fts, rowid, "output") VALUES ('delete', old.rowid, old."output");
+  INSERT INTO steps_fts(rowid, "output") VALUES (new.rowid, new."output");
+END;
+
+CREATE TRIGGER IF NOT EXISTS threads_fts_insert AFTER INSERT ON threads BEGIN
+  INSERT INTO threads_fts(rowid, "name") VALUES (new.rowid, new."name");
+END;
+CREATE TRIGGER IF NOT EXISTS threads_fts_delete AFTER DELETE ON threads BEGIN
+  INSERT INTO threads_fts(threads_fts, rowid, "name") VALUES ('delete', old.rowid, old."name");
+END;
+CREATE TRIGGER IF NOT EXISTS threads_fts_update AFTER UPDATE OF "name" ON threads BEGIN
+  INSERT INTO threads_fts(threads_fts, rowid, "name") VALUES ('delete', old.rowid, old."name");
+  INSERT INTO threads_fts(rowid, "name") VALUES (new.rowid, new."name");
+END;
+
+-- Index the rows that existed before the search tables were created. The
+-- triggers keep the indexes filled afterwards, so this only runs once.
+INSERT INTO steps_fts(steps_fts) SELECT 'rebuild'
+WHERE NOT EXISTS (SELECT 1 FROM steps_fts_docsize) AND EXISTS (SELECT 1 FROM steps);
+INSERT INTO threads_fts(threads_fts) SELECT 'rebuild'
+WHERE NOT EXISTS (SELECT 1 FROM threads_fts_docsize) AND EXISTS (SELECT 1 FROM threads);
@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from chainlit.logger import logger
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+QueryResult = Union[List[Dict[str, Any]], int]
+
+
+def set_sqlite_pragmas(engine: AsyncEngine, pragmas: Optional[Dict[str, Any]] = None):
+    """Apply the pragmas on every connection the engine opens."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+@dataclass
+class WriteJob:
+    statements: List[Tuple[str, Dict]]
+    future: asyncio.Future
+    # The statements commit together or not at all
+    atomic: bool = False
+
+
+class SQLiteWriter:
+    """
+    Single writer task for a SQLite database.
+
+    SQLite allows one writer at a time, so concurrent transactions contend on
+    the database lock. Statements are instead queued to one task that writes
+    them through a single connection, grouping everything queued meanwhile (up
+    to `max_batch_size` jobs) into one transaction. A failing statement only
+    fails its own caller. Atomic groups of statements get a transaction of
+    their own.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_batch_size: int = 100):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+
+        self._queue: asyncio.Queue[WriteJob] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def execute(self, query: str, parameters: Dict) -> QueryResult:
+        return await self._submit([(query, parameters)], atomic=False)
+
+    async def execute_atomic(self, statements: List[Tuple[str, Dict]]) -> None:
+        """Write statements in one transaction, rolled back if any of them fails."""
+        await self._submit(statements, atomic=True)
+
+    async def _submit(self, statements: List[Tuple[str, Dict]], atomic: bool):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(WriteJob(statements, future, atomic))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def close(self):
+        """Write the queued statements and stop the writer task."""
+        if self._task and not self._task.done():
+            await self._queue.join()
+        task, self._task = self._task, None
+        if task and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.engine.dispose()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < self.max_batch_size:
+                batch.append(self._queue.get_nowait())
+            # Shielded so that close() cannot interrupt a transaction
+            await asyncio.shield(self._write(batch))
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _write(self, batch: List[WriteJob]):
+        # Keep the queue order, the statements queued between atomic groups
+        # share a transaction
+        jobs: List[WriteJob] = []
+        for job in batch:
+            if job.atomic:
+                await self._write_jobs(jobs)
+                jobs = []
+                await self._write_atomic(job)
+            else:
+                jobs.append(job)
+        await self._write_jobs(jobs)
+
+    async def _write_atomic(self, job: WriteJob):
+        try:
+            async with self.engine.begin() as connection:
+                for query, parameters in job.statements:
+                    await connection.execute(text(query), parameters)
+        except Exception as e:
+            logger.warning(f"Failed to write {len(job.statements)} statements: {e!s}")
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        if not job.future.done():
+            job.future.set_result(None)
+
+    async def _write_jobs(self, batch: List[WriteJob]):
+        if not batch:
+            return
+        results: List[Tuple[asyncio.Future, QueryResult]] = []
+        try:
+            async with self.engine.begin() as connection:
+                for job in batch:
+                    ((query, parameters),) = job.statements
+                    try:
+                        result = await connection.execute(text(query), parameters)
+                    except Exception as e:
+                        # SQLite only rolls back the failing statement
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                        continue
+                    if result.returns_rows:
+                        results.append(
+                            (
+                                job.future,
+                                [dict(row._mapping) for row in result.fetchall()],
+                            )
+                        )
+                    else:
+                        results.append((job.future, result.rowcount))
+        except Exception as e:
+            logger.warning(f"Failed to write {len(batch)} statements: {e!s}")
+            # Nothing was committed, fail every caller still waiting
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+
+        for future, value in results:
+            if not future.done():
+                future.set_result(value)
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, AsyncIterable, Dict, Optional, Union
 
 from azure.storage.filedatalake import (
     ContentSettings,
@@ -7,6 +7,7 @@ from azure.storage.filedatalake import (
     FileSystemClient,
 )
 
+from chainlit import make_async
 from chainlit.data.storage_clients.base import BaseStorageClient
 from chainlit.logger import logger
 
@@ -82,3 +83,58 @@ class AzureStorageClient(BaseStorageClient):
         except Exception as e:
             logger.warning(f"AzureStorageClient, upload_file error: {e}")
             return {}
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        try:
+            file_client: DataLakeFileClient = self.container_client.get_file_client(
+                object_key
+            )
+            if not overwrite and await make_async(file_client.exists)():
+                raise Exception(
+                    f"File {object_key} already exists and overwrite is False"
+                )
+            content_settings = ContentSettings(
+                content_type=mime, content_disposition=content_disposition
+            )
+
+            # Append the chunks as they are read, then commit them with a flush
+            await make_async(file_client.create_file)(content_settings=content_settings)
+            offset = 0
+            async for chunk in stream:
+                await make_async(file_client.append_data)(
+                    chunk, offset=offset, length=len(chunk)
+                )
+                offset += len(chunk)
+            await make_async(file_client.flush_data)(
+                offset, content_settings=content_settings
+            )
+
+            url = (
+                f"{file_client.url}{self.sas_token}"
+                if self.sas_token
+                else file_client.url
+            )
+            return {"object_key": object_key, "url": url}
+        except Exception as e:
+            logger.warning(f"AzureStorageClient, upload_stream error: {e}")
+            return {}
+
+    async def delete_file(self, object_key: str) -> bool:
+        try:
+            file_client = self.container_client.get_file_client(object_key)
+            await make_async(file_client.delete_file)()
+            return True
+        except Exception as e:
+            logger.warning(f"AzureStorageClient, delete_file error: {e}")
+            return False
+
+    async def get_read_url(self, object_key: str) -> str:
+        url = self.container_client.get_file_client(object_key).url
+        return f"{url}{self.sas_token}" if self.sas_token else url
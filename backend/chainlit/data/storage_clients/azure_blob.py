@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Union
+from typing import Any, AsyncIterable, Dict, List, Union
 
 from azure.storage.blob import BlobSasPermissions, ContentSettings, generate_blob_sas
 from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
@@ -7,6 +7,9 @@ from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
 from chainlit.logger import logger
 
+# Maximum number of subrequests of a blob batch
+BATCH_MAX_SUBREQUESTS = 256
+
 
 class AzureBlobStorageClient(BaseStorageClient):
     def __init__(self, container_name: str, storage_account: str, storage_key: str):
@@ -54,13 +57,37 @@ class AzureBlobStorageClient(BaseStorageClient):
         mime: str = "application/octet-stream",
         overwrite: bool = True,
         content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return await self._upload_blob(
+            object_key, data, mime, overwrite, content_disposition
+        )
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        # The SDK stages blocks from the iterator as they are read
+        return await self._upload_blob(
+            object_key, stream, mime, overwrite, content_disposition
+        )
+
+    async def _upload_blob(
+        self,
+        object_key: str,
+        data: Union[bytes, AsyncIterable[bytes]],
+        mime: str,
+        overwrite: bool,
+        content_disposition: str | None,
     ) -> Dict[str, Any]:
         try:
             blob_client = self.container_client.get_blob_client(object_key)
 
-            if isinstance(data, str):
-                data = data.encode("utf-8")
-
             content_settings = ContentSettings(
                 content_type=mime, content_disposition=content_disposition
             )
@@ -92,3 +119,22 @@ class AzureBlobStorageClient(BaseStorageClient):
         except Exception as e:
             logger.warning(f"AzureBlobStorageClient, delete_file error: {e}")
             return False
+
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        keys = list(dict.fromkeys(object_keys))
+        results: Dict[str, bool] = {}
+        for offset in range(0, len(keys), BATCH_MAX_SUBREQUESTS):
+            chunk = keys[offset : offset + BATCH_MAX_SUBREQUESTS]
+            try:
+                responses = await self.container_client.delete_blobs(
+                    *chunk, raise_on_any_failure=False
+                )
+                # Responses are in the order of the blobs
+                statuses = [response.status_code async for response in responses]
+                results.update(
+                    (key, 200 <= status < 300) for key, status in zip(chunk, statuses)
+                )
+            except Exception as e:
+                logger.warning(f"AzureBlobStorageClient, delete_files error: {e}")
+                results.update(dict.fromkeys(chunk, False))
+        return results
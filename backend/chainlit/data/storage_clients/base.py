@@ -1,8 +1,56 @@
+import asyncio
 import os
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Union
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Set,
+    TypeVar,
+    Union,
+)
+
+import aiofiles
+
+from chainlit.logger import logger
+
+T = TypeVar("T")
 
 storage_expiry_time = int(os.getenv("STORAGE_EXPIRY_TIME", 3600))
+storage_max_concurrency = int(os.getenv("STORAGE_MAX_CONCURRENCY", 10))
+storage_chunk_size = int(os.getenv("STORAGE_CHUNK_SIZE", 8 * 1024 * 1024))
+
+
+async def read_file_chunks(
+    path: str, chunk_size: int = storage_chunk_size
+) -> AsyncIterator[bytes]:
+    """Read a file from disk `chunk_size` bytes at a time."""
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            yield chunk
+
+
+# Keeps a reference to the running purges so they are not garbage collected
+_purge_tasks: Set["asyncio.Task[Dict[str, bool]]"] = set()
+
+
+async def map_with_concurrency(
+    function: Callable[[str], Awaitable[T]], object_keys: List[str]
+) -> Dict[str, T]:
+    """Call `function` on every key, at most `storage_max_concurrency` at a time."""
+    semaphore = asyncio.Semaphore(storage_max_concurrency)
+    keys = list(dict.fromkeys(object_keys))
+
+    async def call(object_key: str) -> T:
+        async with semaphore:
+            return await function(object_key)
+
+    results = await asyncio.gather(*(call(key) for key in keys))
+    return dict(zip(keys, results))
 
 
 class BaseStorageClient(ABC):
@@ -19,10 +67,80 @@ class BaseStorageClient(ABC):
     ) -> Dict[str, Any]:
         pass
 
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Upload the chunks of an async byte iterator.
+
+        The default implementation joins the chunks and calls `upload_file`,
+        clients override it to send the chunks as they are read.
+        """
+        data = b"".join([chunk async for chunk in stream])
+        return await self.upload_file(
+            object_key, data, mime, overwrite, content_disposition
+        )
+
+    async def upload_path(
+        self,
+        object_key: str,
+        path: str,
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        """Upload a file from disk without loading it in memory."""
+        return await self.upload_stream(
+            object_key, read_file_chunks(path), mime, overwrite, content_disposition
+        )
+
     @abstractmethod
     async def delete_file(self, object_key: str) -> bool:
         pass
 
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        """
+        Delete several objects, returning whether each one was deleted.
+
+        Runs at most `storage_max_concurrency` `delete_file` calls at a time,
+        clients with a batch delete API override it.
+        """
+        return await map_with_concurrency(self.delete_file, object_keys)
+
+    def purge_files(self, object_keys: List[str]) -> "asyncio.Task[Dict[str, bool]]":
+        """Delete the objects in a background task, failures are logged."""
+        task = asyncio.create_task(self.delete_files(object_keys))
+        _purge_tasks.add(task)
+
+        def on_done(task: "asyncio.Task[Dict[str, bool]]"):
+            _purge_tasks.discard(task)
+            if task.cancelled():
+                return
+            if error := task.exception():
+                logger.warning(f"Failed to purge {len(object_keys)} files: {error!s}")
+            elif failed := [
+                key for key, deleted in task.result().items() if not deleted
+            ]:
+                logger.warning(f"Failed to purge files: {', '.join(failed)}")
+
+        task.add_done_callback(on_done)
+        return task
+
     @abstractmethod
     async def get_read_url(self, object_key: str) -> str:
         pass
+
+    async def get_read_urls(self, object_keys: List[str]) -> Dict[str, str]:
+        """
+        Get the read URLs of several objects, keyed by object key.
+
+        Runs at most `storage_max_concurrency` `get_read_url` calls at a time.
+        Clients that can sign URLs locally should override this to skip the
+        per-object round trips.
+        """
+        return await map_with_concurrency(self.get_read_url, object_keys)
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterable, Dict, List, Optional, Tuple, Union
+
+from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
+
+
+class CachedStorageClient(BaseStorageClient):
+    """
+    Wraps a storage client to cache the read URLs it generates.
+
+    Entries expire after `ttl` seconds, by default half of `STORAGE_EXPIRY_TIME`
+    so a cached URL stays valid for a while after it is handed out. At most
+    `max_size` URLs are kept, the least recently used ones are evicted first.
+    """
+
+    def __init__(
+        self,
+        client: BaseStorageClient,
+        max_size: int = 1000,
+        ttl: Optional[float] = None,
+    ):
+        self.client = client
+        self.max_size = max_size
+        self.ttl = storage_expiry_time / 2 if ttl is None else ttl
+        if self.ttl >= storage_expiry_time:
+            raise ValueError("ttl must be shorter than STORAGE_EXPIRY_TIME")
+
+        self.hits = 0
+        self.misses = 0
+        self._urls: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+
+    def _get(self, object_key: str) -> Optional[str]:
+        entry = self._urls.get(object_key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._urls.pop(object_key, None)
+            self.misses += 1
+            return None
+        self._urls.move_to_end(object_key)
+        self.hits += 1
+        return entry[1]
+
+    def _set(self, object_key: str, url: str):
+        self._urls[object_key] = (time.monotonic() + self.ttl, url)
+        self._urls.move_to_end(object_key)
+        while len(self._urls) > self.max_size:
+            self._urls.popitem(last=False)
+
+    def invalidate(self, object_key: Optional[str] = None):
+        """Drop the cached URL of an object, or of every object."""
+        if object_key is None:
+            self._urls.clear()
+        else:
+            self._urls.pop(object_key, None)
+
+    async def get_read_url(self, object_key: str) -> str:
+        url = self._get(object_key)
+        if url is None:
+            url = await self.client.get_read_url(object_key)
+            self._set(object_key, url)
+        return url
+
+    async def get_read_urls(self, object_keys: List[str]) -> Dict[str, str]:
+        urls: Dict[str, str] = {}
+        missing: List[str] = []
+        for object_key in dict.fromkeys(object_keys):
+            url = self._get(object_key)
+            if url is None:
+                missing.append(object_key)
+            else:
+                urls[object_key] = url
+
+        if missing:
+            for object_key, url in (await self.client.get_read_urls(missing)).items():
+                self._set(object_key, url)
+                urls[object_key] = url
+
+        return {
+            object_key: urls[object_key] for object_key in dict.fromkeys(object_keys)
+        }
+
+    async def upload_file(
+        self,
+        object_key: str,
+        data: Union[bytes, str],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        self.invalidate(object_key)
+        return await self.client.upload_file(
+            object_key, data, mime, overwrite, content_disposition
+        )
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        self.invalidate(object_key)
+        return await self.client.upload_stream(
+            object_key, stream, mime, overwrite, content_disposition
+        )
+
+    async def upload_path(
+        self,
+        object_key: str,
+        path: str,
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        self.invalidate(object_key)
+        return await self.client.upload_path(
+            object_key, path, mime, overwrite, content_disposition
+        )
+
+    async def delete_file(self, object_key: str) -> bool:
+        self.invalidate(object_key)
+        return await self.client.delete_file(object_key)
+
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        for object_key in object_keys:
+            self.invalidate(object_key)
+        return await self.client.delete_files(object_keys)
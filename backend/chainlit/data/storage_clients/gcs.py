@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, Union
+from typing import Any, AsyncIterable, Dict, List, Optional, Union
 
 from google.auth import default
 from google.cloud import storage  # type: ignore
@@ -8,8 +8,18 @@ from chainlit import make_async
 from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
 from chainlit.logger import logger
 
+# Maximum number of calls of a batch request
+BATCH_MAX_CALLS = 100
+
 
 class GCSStorageClient(BaseStorageClient):
+    """
+    Google Cloud Storage client.
+
+    The `content_disposition` of uploads is not stored, files are served
+    with their signed URL as they are.
+    """
+
     def __init__(
         self,
         bucket_name: str,
@@ -89,6 +99,64 @@ class GCSStorageClient(BaseStorageClient):
             object_key, data, mime, overwrite
         )
 
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        try:
+            blob = self.bucket.blob(object_key)
+
+            if not overwrite and await make_async(blob.exists)():
+                raise Exception(
+                    f"File {object_key} already exists and overwrite is False"
+                )
+
+            # Resumable upload, the writer sends the data one chunk at a time
+            writer = await make_async(blob.open)("wb", content_type=mime)
+            try:
+                async for chunk in stream:
+                    await make_async(writer.write)(chunk)
+            finally:
+                await make_async(writer.close)()
+
+            return {
+                "object_key": object_key,
+                "url": await self.get_read_url(object_key),
+            }
+
+        except Exception as e:
+            raise Exception(f"Failed to upload file to GCS: {e!s}")
+
+    async def upload_path(
+        self,
+        object_key: str,
+        path: str,
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        try:
+            blob = self.bucket.blob(object_key)
+
+            if not overwrite and await make_async(blob.exists)():
+                raise Exception(
+                    f"File {object_key} already exists and overwrite is False"
+                )
+
+            await make_async(blob.upload_from_filename)(path, content_type=mime)
+
+            return {
+                "object_key": object_key,
+                "url": await self.get_read_url(object_key),
+            }
+
+        except Exception as e:
+            raise Exception(f"Failed to upload file to GCS: {e!s}")
+
     def sync_delete_file(self, object_key: str) -> bool:
         try:
             self.bucket.blob(object_key).delete()
@@ -99,3 +167,34 @@ class GCSStorageClient(BaseStorageClient):
 
     async def delete_file(self, object_key: str) -> bool:
         return await make_async(self.sync_delete_file)(object_key)
+
+    def sync_delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        keys = list(dict.fromkeys(object_keys))
+        results: Dict[str, bool] = {}
+        for offset in range(0, len(keys), BATCH_MAX_CALLS):
+            chunk = keys[offset : offset + BATCH_MAX_CALLS]
+            try:
+                # The deletions are sent together when the batch exits, a
+                # failed one does not raise but leaves its status
+                with self.client.batch(raise_exception=False) as batch:
+                    for object_key in chunk:
+                        self.bucket.delete_blob(object_key)
+                # Responses are in the order of the blobs. The batch has no
+                # public accessor for them, check the blobs left otherwise.
+                responses = getattr(batch, "_responses", None)
+                if isinstance(responses, list) and len(responses) == len(chunk):
+                    results.update(
+                        (key, 200 <= response.status_code < 300)
+                        for key, response in zip(chunk, responses)
+                    )
+                else:
+                    results.update(
+                        (key, not self.bucket.blob(key).exists()) for key in chunk
+                    )
+            except Exception as e:
+                logger.warning(f"GCSStorageClient, delete_files error: {e}")
+                results.update(dict.fromkeys(chunk, False))
+        return results
+
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        return await make_async(self.sync_delete_files)(object_keys)
@@ -0,0 +1,260 @@
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterable, Dict, List, Optional, Union
+from urllib.parse import quote
+
+import aiofiles
+
+from chainlit import make_async
+from chainlit._utils import is_path_inside
+from chainlit.auth.jwt import get_jwt_secret
+from chainlit.config import APP_ROOT, config
+from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
+from chainlit.logger import logger
+
+_local_storage_client: Optional["LocalStorageClient"] = None
+
+
+def get_local_storage_client() -> Optional["LocalStorageClient"]:
+    """Return the local storage client serving the `/storage` route, if any."""
+    return _local_storage_client
+
+
+class LocalStorageClient(BaseStorageClient):
+    """
+    Stores files on the local disk, for single node deployments.
+
+    File contents are stored once under `blobs/` by SHA-256, and each object key
+    is a hard link to its blob in `objects/`. Identical files uploaded in many
+    threads therefore take the space of one, and the link count of a blob is its
+    reference count: a blob is removed when its last object is deleted or
+    overwritten. Every file is written to `tmp/` first and renamed into place so
+    readers never see a partial file.
+
+    Read URLs point to the `/storage` route and are signed with
+    `CHAINLIT_AUTH_SECRET`, they expire after `STORAGE_EXPIRY_TIME`.
+    """
+
+    def __init__(self, root: Optional[str] = None, secret: Optional[str] = None):
+        global _local_storage_client
+
+        self.root = Path(
+            root or os.getenv("LOCAL_STORAGE_PATH") or Path(APP_ROOT) / ".storage"
+        ).resolve()
+        for directory in ("blobs", "objects", "metadata", "tmp"):
+            (self.root / directory).mkdir(parents=True, exist_ok=True)
+
+        secret = secret or get_jwt_secret()
+        if not secret:
+            logger.warning(
+                "LocalStorageClient: CHAINLIT_AUTH_SECRET is not set, read URLs are only valid until the server restarts."
+            )
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode()
+
+        _local_storage_client = self
+        logger.info("LocalStorageClient initialized")
+
+    def get_object_path(self, object_key: str) -> Path:
+        path = self.root / "objects" / object_key
+        if not is_path_inside(path, self.root / "objects"):
+            raise ValueError(f"Invalid object key {object_key}")
+        return path
+
+    def _metadata_path(self, object_key: str) -> Path:
+        path = self.root / "metadata" / f"{object_key}.json"
+        if not is_path_inside(path, self.root / "metadata"):
+            raise ValueError(f"Invalid object key {object_key}")
+        return path
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _tmp_path(self) -> Path:
+        return self.root / "tmp" / uuid.uuid4().hex
+
+    def get_metadata(self, object_key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._metadata_path(object_key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_metadata(self, object_key: str, metadata: Dict[str, Any]):
+        path = self._metadata_path(object_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._tmp_path()
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, path)
+
+    def _release(self, digest: str):
+        """Remove the blob if no object links to it anymore."""
+        blob_path = self._blob_path(digest)
+        with contextlib.suppress(FileNotFoundError):
+            if blob_path.stat().st_nlink <= 1:
+                blob_path.unlink()
+
+    def _store(
+        self,
+        object_key: str,
+        tmp_path: Path,
+        digest: str,
+        mime: str,
+        overwrite: bool,
+        content_disposition: str | None,
+    ) -> Dict[str, Any]:
+        """Move a fully written temporary file into place as `object_key`."""
+        try:
+            object_path = self.get_object_path(object_key)
+            if not overwrite and object_path.exists():
+                raise FileExistsError(
+                    f"File {object_key} already exists and overwrite is False"
+                )
+            previous = self.get_metadata(object_key)
+
+            blob_path = self._blob_path(digest)
+            blob_path.parent.mkdir(exist_ok=True)
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            link_path = self._tmp_path()
+            while True:
+                # Linking fails if the blob exists, which makes creating it atomic
+                with contextlib.suppress(FileExistsError):
+                    os.link(tmp_path, blob_path)
+                try:
+                    os.link(blob_path, link_path)
+                    break
+                except FileNotFoundError:
+                    # The blob was released in between, store it again
+                    continue
+            os.replace(link_path, object_path)
+            # Renaming a link onto another link of the same file is a no-op
+            with contextlib.suppress(FileNotFoundError):
+                link_path.unlink()
+
+            self._write_metadata(
+                object_key,
+                {
+                    "sha256": digest,
+                    "size": blob_path.stat().st_size,
+                    "mime": mime,
+                    "content_disposition": content_disposition,
+                },
+            )
+            if previous and previous["sha256"] != digest:
+                self._release(previous["sha256"])
+
+            return {"object_key": object_key, "url": self.sync_get_read_url(object_key)}
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                tmp_path.unlink()
+
+    def sync_upload_file(
+        self,
+        object_key: str,
+        data: Union[bytes, str],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        tmp_path = self._tmp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self._store(
+            object_key,
+            tmp_path,
+            hashlib.sha256(data).hexdigest(),
+            mime,
+            overwrite,
+            content_disposition,
+        )
+
+    async def upload_file(
+        self,
+        object_key: str,
+        data: Union[bytes, str],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        return await make_async(self.sync_upload_file)(
+            object_key, data, mime, overwrite, content_disposition
+        )
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        tmp_path = self._tmp_path()
+        sha256 = hashlib.sha256()
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in stream:
+                    sha256.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                tmp_path.unlink()
+            raise
+        return await make_async(self._store)(
+            object_key,
+            tmp_path,
+            sha256.hexdigest(),
+            mime,
+            overwrite,
+            content_disposition,
+        )
+
+    def sync_delete_file(self, object_key: str) -> bool:
+        try:
+            metadata = self.get_metadata(object_key)
+            self.get_object_path(object_key).unlink()
+            self._metadata_path(object_key).unlink(missing_ok=True)
+            if metadata:
+                self._release(metadata["sha256"])
+            return True
+        except Exception as e:
+            logger.warning(f"LocalStorageClient, delete_file error: {e}")
+            return False
+
+    async def delete_file(self, object_key: str) -> bool:
+        return await make_async(self.sync_delete_file)(object_key)
+
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        def delete_files() -> Dict[str, bool]:
+            return {
+                key: self.sync_delete_file(key) for key in dict.fromkeys(object_keys)
+            }
+
+        return await make_async(delete_files)()
+
+    def _sign(self, object_key: str, expires: int) -> str:
+        message = f"{object_key}:{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, object_key: str, expires: int, signature: str) -> bool:
+        return expires > time.time() and hmac.compare_digest(
+            self._sign(object_key, expires), signature
+        )
+
+    def sync_get_read_url(self, object_key: str) -> str:
+        expires = int(time.time()) + storage_expiry_time
+        signature = self._sign(object_key, expires)
+        return f"{config.run.root_path}/storage/{quote(object_key)}?expires={expires}&signature={signature}"
+
+    async def get_read_url(self, object_key: str) -> str:
+        # Signing is local, no need for a thread
+        return self.sync_get_read_url(object_key)
@@ -1,26 +1,90 @@
+import asyncio
+import functools
 import os
-from typing import Any, Dict, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    TypeVar,
+    Union,
+)
 
 import boto3  # type: ignore
+from botocore.config import Config  # type: ignore
 
-from chainlit import make_async
 from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
 from chainlit.logger import logger
 
+T = TypeVar("T")
+
+# S3 rejects multipart uploads whose parts (except the last) are smaller
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Maximum number of keys of a DeleteObjects call
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+
+async def rechunk(stream: AsyncIterable[bytes], size: int) -> AsyncIterator[bytes]:
+    """Regroup the chunks of a stream into `size` bytes chunks."""
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
 
 class S3StorageClient(BaseStorageClient):
     """
     Class to enable Amazon S3 storage provider
     """
 
-    def __init__(self, bucket: str, **kwargs: Any):
+    def __init__(
+        self,
+        bucket: str,
+        max_pool_connections: int = 10,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunksize: int = 8 * 1024 * 1024,
+        **kwargs: Any,
+    ):
+        if multipart_chunksize < MIN_PART_SIZE:
+            raise ValueError(f"multipart_chunksize must be at least {MIN_PART_SIZE}")
+
+        self.bucket = bucket
+        self.max_pool_connections = max_pool_connections
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+
+        # boto3 is blocking, its calls run on a dedicated pool of threads (one
+        # per pooled connection) instead of the thread pool shared by make_async
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_pool_connections, thread_name_prefix="chainlit-s3"
+        )
         try:
-            self.bucket = bucket
-            self.client = boto3.client("s3", **kwargs)
+            config = Config(max_pool_connections=max_pool_connections)
+            if "config" in kwargs:
+                config = kwargs.pop("config").merge(config)
+            self.client = boto3.client("s3", config=config, **kwargs)
             logger.info("S3StorageClient initialized")
         except Exception as e:
             logger.warning(f"S3StorageClient initialization error: {e}")
 
+    async def _run(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call a blocking method on the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(method, *args, **kwargs)
+        )
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
     def sync_get_read_url(self, object_key: str) -> str:
         try:
             url = self.client.generate_presigned_url(
@@ -34,7 +98,18 @@ class S3StorageClient(BaseStorageClient):
             return object_key
 
     async def get_read_url(self, object_key: str) -> str:
-        return await make_async(self.sync_get_read_url)(object_key)
+        return await self._run(self.sync_get_read_url, object_key)
+
+    def sync_get_read_urls(self, object_keys: List[str]) -> Dict[str, str]:
+        return {key: self.sync_get_read_url(key) for key in dict.fromkeys(object_keys)}
+
+    async def get_read_urls(self, object_keys: List[str]) -> Dict[str, str]:
+        # Presigning is computed locally, sign every key in a single thread hop
+        return await self._run(self.sync_get_read_urls, object_keys)
+
+    def _object_url(self, object_key: str) -> str:
+        endpoint = os.environ.get("DEV_AWS_ENDPOINT", "amazonaws.com")
+        return f"https://{self.bucket}.s3.{endpoint}/{object_key}"
 
     def sync_upload_file(
         self,
@@ -57,9 +132,7 @@ class S3StorageClient(BaseStorageClient):
                 self.client.put_object(
                     Bucket=self.bucket, Key=object_key, Body=data, ContentType=mime
                 )
-            endpoint = os.environ.get("DEV_AWS_ENDPOINT", "amazonaws.com")
-            url = f"https://{self.bucket}.s3.{endpoint}/{object_key}"
-            return {"object_key": object_key, "url": url}
+            return {"object_key": object_key, "url": self._object_url(object_key)}
         except Exception as e:
             logger.warning(f"S3StorageClient, upload_file error: {e}")
             return {}
@@ -72,10 +145,144 @@ class S3StorageClient(BaseStorageClient):
         overwrite: bool = True,
         content_disposition: str | None = None,
     ) -> Dict[str, Any]:
-        return await make_async(self.sync_upload_file)(
-            object_key, data, mime, overwrite, content_disposition
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if len(data) < self.multipart_threshold:
+            return await self._run(
+                self.sync_upload_file,
+                object_key,
+                data,
+                mime,
+                overwrite,
+                content_disposition,
+            )
+
+        async def split() -> AsyncIterator[bytes]:
+            for offset in range(0, len(data), self.multipart_chunksize):
+                yield data[offset : offset + self.multipart_chunksize]
+
+        return await self._multipart_upload(
+            object_key, split(), mime, content_disposition
+        )
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterable[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        content_disposition: str | None = None,
+    ) -> Dict[str, Any]:
+        parts = rechunk(stream, self.multipart_chunksize)
+
+        # Read up to the threshold to pick between a single PUT and multipart
+        head: List[bytes] = []
+        size = 0
+        async for part in parts:
+            head.append(part)
+            size += len(part)
+            if size >= self.multipart_threshold:
+                break
+        else:
+            return await self._run(
+                self.sync_upload_file,
+                object_key,
+                b"".join(head),
+                mime,
+                overwrite,
+                content_disposition,
+            )
+
+        async def all_parts() -> AsyncIterator[bytes]:
+            while head:
+                yield head.pop(0)
+            async for part in parts:
+                yield part
+
+        return await self._multipart_upload(
+            object_key, all_parts(), mime, content_disposition
         )
 
+    async def _multipart_upload(
+        self,
+        object_key: str,
+        parts: AsyncIterator[bytes],
+        mime: str,
+        content_disposition: str | None,
+    ) -> Dict[str, Any]:
+        """
+        Upload the parts in parallel, with at most `max_pool_connections` of
+        them read and in flight at a time.
+        """
+        try:
+            extra_args = {"ContentType": mime}
+            if content_disposition is not None:
+                extra_args["ContentDisposition"] = content_disposition
+            upload = await self._run(
+                self.client.create_multipart_upload,
+                Bucket=self.bucket,
+                Key=object_key,
+                **extra_args,
+            )
+        except Exception as e:
+            logger.warning(f"S3StorageClient, upload_file error: {e}")
+            return {}
+
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(self.max_pool_connections)
+        tasks: List[asyncio.Task] = []
+
+        async def upload_part(part_number: int, body: bytes) -> Dict[str, Any]:
+            try:
+                response = await self._run(
+                    self.client.upload_part,
+                    Bucket=self.bucket,
+                    Key=object_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+                return {"ETag": response["ETag"], "PartNumber": part_number}
+            finally:
+                semaphore.release()
+
+        try:
+            async for body in parts:
+                await semaphore.acquire()
+                # Stop reading the stream as soon as a part failed
+                for task in tasks:
+                    if task.done() and task.exception():
+                        raise task.exception()  # type: ignore[misc]
+                tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, body)))
+            await self._run(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": await asyncio.gather(*tasks)},
+            )
+            return {"object_key": object_key, "url": self._object_url(object_key)}
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Don't leave the uploaded parts billed in the bucket
+            try:
+                await self._run(
+                    self.client.abort_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=object_key,
+                    UploadId=upload_id,
+                )
+            except Exception as abort_error:
+                logger.warning(
+                    f"S3StorageClient, abort_multipart_upload error: {abort_error}"
+                )
+            if not isinstance(e, Exception):
+                raise
+            logger.warning(f"S3StorageClient, upload_file error: {e}")
+            return {}
+
     def sync_delete_file(self, object_key: str) -> bool:
         try:
             self.client.delete_object(Bucket=self.bucket, Key=object_key)
@@ -85,4 +292,40 @@ class S3StorageClient(BaseStorageClient):
             return False
 
     async def delete_file(self, object_key: str) -> bool:
-        return await make_async(self.sync_delete_file)(object_key)
+        return await self._run(self.sync_delete_file, object_key)
+
+    def sync_delete_objects(self, object_keys: List[str]) -> Dict[str, bool]:
+        try:
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in object_keys],
+                    "Quiet": True,
+                },
+            )
+        except Exception as e:
+            logger.warning(f"S3StorageClient, delete_files error: {e}")
+            return dict.fromkeys(object_keys, False)
+
+        results = dict.fromkeys(object_keys, True)
+        for error in response.get("Errors", []):
+            logger.warning(
+                f"S3StorageClient, delete_files error: {error['Key']} {error['Message']}"
+            )
+            results[error["Key"]] = False
+        return results
+
+    async def delete_files(self, object_keys: List[str]) -> Dict[str, bool]:
+        keys = list(dict.fromkeys(object_keys))
+        results: Dict[str, bool] = {}
+        for chunk_results in await asyncio.gather(
+            *(
+                self._run(
+                    self.sync_delete_objects,
+                    keys[offset : offset + DELETE_OBJECTS_MAX_KEYS],
+                )
+                for offset in range(0, len(keys), DELETE_OBJECTS_MAX_KEYS)
+            )
+        ):
+            results.update(chunk_results)
+        return results
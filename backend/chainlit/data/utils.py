@@ -1,5 +1,9 @@
+import base64
+import binascii
 import functools
+import json
 from collections import deque
+from typing import Any, List, Optional, Sequence
 
 from chainlit.context import context
 from chainlit.session import WebsocketSession
@@ -27,3 +31,19 @@ def queue_until_user_message():
         return wrapper
 
     return decorator
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode keyset pagination values into an opaque, url-safe cursor."""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[List[Any]]:
+    """Decode a cursor built by `encode_cursor`, None if it is not one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from chainlit.logger import logger
+
+T = TypeVar("T")
+
+
+def merge_non_null(previous: Any, current: Any) -> Any:
+    """Overlay the non-null values of `current` on top of `previous`."""
+    return {**previous, **{k: v for k, v in current.items() if v is not None}}
+
+
+class WriteBuffer(Generic[T]):
+    """
+    Bounded write-behind buffer that coalesces writes by key.
+
+    Items are flushed in insertion order through `flush_fn` once `max_size`
+    distinct keys are pending or `flush_interval` seconds elapsed since the
+    first pending write, whichever comes first. Writing to a key that is
+    already pending replaces (or merges into, see `merge_fn`) the pending
+    item instead of queueing a second write.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[T]], Awaitable[None]],
+        max_size: int = 100,
+        flush_interval: float = 0.5,
+        merge_fn: Optional[Callable[[T, T], T]] = None,
+    ):
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.merge_fn = merge_fn
+
+        self._pending: Dict[str, T] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending
+
+    async def put(self, key: str, item: T):
+        if key in self._pending and self.merge_fn:
+            item = self.merge_fn(self._pending.pop(key), item)
+        else:
+            # Re-insert so that the flush order follows the latest write
+            self._pending.pop(key, None)
+        self._pending[key] = item
+
+        if len(self._pending) >= self.max_size:
+            # Apply backpressure on the producer instead of growing unbounded
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def discard(self, predicate: Callable[[str, T], bool]):
+        """Drop pending items matching the predicate without writing them."""
+        for key in [k for k, v in self._pending.items() if predicate(k, v)]:
+            del self._pending[key]
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            items = list(self._pending.values())
+            self._pending = {}
+            try:
+                await self.flush_fn(items)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(items)} buffered writes: {e!s}")
+
+    async def wait_for_flush(self):
+        """Wait until the flush in progress, if any, is written."""
+        async with self._lock:
+            pass
+
+    async def close(self):
+        """Cancel the flush timer and drain every pending write."""
+        timer, self._timer = self._timer, None
+        if timer and not timer.done():
+            timer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await timer
+        await self.flush()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Writes arriving during the flush must schedule a new timer
+        self._timer = None
+        # Shielded so that close() cannot drop a batch that is being written
+        await asyncio.shield(self.flush())
@@ -231,20 +231,22 @@ class ChainlitEmitter(BaseChainlitEmitter):
                 user_id = self.session.user.id
             else:
                 user_id = None
-            try:
-                should_tag_thread = (
-                    self.session.chat_profile and config.features.auto_tag_thread
-                )
-                tags = [self.session.chat_profile] if should_tag_thread else None
-                await data_layer.update_thread(
-                    thread_id=self.session.thread_id,
-                    name=interaction,
-                    user_id=user_id,
-                    tags=tags,
-                )
-            except Exception as e:
-                logger.error(f"Error updating thread: {e}")
-            asyncio.create_task(self.session.flush_method_queue())
+            # Create the thread along with the writes queued until now
+            async with data_layer.unit_of_work():
+                try:
+                    should_tag_thread = (
+                        self.session.chat_profile and config.features.auto_tag_thread
+                    )
+                    tags = [self.session.chat_profile] if should_tag_thread else None
+                    await data_layer.update_thread(
+                        thread_id=self.session.thread_id,
+                        name=interaction,
+                        user_id=user_id,
+                        tags=tags,
+                    )
+                except Exception as e:
+                    logger.error(f"Error updating thread: {e}")
+                asyncio.create_task(self.session.flush_method_queue())
 
     async def init_thread(self, interaction: str):
         await self.flush_thread_queues(interaction)
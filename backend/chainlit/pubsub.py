@@ -0,0 +1,19 @@
+import importlib.util
+import os
+from typing import Optional
+
+import socketio
+
+
+def get_client_manager() -> Optional[socketio.AsyncManager]:
+    """
+    Return the client manager shared by the workers through Redis when
+    `CHAINLIT_PUBSUB_URL` is set, otherwise the socket.io default is used.
+    """
+    if url := os.getenv("CHAINLIT_PUBSUB_URL"):
+        if importlib.util.find_spec("redis") is None:
+            raise ValueError(
+                "The redis package is required to share the clients of several workers. Run `pip install chainlit[redis]`"
+            )
+        return socketio.AsyncRedisManager(url, channel="chainlit:socketio")
+    return None
@@ -61,6 +61,7 @@ from chainlit.data.acl import is_thread_author
 from chainlit.logger import logger
 from chainlit.markdown import get_markdown_str
 from chainlit.oauth_providers import get_oauth_provider
+from chainlit.pubsub import get_client_manager
 from chainlit.secret import random_secret
 from chainlit.types import (
     AskFileSpec,
@@ -73,6 +74,7 @@ from chainlit.types import (
     GetThreadsRequest,
     ShareThreadRequest,
     Theme,
+    ThreadFilter,
     UpdateFeedbackRequest,
     UpdateThreadRequest,
 )
@@ -91,6 +93,13 @@ async def lifespan(app: FastAPI):
     if config.code.on_app_startup:
         await config.code.on_app_startup()
 
+    if data_layer := get_data_layer():
+        try:
+            # Warm up connection pools so the first user doesn't pay for it
+            await data_layer.connect()
+        except Exception as e:
+            logger.error(f"Error connecting data layer: {e}")
+
     host = config.run.host
     port = config.run.port
     root_path = os.getenv("CHAINLIT_ROOT_PATH", "")
@@ -182,6 +191,31 @@ async def lifespan(app: FastAPI):
         except asyncio.exceptions.CancelledError:
             pass
 
+        from chainlit.session import ws_sessions_id
+        from chainlit.session_registry import session_registry
+        from chainlit.session_store import get_session_store, save_session
+
+        await session_registry.close()
+
+        if session_store := get_session_store():
+            try:
+                # Hand the live sessions over to the workers that keep running
+                await asyncio.gather(
+                    *(
+                        save_session(session)
+                        for session in list(ws_sessions_id.values())
+                    )
+                )
+                await session_store.close()
+            except Exception as e:
+                logger.error(f"Error closing session store: {e}")
+
+        if data_layer := get_data_layer():
+            try:
+                await data_layer.close()
+            except Exception as e:
+                logger.error(f"Error closing data layer: {e}")
+
         if FILES_DIRECTORY.is_dir():
             shutil.rmtree(FILES_DIRECTORY)
 
@@ -221,7 +255,9 @@ copilot_build_dir = get_build_dir(os.path.join("libs", "copilot"), "copilot")
 
 app = FastAPI(lifespan=lifespan)
 
-sio = socketio.AsyncServer(cors_allowed_origins=[], async_mode="asgi")
+sio = socketio.AsyncServer(
+    cors_allowed_origins=[], async_mode="asgi", client_manager=get_client_manager()
+)
 
 asgi_app = socketio.ASGIApp(socketio_server=sio, socketio_path="")
 
@@ -939,6 +975,36 @@ async def get_user_threads(
     return JSONResponse(content=res.to_dict())
 
 
+@router.post("/project/threads/count")
+async def count_user_threads(
+    request: Request,
+    payload: ThreadFilter,
+    current_user: UserParam,
+):
+    """Count the threads matching a filter."""
+
+    data_layer = get_data_layer()
+
+    if not data_layer:
+        raise HTTPException(status_code=400, detail="Data persistence is not enabled")
+
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if not isinstance(current_user, PersistedUser):
+        persisted_user = await data_layer.get_user(identifier=current_user.identifier)
+        if not persisted_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        payload.userId = persisted_user.id
+    else:
+        payload.userId = current_user.id
+
+    total = await data_layer.count_threads(payload)
+    if total is None:
+        raise HTTPException(status_code=501, detail="Counting threads is not supported")
+    return JSONResponse(content={"total": total})
+
+
 @router.get("/project/thread/{thread_id}")
 async def get_thread(
     request: Request,
@@ -1638,6 +1704,34 @@ async def get_file(
         raise HTTPException(status_code=404, detail="File not found")
 
 
+@router.get("/storage/{object_key:path}")
+async def get_storage_file(object_key: str, expires: int, signature: str):
+    """Serve a file of the local storage client from a signed read URL."""
+    from chainlit.data.storage_clients.local import get_local_storage_client
+
+    storage_client = get_local_storage_client()
+    if not storage_client:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if not storage_client.verify_signature(object_key, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+
+    metadata = storage_client.get_metadata(object_key)
+    if not metadata:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = {}
+    if metadata["content_disposition"]:
+        headers["Content-Disposition"] = metadata["content_disposition"]
+
+    # FileResponse answers range requests and uses sendfile when available
+    return FileResponse(
+        storage_client.get_object_path(object_key),
+        media_type=metadata["mime"],
+        headers=headers,
+    )
+
+
 @router.get("/favicon")
 async def get_favicon():
     """Get the favicon for the UI."""
@@ -1796,6 +1890,27 @@ async def generic_oauth_callback(provider: str, request: Request):
         return RedirectResponse(url=f"/?error=callback_error&provider={provider}")
 
 
+@router.get("/admin/sessions")
+async def get_sessions_usage(request: Request):
+    """Return the sessions held in memory by this worker, with their approximate size."""
+    import hmac
+
+    from chainlit.session_registry import session_registry
+
+    admin_token = os.environ.get("CHAINLIT_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    auth_header = request.headers.get("Authorization") or ""
+    scheme, _, token = auth_header.partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.strip().encode(), admin_token.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return JSONResponse(content=session_registry.report())
+
+
 @router.get("/{full_path:path}")
 async def serve(request: Request):
     """Serve the UI files."""
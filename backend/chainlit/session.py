@@ -21,6 +21,9 @@ if TYPE_CHECKING:
 
 ClientType = Literal["webapp", "copilot", "teams", "slack", "discord"]
 
+# User session keys mirroring the session fields, see UserSession.get
+SESSION_FIELDS = ("id", "env", "chat_settings", "user", "chat_profile", "client_type")
+
 
 class JSONEncoderIgnoreNonSerializable(json.JSONEncoder):
     def default(self, o):
@@ -31,18 +34,17 @@ class JSONEncoderIgnoreNonSerializable(json.JSONEncoder):
 
 
 def clean_metadata(metadata: Dict, max_size: int = 1048576):
-    cleaned_metadata = json.loads(
-        json.dumps(metadata, cls=JSONEncoderIgnoreNonSerializable, ensure_ascii=False)
+    serialized = json.dumps(
+        metadata, cls=JSONEncoderIgnoreNonSerializable, ensure_ascii=False
     )
 
-    metadata_size = len(json.dumps(cleaned_metadata).encode("utf-8"))
-    if metadata_size > max_size:
+    if len(serialized.encode("utf-8")) > max_size:
         # Redact the metadata if it exceeds the maximum size
-        cleaned_metadata = {
+        return {
             "message": f"Metadata size exceeds the limit of {max_size} bytes. Redacted."
         }
 
-    return cleaned_metadata
+    return json.loads(serialized)
 
 
 class BaseSession:
@@ -87,6 +89,8 @@ class BaseSession:
         self.id = id
 
         self.chat_settings: Dict[str, Any] = {}
+        # Metadata last persisted with the thread
+        self.persisted_metadata: Dict[str, Any] = {}
 
     @property
     def files_dir(self):
@@ -307,6 +311,86 @@ class WebsocketSession(BaseSession):
         self.config = cfg
         return cfg
 
+    def to_state(self) -> Dict[str, Any]:
+        """
+        Snapshot the serializable state of the session for the session store.
+
+        User session values that can't be serialized to JSON are left out.
+        """
+        from chainlit.chat_context import chat_contexts
+        from chainlit.user_session import user_sessions
+
+        values = {}
+        for key, value in (user_sessions.get(self.id) or {}).items():
+            # These are copied from the session itself by UserSession.get
+            if key in SESSION_FIELDS:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            values[key] = value
+
+        return {
+            "id": self.id,
+            "thread_id": self.thread_id,
+            "client_type": self.client_type,
+            "user_identifier": self.user.identifier if self.user else None,
+            "user_env": self.user_env,
+            "chat_profile": self.chat_profile,
+            "chat_settings": clean_metadata(self.chat_settings),
+            "has_first_interaction": self.has_first_interaction,
+            "persisted_metadata": self.persisted_metadata,
+            "user_session": values,
+            "chat_context": [
+                message.to_dict() for message in chat_contexts.get(self.id, [])
+            ],
+        }
+
+    @classmethod
+    def from_state(
+        cls,
+        state: Dict[str, Any],
+        socket_id: str,
+        emit: Callable[[str, Any], None],
+        emit_call: Callable[[Literal["ask", "call_fn"], Any, Optional[int]], Any],
+        environ: Optional[dict[str, Any]] = None,
+        user: Optional[Union["User", "PersistedUser"]] = None,
+        token: Optional[str] = None,
+    ) -> "WebsocketSession":
+        """Rebuild a session saved by another worker, as a restored session."""
+        from chainlit.chat_context import chat_contexts
+        from chainlit.context import init_ws_context
+        from chainlit.message import Message
+        from chainlit.user_session import user_sessions
+
+        session = cls(
+            id=state["id"],
+            socket_id=socket_id,
+            emit=emit,
+            emit_call=emit_call,
+            user_env=state["user_env"],
+            client_type=state["client_type"],
+            environ=environ,
+            user=user,
+            token=token,
+            chat_profile=state["chat_profile"],
+        )
+        # The thread is already running, it is not resumed
+        session.thread_id = state["thread_id"]
+        session.has_first_interaction = state["has_first_interaction"]
+        session.chat_settings = state["chat_settings"]
+        session.persisted_metadata = state["persisted_metadata"]
+        session.restored = True
+
+        user_sessions[session.id] = dict(state["user_session"])
+        # Messages take their thread id from the context
+        init_ws_context(session)
+        chat_contexts[session.id] = [
+            Message.from_dict(step) for step in state["chat_context"]
+        ]
+        return session
+
     def restore(self, new_socket_id: str):
         """Associate a new socket id to the session."""
         ws_sessions_sid.pop(self.socket_id, None)
@@ -314,10 +398,10 @@ class WebsocketSession(BaseSession):
         self.socket_id = new_socket_id
         self.restored = True
 
-    async def delete(self):
-        """Delete the session."""
-        if self.files_dir.is_dir():
-            shutil.rmtree(self.files_dir)
+    async def delete(self, remove_files: bool = True):
+        """Delete the session. Files can be left to the caller to remove."""
+        if remove_files and self.files_dir.is_dir():
+            await asyncio.to_thread(shutil.rmtree, self.files_dir, True)
         ws_sessions_sid.pop(self.socket_id, None)
         ws_sessions_id.pop(self.id, None)
 
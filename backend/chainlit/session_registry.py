@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import shutil
+import sys
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from chainlit.chat_context import chat_contexts
+from chainlit.config import config
+from chainlit.logger import logger
+from chainlit.session import SESSION_FIELDS, WebsocketSession, ws_sessions_id
+from chainlit.session_store import delete_session_state
+from chainlit.user_session import user_sessions
+
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+# Sessions expiring within this delay (in seconds) are cleared together
+EXPIRY_RESOLUTION = 1.0
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Approximate the memory held by a value, in bytes.
+
+    Builtin containers are measured with their content, other objects only
+    count for themselves as they are usually shared (clients, models...).
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, _CONTAINERS):
+            stack.extend(item)
+    return size
+
+
+@dataclass
+class SessionUsage:
+    """Approximate memory held by a session, in bytes."""
+
+    chat_context: int = 0
+    user_session: int = 0
+    files: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.chat_context + self.user_session + self.files
+
+
+def measure_session(session: WebsocketSession) -> SessionUsage:
+    values = {
+        key: value
+        for key, value in (user_sessions.get(session.id) or {}).items()
+        # Held by the session itself, see UserSession.get
+        if key not in SESSION_FIELDS
+    }
+    return SessionUsage(
+        chat_context=sum(
+            approximate_size(vars(message))
+            for message in chat_contexts.get(session.id, [])
+        ),
+        user_session=approximate_size(values),
+        files=approximate_size(session.files),
+    )
+
+
+def remove_dirs(dirs: List[Path]):
+    for path in dirs:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+async def clear_sessions(sessions: List[WebsocketSession]):
+    """Drop sessions and everything held for them in memory, on disk and in the store."""
+    dirs = []
+    for session in sessions:
+        await delete_session_state(session.id)
+        user_sessions.pop(session.id, None)
+        chat_contexts.pop(session.id, None)
+        session_registry.forget(session.id)
+        dirs.append(session.files_dir)
+        await session.delete(remove_files=False)
+    # Removing many file trees would block the event loop
+    await asyncio.to_thread(remove_dirs, dirs)
+
+
+async def clear_session(session: WebsocketSession):
+    await clear_sessions([session])
+
+
+class SessionRegistry:
+    """
+    Bookkeeping of the websocket sessions held in memory.
+
+    Sessions outlive their connection for `session_timeout` so the client can
+    reconnect. Their expiries are kept in a heap drained by a single task,
+    which clears the sessions expiring together in one batch. Reconnecting
+    cancels the expiry.
+
+    Past `max_sessions` sessions or `max_sessions_memory` bytes, the least
+    recently disconnected sessions are evicted early. Connected sessions are
+    never evicted.
+    """
+
+    def __init__(self):
+        self.usage: Dict[str, SessionUsage] = {}
+        # Session id -> time of the disconnection, oldest first
+        self.disconnected: OrderedDict[str, float] = OrderedDict()
+        self.memory = 0
+        self.evicted = 0
+        # Session id -> monotonic time of the expiry
+        self.deadlines: Dict[str, float] = {}
+        # (deadline, session id), entries left by reconnected sessions are skipped
+        self.expiries: List[Tuple[float, str]] = []
+        self._expiry_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def measure(self, session: WebsocketSession) -> SessionUsage:
+        """Update the memory accounted to a session."""
+        usage = measure_session(session)
+        previous = self.usage.get(session.id)
+        self.memory += usage.total - (previous.total if previous else 0)
+        self.usage[session.id] = usage
+        return usage
+
+    def forget(self, session_id: str):
+        if usage := self.usage.pop(session_id, None):
+            self.memory -= usage.total
+        self.disconnected.pop(session_id, None)
+        self.deadlines.pop(session_id, None)
+
+    def mark_connected(self, session_id: str):
+        self.disconnected.pop(session_id, None)
+        self.deadlines.pop(session_id, None)
+
+    def mark_disconnected(self, session: WebsocketSession, timeout: float):
+        """Account a disconnected session and clear it after `timeout` seconds."""
+        self.measure(session)
+        self.disconnected[session.id] = time.time()
+        self.disconnected.move_to_end(session.id)
+        self.schedule_expiry(session.id, time.monotonic() + timeout)
+
+    def schedule_expiry(self, session_id: str, deadline: float):
+        self.deadlines[session_id] = deadline
+        heapq.heappush(self.expiries, (deadline, session_id))
+
+        # Drop the entries of the sessions that reconnected
+        if len(self.expiries) > 2 * len(self.deadlines) + 64:
+            self.expiries = [
+                entry
+                for entry in self.expiries
+                if self.deadlines.get(entry[1]) == entry[0]
+            ]
+            heapq.heapify(self.expiries)
+
+        task = self._expiry_task
+        if (
+            task is None
+            or task.done()
+            or task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._wakeup = asyncio.Event()
+            self._expiry_task = asyncio.create_task(self.run_expiries())
+        elif self.expiries[0][1] == session_id and self._wakeup:
+            # Expires before the one the task is waiting for
+            self._wakeup.set()
+
+    def pop_expired(self, now: float) -> List[str]:
+        expired = []
+        while self.expiries and self.expiries[0][0] <= now:
+            deadline, session_id = heapq.heappop(self.expiries)
+            if self.deadlines.get(session_id) == deadline:
+                del self.deadlines[session_id]
+                expired.append(session_id)
+        return expired
+
+    async def run_expiries(self):
+        assert self._wakeup
+        while True:
+            if expired := self.pop_expired(time.monotonic()):
+                sessions = [
+                    session
+                    for session_id in expired
+                    if (session := ws_sessions_id.get(session_id))
+                ]
+                try:
+                    await clear_sessions(sessions)
+                except Exception as e:
+                    logger.error(f"Error clearing expired sessions: {e}")
+
+            timeout = None
+            if self.expiries:
+                timeout = max(self.expiries[0][0] - time.monotonic(), EXPIRY_RESOLUTION)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stop clearing the expired sessions."""
+        if self._expiry_task:
+            self._expiry_task.cancel()
+            try:
+                await self._expiry_task
+            except asyncio.CancelledError:
+                pass
+            self._expiry_task = None
+
+    def is_over_limits(self, evicted: int = 0) -> bool:
+        max_sessions = config.project.max_sessions
+        max_memory = config.project.max_sessions_memory
+        return bool(
+            (max_sessions and len(ws_sessions_id) - evicted > max_sessions)
+            or (max_memory and self.memory > max_memory)
+        )
+
+    async def enforce_limits(self):
+        """Evict disconnected sessions, oldest first, until under the limits."""
+        sessions: List[WebsocketSession] = []
+        while self.disconnected and self.is_over_limits(len(sessions)):
+            session_id, _ = self.disconnected.popitem(last=False)
+            if session := ws_sessions_id.get(session_id):
+                logger.info(f"Evicting disconnected session {session_id}")
+                sessions.append(session)
+            # Free its share of the budget right away
+            self.forget(session_id)
+
+        if sessions:
+            self.evicted += len(sessions)
+            await clear_sessions(sessions)
+
+    def report(self) -> Dict[str, Any]:
+        """Measure every session and return the accounting."""
+        sessions: List[Dict[str, Any]] = []
+        for session in list(ws_sessions_id.values()):
+            usage = self.measure(session)
+            disconnected_at: Optional[float] = self.disconnected.get(session.id)
+            sessions.append(
+                {
+                    "id": session.id,
+                    "user": session.user.identifier if session.user else None,
+                    "client_type": session.client_type,
+                    "connected": disconnected_at is None,
+                    "disconnected_at": disconnected_at,
+                    "messages": len(chat_contexts.get(session.id, [])),
+                    "files": len(session.files),
+                    "memory": {**asdict(usage), "total": usage.total},
+                }
+            )
+        sessions.sort(key=lambda s: s["memory"]["total"], reverse=True)
+
+        return {
+            "sessions": len(sessions),
+            "disconnected": len(self.disconnected),
+            "memory": self.memory,
+            "max_sessions": config.project.max_sessions,
+            "max_sessions_memory": config.project.max_sessions_memory,
+            "evicted": self.evicted,
+            "items": sessions,
+        }
+
+
+session_registry = SessionRegistry()
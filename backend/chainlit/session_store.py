@@ -0,0 +1,187 @@
+import importlib.util
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from chainlit.logger import logger
+
+if TYPE_CHECKING:
+    from chainlit.session import WebsocketSession
+
+# Owner of the snapshots saved by this process
+WORKER_ID = uuid.uuid4().hex
+
+
+class SessionStore(ABC):
+    """
+    Stores the serializable state of the websocket sessions, keyed by session id.
+
+    Live sessions are kept in the process that holds their socket, the store
+    holds a snapshot of each one so a reconnection landing on another worker can
+    rebuild the session instead of starting a new one. Snapshots record the
+    worker that saved them last, their owner.
+    """
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def set(self, session_id: str, state: Dict[str, Any], ttl: int) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str, owner: Optional[str] = None) -> None:
+        """Delete a snapshot, when given only if it is owned by `owner`."""
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Keeps the snapshots in the process, sessions do not outlive the worker."""
+
+    # Minimum delay (in seconds) between two sweeps of the expired snapshots
+    purge_interval = 60.0
+
+    def __init__(self):
+        self._states: Dict[str, Tuple[float, str]] = {}
+        self._next_purge = 0.0
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._states.get(session_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._states.pop(session_id, None)
+            return None
+        return json.loads(entry[1])
+
+    async def set(self, session_id: str, state: Dict[str, Any], ttl: int) -> None:
+        now = time.monotonic()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            for expired_id in [
+                key for key, (expiry, _) in self._states.items() if expiry <= now
+            ]:
+                del self._states[expired_id]
+        self._states[session_id] = (now + ttl, json.dumps(state))
+
+    async def delete(self, session_id: str, owner: Optional[str] = None) -> None:
+        if owner is not None:
+            entry = self._states.get(session_id)
+            if entry is None or json.loads(entry[1]).get("owner") != owner:
+                return
+        self._states.pop(session_id, None)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Stores the snapshots in Redis, or any server speaking its protocol, with a
+    TTL so abandoned sessions expire on their own.
+    """
+
+    def __init__(self, url: str, prefix: str = "chainlit:session:"):
+        if importlib.util.find_spec("redis") is None:
+            raise ValueError(
+                "The redis package is required to store the sessions in Redis. Run `pip install chainlit[redis]`"
+            )
+        from redis.asyncio import Redis
+
+        self.client = Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        value = await self.client.get(self.prefix + session_id)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    async def set(self, session_id: str, state: Dict[str, Any], ttl: int) -> None:
+        await self.client.set(self.prefix + session_id, json.dumps(state), ex=ttl)
+
+    async def delete(self, session_id: str, owner: Optional[str] = None) -> None:
+        key = self.prefix + session_id
+        if owner is None:
+            await self.client.delete(key)
+            return
+
+        from redis.exceptions import WatchError
+
+        async with self.client.pipeline() as pipe:
+            try:
+                # The deletion is dropped if another worker saves it meanwhile
+                await pipe.watch(key)
+                value = await pipe.get(key)
+                if value is None or json.loads(value).get("owner") != owner:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    Return the session store, a Redis one when `CHAINLIT_SESSION_STORE_URL` is
+    set. Without it there is no store: the live sessions of the only process
+    are all there is, a copy of them would only double their memory.
+    """
+    global _session_store
+
+    if _session_store is None and (url := os.getenv("CHAINLIT_SESSION_STORE_URL")):
+        _session_store = RedisSessionStore(url)
+
+    return _session_store
+
+
+async def save_session(session: "WebsocketSession"):
+    """
+    Write the snapshot of a session, owned by this worker. Failures are logged
+    and ignored.
+    """
+    from chainlit.config import config
+
+    if not (store := get_session_store()):
+        return
+    try:
+        await store.set(
+            session.id,
+            {**session.to_state(), "owner": WORKER_ID},
+            config.project.session_timeout,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to save session {session.id}: {e}")
+
+
+async def load_session_state(session_id: str) -> Optional[Dict[str, Any]]:
+    """Read the snapshot of a session, failures are logged and ignored."""
+    if not (store := get_session_store()):
+        return None
+    try:
+        return await store.get(session_id)
+    except Exception as e:
+        logger.warning(f"Failed to load session {session_id}: {e}")
+        return None
+
+
+async def delete_session_state(session_id: str):
+    """
+    Delete the snapshot of a session, unless another worker took it over since
+    this one saved it.
+    """
+    if not (store := get_session_store()):
+        return
+    try:
+        await store.delete(session_id, owner=WORKER_ID)
+    except Exception as e:
+        logger.warning(f"Failed to delete session {session_id}: {e}")
@@ -20,6 +20,11 @@ from chainlit.logger import logger
 from chainlit.message import ErrorMessage, Message
 from chainlit.server import sio
 from chainlit.session import WebsocketSession
+from chainlit.session_registry import clear_session, session_registry
+from chainlit.session_store import (
+    load_session_state,
+    save_session,
+)
 from chainlit.types import (
     InputAudioChunk,
     InputAudioChunkPayload,
@@ -40,13 +45,57 @@ def restore_existing_session(sid, session_id, emit_fn, emit_call_fn):
         session.restore(new_socket_id=sid)
         session.emit = emit_fn
         session.emit_call = emit_call_fn
+        session_registry.mark_connected(session.id)
         return True
     return False
 
 
-async def persist_user_session(thread_id: str, metadata: Dict):
+async def hydrate_session(
+    sid, session_id, emit_fn, emit_call_fn, environ, user, token
+) -> bool:
+    """Rebuild a session from the session store, e.g. saved by another worker."""
+    state = await load_session_state(session_id)
+    if not state:
+        return False
+
+    if state["user_identifier"] != (user.identifier if user else None):
+        logger.warning(f"Session {session_id} belongs to another user.")
+        return False
+
+    session = WebsocketSession.from_state(
+        state,
+        socket_id=sid,
+        emit=emit_fn,
+        emit_call=emit_call_fn,
+        environ=environ,
+        user=user,
+        token=token,
+    )
+    # Take the snapshot over, the stale copy of the previous worker must not
+    # delete it when it expires there
+    await save_session(session)
+    return True
+
+
+async def persist_user_session(session: WebsocketSession):
     if data_layer := get_data_layer():
-        await data_layer.update_thread(thread_id=thread_id, metadata=metadata)
+        metadata = session.to_persistable()
+        changes = metadata
+        if data_layer.merges_thread_metadata:
+            changes = {
+                key: value
+                for key, value in metadata.items()
+                if key not in session.persisted_metadata
+                or session.persisted_metadata[key] != value
+            }
+            if not changes:
+                return
+        written = await data_layer.update_thread(
+            thread_id=session.thread_id, metadata=changes
+        )
+        # Keys of a failed write are sent again next time
+        if written or not data_layer.merges_thread_metadata:
+            session.persisted_metadata = metadata
 
 
 async def resume_thread(session: WebsocketSession):
@@ -65,6 +114,7 @@ async def resume_thread(session: WebsocketSession):
         if isinstance(metadata, str):
             metadata = json.loads(metadata)
         user_sessions[session.id] = metadata.copy()
+        session.persisted_metadata = metadata
         if chat_profile := metadata.get("chat_profile"):
             session.chat_profile = chat_profile
         if chat_settings := metadata.get("chat_settings"):
@@ -128,18 +178,27 @@ async def connect(sid, environ, auth):
             logger.error("Authentication failed in websocket connect.")
             raise ConnectionRefusedError("authentication failed")
 
+    # The client is connected to this process, its events, like the streamed
+    # tokens, don't need to go through the message queue of the workers
+
     # Session scoped function to emit to the client
     def emit_fn(event, data):
-        return sio.emit(event, data, to=sid)
+        return sio.emit(event, data, to=sid, ignore_queue=True)
 
     # Session scoped function to emit to the client and wait for a response
     def emit_call_fn(event: Literal["ask", "call_fn"], data, timeout):
-        return sio.call(event, data, timeout=timeout, to=sid)
+        return sio.call(event, data, timeout=timeout, to=sid, ignore_queue=True)
 
     session_id = auth.get("sessionId")
     if restore_existing_session(sid, session_id, emit_fn, emit_call_fn):
         return True
 
+    if session_id and await hydrate_session(
+        sid, session_id, emit_fn, emit_call_fn, environ, user, token
+    ):
+        await session_registry.enforce_limits()
+        return True
+
     user_env_string = auth.get("userEnv")
     user_env = load_user_env(user_env_string)
 
@@ -162,6 +221,7 @@ async def connect(sid, environ, auth):
         thread_id=auth.get("threadId"),
         environ=environ,
     )
+    await session_registry.enforce_limits()
 
     return True
 
@@ -221,25 +281,15 @@ async def disconnect(sid):
         await config.code.on_chat_end()
 
     if session.thread_id and session.has_first_interaction:
-        await persist_user_session(session.thread_id, session.to_persistable())
-
-    async def clear(_sid):
-        if session := WebsocketSession.get(_sid):
-            # Clean up the user session
-            if session.id in user_sessions:
-                user_sessions.pop(session.id)
-            # Clean up the session
-            await session.delete()
+        await persist_user_session(session)
 
     if session.to_clear:
-        await clear(sid)
+        await clear_session(session)
     else:
-
-        async def clear_on_timeout(_sid):
-            await asyncio.sleep(config.project.session_timeout)
-            await clear(_sid)
-
-        asyncio.ensure_future(clear_on_timeout(sid))
+        # Let another worker pick the session up if the client reconnects there
+        await save_session(session)
+        session_registry.mark_disconnected(session, config.project.session_timeout)
+        await session_registry.enforce_limits()
 
 
 @sio.on("stop")  # pyright: ignore [reportOptionalCall]
@@ -274,6 +324,9 @@ async def process_message(session: WebsocketSession, payload: MessagePayload):
         ).send()
     finally:
         await context.emitter.task_end()
+        await save_session(session)
+        session_registry.measure(session)
+        await session_registry.enforce_limits()
 
 
 @sio.on("edit_message")  # pyright: ignore [reportOptionalCall]
@@ -304,6 +357,8 @@ async def edit_message(sid, payload: MessagePayload):
             pass
         finally:
             await context.emitter.task_end()
+            await save_session(session)
+            session_registry.measure(session)
 
 
 @sio.on("client_message")  # pyright: ignore [reportOptionalCall]
@@ -3,6 +3,7 @@ import inspect
 import json
 import time
 import uuid
+from contextlib import nullcontext
 from copy import deepcopy
 from functools import wraps
 from typing import Callable, Dict, List, Optional, TypedDict, Union
@@ -459,7 +460,11 @@ class Step:
             current_steps.remove(self)
             local_steps.set(current_steps)
 
-        await self.update()
+        # Commit the final state of the step and its elements together, the
+        # writes of the nested steps were committed on their own
+        data_layer = get_data_layer()
+        async with data_layer.unit_of_work() if data_layer else nullcontext():
+            await self.update()
 
     def __enter__(self):
         self.start = utc_now()
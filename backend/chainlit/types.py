@@ -21,6 +21,7 @@ if TYPE_CHECKING:
 from dataclasses_json import DataClassJsonMixin
 from pydantic import BaseModel
 from pydantic.dataclasses import dataclass
+from typing_extensions import NotRequired
 
 InputWidgetType = Literal[
     "switch",
@@ -36,6 +37,13 @@ InputWidgetType = Literal[
 ToastType = Literal["info", "success", "warning", "error"]
 
 
+class ThreadSearchMatchDict(TypedDict):
+    # Relevance of the best match in the thread, higher is better
+    rank: float
+    # Matching text with the search terms wrapped in <mark></mark>
+    snippet: Optional[str]
+
+
 class ThreadDict(TypedDict):
     id: str
     createdAt: str
@@ -46,6 +54,8 @@ class ThreadDict(TypedDict):
     metadata: Optional[Dict]
     steps: List["StepDict"]
     elements: Optional[List["ElementDict"]]
+    # Only set by full-text thread searches
+    search: NotRequired[Optional[ThreadSearchMatchDict]]
 
 
 class Pagination(BaseModel):
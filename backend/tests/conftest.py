@@ -1,7 +1,9 @@
+import asyncio
 import datetime
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from unittest.mock import AsyncMock, Mock
 
 import pytest
@@ -113,3 +115,159 @@ def test_config(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
     monkeypatch.setattr("chainlit.config.config", test_config)
 
     return test_config
+
+
+class RedisStandIn:
+    """Local server speaking enough of the Redis protocol for Chainlit."""
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        # Per connection: keys watched, whether one changed, queued commands
+        self.watches: Dict[asyncio.StreamWriter, Set[bytes]] = {}
+        self.dirty: Set[asyncio.StreamWriter] = set()
+        self.transactions: Dict[asyncio.StreamWriter, List[List[bytes]]] = {}
+        self.commands: List[List[bytes]] = []
+        self.connections = 0
+        self.handlers: Set[asyncio.Task] = set()
+        self.server: Optional[asyncio.Server] = None
+
+    @property
+    def url(self) -> str:
+        assert self.server
+        port = self.server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        # The stand-in only speaks RESP2
+        return f"redis://{auth}127.0.0.1:{port}/2?protocol=2"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        assert self.server
+        self.server.close()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    @staticmethod
+    def bulk(value: bytes) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def touch(self, key: bytes):
+        for writer, keys in self.watches.items():
+            if key in keys:
+                self.dirty.add(writer)
+
+    def unwatch(self, writer: asyncio.StreamWriter):
+        self.watches.pop(writer, None)
+        self.dirty.discard(writer)
+
+    def reply(
+        self, command: List[bytes], writer: asyncio.StreamWriter, authenticated: bool
+    ) -> bytes:
+        name = command[0].upper()
+        if name == b"AUTH":
+            if command[-1].decode() != self.password:
+                return b"-WRONGPASS invalid password\r\n"
+            return b"+OK\r\n"
+        if self.password and not authenticated:
+            return b"-NOAUTH Authentication required.\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"MULTI":
+            self.transactions[writer] = []
+            return b"+OK\r\n"
+        if name == b"EXEC":
+            queued = self.transactions.pop(writer, [])
+            aborted = writer in self.dirty
+            self.unwatch(writer)
+            if aborted:
+                return b"*-1\r\n"
+            replies = [self.reply(c, writer, authenticated) for c in queued]
+            return b"*%d\r\n" % len(replies) + b"".join(replies)
+        if name == b"DISCARD":
+            self.transactions.pop(writer, None)
+            self.unwatch(writer)
+            return b"+OK\r\n"
+        if writer in self.transactions:
+            self.transactions[writer].append(command)
+            return b"+QUEUED\r\n"
+        if name == b"WATCH":
+            self.watches.setdefault(writer, set()).update(command[1:])
+            return b"+OK\r\n"
+        if name == b"UNWATCH":
+            self.unwatch(writer)
+            return b"+OK\r\n"
+        if name == b"SET":
+            expires = None
+            if len(command) == 5 and command[3].upper() == b"EX":
+                expires = time.monotonic() + int(command[4])
+            self.data[command[1]] = (command[2], expires)
+            self.touch(command[1])
+            return b"+OK\r\n"
+        if name == b"GET":
+            value, expires = self.data.get(command[1], (None, None))
+            if value is None or (expires is not None and expires <= time.monotonic()):
+                return b"$-1\r\n"
+            return self.bulk(value)
+        if name == b"DEL":
+            deleted = sum(self.data.pop(key, None) is not None for key in command[1:])
+            for key in command[1:]:
+                self.touch(key)
+            return b":%d\r\n" % deleted
+        if name == b"SUBSCRIBE":
+            self.subscribers.setdefault(command[1], set()).add(writer)
+            return (
+                b"*3\r\n" + self.bulk(b"subscribe") + self.bulk(command[1]) + b":1\r\n"
+            )
+        if name == b"PUBLISH":
+            subscribers = self.subscribers.get(command[1], set())
+            message = (
+                b"*3\r\n"
+                + self.bulk(b"message")
+                + self.bulk(command[1])
+                + self.bulk(command[2])
+            )
+            for subscriber in subscribers:
+                subscriber.write(message)
+            return b":%d\r\n" % len(subscribers)
+        return b"-ERR unknown command\r\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        handler = asyncio.current_task()
+        assert handler
+        self.handlers.add(handler)
+        authenticated = False
+        try:
+            while True:
+                count = int((await reader.readuntil(b"\r\n"))[1:-2])
+                command = []
+                for _ in range(count):
+                    size = int((await reader.readuntil(b"\r\n"))[1:-2])
+                    command.append((await reader.readexactly(size + 2))[:-2])
+                self.commands.append(command)
+                reply = self.reply(command, writer, authenticated)
+                if command[0].upper() == b"AUTH" and reply.startswith(b"+"):
+                    authenticated = True
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.handlers.discard(handler)
+            self.unwatch(writer)
+            self.transactions.pop(writer, None)
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            writer.close()
+
+
+@pytest.fixture
+async def redis_server():
+    server = RedisStandIn(password="secret")
+    await server.start()
+    yield server
+    await server.stop()
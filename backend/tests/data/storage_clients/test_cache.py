@@ -0,0 +1,82 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from chainlit.data.storage_clients.base import BaseStorageClient
+from chainlit.data.storage_clients.cache import CachedStorageClient
+
+
+@pytest.fixture
+def storage_client():
+    client = AsyncMock(spec=BaseStorageClient)
+    client.get_read_url.side_effect = lambda object_key: f"signed/{object_key}"
+    client.get_read_urls.side_effect = lambda object_keys: {
+        key: f"signed/{key}" for key in object_keys
+    }
+    return client
+
+
+async def test_caches_read_urls(storage_client):
+    client = CachedStorageClient(storage_client)
+
+    assert await client.get_read_url("a") == "signed/a"
+    assert await client.get_read_url("a") == "signed/a"
+
+    storage_client.get_read_url.assert_awaited_once_with("a")
+    assert (client.hits, client.misses) == (1, 1)
+
+
+async def test_get_read_urls_only_signs_misses(storage_client):
+    client = CachedStorageClient(storage_client)
+    await client.get_read_url("a")
+
+    urls = await client.get_read_urls(["b", "a", "c"])
+
+    assert urls == {"b": "signed/b", "a": "signed/a", "c": "signed/c"}
+    assert list(urls) == ["b", "a", "c"]
+    storage_client.get_read_urls.assert_awaited_once_with(["b", "c"])
+    assert (client.hits, client.misses) == (1, 3)
+
+
+async def test_expired_urls_are_signed_again(storage_client, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(
+        "chainlit.data.storage_clients.cache.time.monotonic", lambda: now
+    )
+    client = CachedStorageClient(storage_client, ttl=60)
+
+    await client.get_read_url("a")
+    now += 61
+    await client.get_read_url("a")
+
+    assert storage_client.get_read_url.await_count == 2
+    assert (client.hits, client.misses) == (0, 2)
+
+
+async def test_evicts_least_recently_used(storage_client):
+    client = CachedStorageClient(storage_client, max_size=2)
+
+    await client.get_read_urls(["a", "b"])
+    await client.get_read_url("a")
+    await client.get_read_url("c")
+
+    assert list(client._urls) == ["a", "c"]
+
+
+async def test_writes_invalidate_the_cached_url(storage_client):
+    client = CachedStorageClient(storage_client)
+
+    await client.get_read_url("a")
+    await client.upload_file("a", b"data")
+    await client.get_read_url("a")
+    await client.delete_file("a")
+
+    assert storage_client.get_read_url.await_count == 2
+    storage_client.upload_file.assert_awaited_once()
+    storage_client.delete_file.assert_awaited_once_with("a")
+    assert "a" not in client._urls
+
+
+def test_ttl_must_be_shorter_than_url_expiry(storage_client):
+    with pytest.raises(ValueError, match="ttl"):
+        CachedStorageClient(storage_client, ttl=24 * 3600)
@@ -1,6 +1,8 @@
 from unittest.mock import MagicMock, patch
 
 import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage  # type: ignore
 
 from chainlit.data.storage_clients.base import storage_expiry_time
 from chainlit.data.storage_clients.gcs import GCSStorageClient
@@ -335,3 +337,72 @@ class TestGCSStorageClient:
         mock_gcs_client["bucket"].blob.assert_called_once_with("test/path/file.txt")
         mock_gcs_client["blob"].delete.assert_called_once()
         assert result is True
+
+    def test_sync_delete_files(self, mock_gcs_client, monkeypatch):
+        """Test deleting files in batches of calls."""
+        monkeypatch.setattr("chainlit.data.storage_clients.gcs.BATCH_MAX_CALLS", 2)
+        client = GCSStorageClient(
+            bucket_name="test-bucket",
+            project_id="test-project",
+            client_email="test@example.com",
+            private_key="test-key",
+        )
+        batch = mock_gcs_client["client"].batch.return_value
+        batch.__enter__.return_value = batch
+        # Deleting "b" fails on its own, then the whole second batch fails
+        batch._responses = [MagicMock(status_code=204), MagicMock(status_code=404)]
+        batch.__exit__.side_effect = [None, ValueError("Batch failed")]
+
+        result = client.sync_delete_files(["a", "b", "c"])
+
+        mock_gcs_client["client"].batch.assert_called_with(raise_exception=False)
+        assert mock_gcs_client["client"].batch.call_count == 2
+        assert [
+            call.args for call in mock_gcs_client["bucket"].delete_blob.call_args_list
+        ] == [("a",), ("b",), ("c",)]
+        assert result == {"a": True, "b": False, "c": False}
+
+    def test_sync_delete_files_without_responses(self, mock_gcs_client):
+        """Test checking which files are left when the responses are unknown."""
+        client = GCSStorageClient(
+            bucket_name="test-bucket",
+            project_id="test-project",
+            client_email="test@example.com",
+            private_key="test-key",
+        )
+        batch = mock_gcs_client["client"].batch.return_value
+        batch.__enter__.return_value = batch
+        del batch._responses
+        mock_gcs_client["blob"].exists.side_effect = [False, True]
+
+        result = client.sync_delete_files(["a", "b"])
+
+        assert result == {"a": True, "b": False}
+
+
+def test_sync_delete_files_batch():
+    """Test the statuses of the installed google-cloud-storage batches."""
+    client = GCSStorageClient.__new__(GCSStorageClient)
+    client.client = storage.Client(
+        project="test-project", credentials=AnonymousCredentials()
+    )
+    client.bucket = client.client.bucket("test-bucket")
+    response = MagicMock(
+        status_code=200,
+        headers={"content-type": 'multipart/mixed; boundary="batch"'},
+        content=(
+            b"--batch\r\nContent-Type: application/http\r\n\r\n"
+            b"HTTP/1.1 204 No Content\r\n\r\n\r\n"
+            b"--batch\r\nContent-Type: application/http\r\n\r\n"
+            b"HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n\r\n"
+            b"{}\r\n--batch--"
+        ),
+    )
+
+    with patch.object(
+        client.client._base_connection, "_make_request", return_value=response
+    ) as make_request:
+        result = client.sync_delete_files(["a", "b"])
+
+    make_request.assert_called_once()
+    assert result == {"a": True, "b": False}
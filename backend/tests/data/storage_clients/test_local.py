@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from chainlit.data.storage_clients.base import read_file_chunks
+from chainlit.data.storage_clients.local import LocalStorageClient
+
+
+@pytest.fixture
+def storage_client(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(
+        "chainlit.data.storage_clients.local._local_storage_client", None
+    )
+    return LocalStorageClient(root=str(tmp_path), secret="secret")
+
+
+def blobs(storage_client: LocalStorageClient):
+    return [
+        path for path in (storage_client.root / "blobs").rglob("*") if path.is_file()
+    ]
+
+
+async def test_identical_files_are_stored_once(storage_client: LocalStorageClient):
+    await storage_client.upload_file("threads/1/files/a", b"same", mime="image/png")
+    await storage_client.upload_file("threads/2/files/b", b"same", mime="image/png")
+    await storage_client.upload_file("threads/2/files/c", b"other")
+
+    assert len(blobs(storage_client)) == 2
+    path = storage_client.get_object_path("threads/2/files/b")
+    assert path.read_bytes() == b"same"
+    # The blob and both objects are links to the same file
+    assert path.stat().st_nlink == 3
+    assert storage_client.get_metadata("threads/2/files/b") == {
+        "sha256": storage_client.get_metadata("threads/1/files/a")["sha256"],  # type: ignore[index]
+        "size": 4,
+        "mime": "image/png",
+        "content_disposition": None,
+    }
+    assert not list((storage_client.root / "tmp").iterdir())
+
+
+async def test_blob_is_removed_with_its_last_object(storage_client: LocalStorageClient):
+    await storage_client.upload_file("a", b"same")
+    await storage_client.upload_file("b", b"same")
+
+    assert await storage_client.delete_file("a")
+    assert len(blobs(storage_client)) == 1
+    assert await storage_client.delete_file("b")
+    assert blobs(storage_client) == []
+    assert not await storage_client.delete_file("b")
+
+
+async def test_overwrite_releases_the_previous_blob(storage_client: LocalStorageClient):
+    await storage_client.upload_file("a", b"first")
+    await storage_client.upload_file("a", b"second")
+    await storage_client.upload_file("a", b"second")
+
+    assert [path.read_bytes() for path in blobs(storage_client)] == [b"second"]
+    assert storage_client.get_object_path("a").stat().st_nlink == 2
+    assert not list((storage_client.root / "tmp").iterdir())
+
+    with pytest.raises(FileExistsError):
+        await storage_client.upload_file("a", b"third", overwrite=False)
+
+
+async def test_upload_path(storage_client: LocalStorageClient, tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"0" * 1024)
+
+    await storage_client.upload_path("video", str(path), mime="video/mp4")
+
+    assert storage_client.get_object_path("video").read_bytes() == b"0" * 1024
+    chunks = [chunk async for chunk in read_file_chunks(str(path), chunk_size=100)]
+    assert len(chunks) == 11
+
+
+async def test_signed_read_urls(storage_client: LocalStorageClient):
+    url = await storage_client.get_read_url("threads/1/files/a b")
+
+    path, query = url.split("?")
+    assert path == "/storage/threads/1/files/a%20b"
+    params = dict(param.split("=") for param in query.split("&"))
+    expires = int(params["expires"])
+    assert storage_client.verify_signature(
+        "threads/1/files/a b", expires, params["signature"]
+    )
+    assert not storage_client.verify_signature(
+        "threads/1/files/other", expires, params["signature"]
+    )
+    assert not storage_client.verify_signature(
+        "threads/1/files/a b", int(time.time()) - 1, params["signature"]
+    )
+
+
+async def test_object_keys_cannot_escape_the_root(storage_client: LocalStorageClient):
+    with pytest.raises(ValueError, match="Invalid object key"):
+        await storage_client.upload_file("../../etc/passwd", b"data")
+
+
+async def test_purge_files(storage_client: LocalStorageClient):
+    await storage_client.upload_file("a", b"same")
+    await storage_client.upload_file("b", b"same")
+    await storage_client.upload_file("c", b"other")
+
+    results = await storage_client.purge_files(["a", "b", "missing"])
+
+    assert results == {"a": True, "b": True, "missing": False}
+    assert [path.read_bytes() for path in blobs(storage_client)] == [b"other"]
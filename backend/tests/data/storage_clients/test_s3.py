@@ -1,10 +1,11 @@
 import os
+from unittest.mock import Mock
 
 import boto3  # type: ignore
 import pytest
 from moto import mock_aws
 
-from chainlit.data.storage_clients.s3 import S3StorageClient
+from chainlit.data.storage_clients.s3 import MIN_PART_SIZE, S3StorageClient
 
 
 # Fixtures for setting up the DynamoDB table
@@ -45,3 +46,125 @@ async def test_upload_file(s3_mock):
     # Verify that the file exists in the mock S3
     response = s3_mock.get_object(Bucket="my-test-bucket", Key="test.txt")
     assert response["Body"].read().decode() == "This is a test file"
+
+
+async def test_get_read_urls(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket")
+    client._executor = Mock(wraps=client._executor)
+
+    urls = await client.get_read_urls(["a.png", "b.png", "a.png"])
+
+    assert list(urls) == ["a.png", "b.png"]
+    assert urls["a.png"].startswith("https://my-test-bucket.s3.amazonaws.com/a.png?")
+    # Presigning needs no network, all keys are signed in one thread hop
+    assert client._executor.submit.call_count == 1
+
+
+async def test_multipart_upload(s3_mock):
+    client = S3StorageClient(
+        bucket="my-test-bucket",
+        multipart_threshold=MIN_PART_SIZE,
+        multipart_chunksize=MIN_PART_SIZE,
+    )
+    client.client = Mock(wraps=client.client)
+    data = os.urandom(2 * MIN_PART_SIZE + 1024)
+
+    result = await client.upload_file(
+        object_key="video.mp4", data=data, mime="video/mp4"
+    )
+
+    assert result["object_key"] == "video.mp4"
+    assert client.client.upload_part.call_count == 3
+    client.client.put_object.assert_not_called()
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="video.mp4")
+    assert response["ContentType"] == "video/mp4"
+    assert response["Body"].read() == data
+
+
+async def test_failed_multipart_upload_is_aborted(s3_mock):
+    client = S3StorageClient(
+        bucket="my-test-bucket",
+        multipart_threshold=MIN_PART_SIZE,
+        multipart_chunksize=MIN_PART_SIZE,
+    )
+    client.client = Mock(wraps=client.client)
+    client.client.upload_part.side_effect = RuntimeError("connection reset")
+
+    result = await client.upload_file(object_key="video.mp4", data=b"0" * MIN_PART_SIZE)
+
+    assert result == {}
+    client.client.abort_multipart_upload.assert_called_once()
+    uploads = s3_mock.list_multipart_uploads(Bucket="my-test-bucket")
+    assert not uploads.get("Uploads")
+
+
+@pytest.mark.asyncio
+async def test_failed_abort_keeps_the_upload_error(s3_mock):
+    client = S3StorageClient(
+        bucket="my-test-bucket",
+        multipart_threshold=MIN_PART_SIZE,
+        multipart_chunksize=MIN_PART_SIZE,
+    )
+    client.client = Mock(wraps=client.client)
+    client.client.upload_part.side_effect = RuntimeError("connection reset")
+    client.client.abort_multipart_upload.side_effect = RuntimeError("access denied")
+
+    result = await client.upload_file(object_key="video.mp4", data=b"0" * MIN_PART_SIZE)
+
+    assert result == {}
+    client.client.abort_multipart_upload.assert_called_once()
+
+
+async def test_upload_path_streams_parts(s3_mock, tmp_path):
+    client = S3StorageClient(
+        bucket="my-test-bucket",
+        max_pool_connections=2,
+        multipart_threshold=MIN_PART_SIZE,
+        multipart_chunksize=MIN_PART_SIZE,
+    )
+    client.client = Mock(wraps=client.client)
+    data = os.urandom(3 * MIN_PART_SIZE + 1024)
+    path = tmp_path / "video.mp4"
+    path.write_bytes(data)
+
+    result = await client.upload_path(
+        object_key="video.mp4", path=str(path), mime="video/mp4"
+    )
+
+    assert result["object_key"] == "video.mp4"
+    assert [
+        len(call.kwargs["Body"]) for call in client.client.upload_part.call_args_list
+    ] == [MIN_PART_SIZE] * 3 + [1024]
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="video.mp4")
+    assert response["Body"].read() == data
+
+
+async def test_small_stream_is_put_in_one_request(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket")
+    client.client = Mock(wraps=client.client)
+
+    async def stream():
+        yield b"Hello "
+        yield b"world"
+
+    await client.upload_stream(object_key="test.txt", stream=stream())
+
+    client.client.put_object.assert_called_once()
+    client.client.create_multipart_upload.assert_not_called()
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="test.txt")
+    assert response["Body"].read() == b"Hello world"
+
+
+async def test_delete_files(s3_mock, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("chainlit.data.storage_clients.s3.DELETE_OBJECTS_MAX_KEYS", 2)
+    client = S3StorageClient(bucket="my-test-bucket")
+    client.client = Mock(wraps=client.client)
+    for key in ["a", "b", "c"]:
+        s3_mock.put_object(Bucket="my-test-bucket", Key=key, Body=b"data")
+
+    results = await client.delete_files(["a", "b", "c", "a"])
+
+    assert results == {"a": True, "b": True, "c": True}
+    assert client.client.delete_objects.call_count == 2
+    client.client.delete_object.assert_not_called()
+    assert "Contents" not in s3_mock.list_objects_v2(Bucket="my-test-bucket")
@@ -0,0 +1,371 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+import pytest
+
+from chainlit.data.chainlit_data_layer import (
+    ELEMENT_UPSERT_QUERY,
+    STEP_UPSERT_QUERY,
+    ChainlitDataLayer,
+)
+from chainlit.data.storage_clients.base import BaseStorageClient
+from chainlit.data.storage_clients.cache import CachedStorageClient
+from chainlit.data.utils import decode_cursor, encode_cursor
+from chainlit.element import Text
+from chainlit.types import Pagination, ThreadFilter
+
+
+@pytest.fixture
+def data_layer_factory(monkeypatch: pytest.MonkeyPatch):
+    # Don't let the data layer hook into the test process' exit and signals
+    monkeypatch.setattr("chainlit.data.chainlit_data_layer.atexit.register", Mock())
+    monkeypatch.setattr("chainlit.data.chainlit_data_layer.signal.signal", Mock())
+
+    def create_data_layer(**kwargs) -> ChainlitDataLayer:
+        data_layer = ChainlitDataLayer(
+            database_url="postgresql://localhost/chainlit", **kwargs
+        )
+        data_layer.execute_query = AsyncMock(return_value=[])  # type: ignore[method-assign]
+        return data_layer
+
+    return create_data_layer
+
+
+def mock_pool(data_layer: ChainlitDataLayer) -> MagicMock:
+    connection = MagicMock()
+    connection.executemany = AsyncMock()
+    connection.transaction.return_value.__aenter__ = AsyncMock()
+    connection.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=connection)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    pool.close = AsyncMock()
+    data_layer.pool = pool
+    return connection
+
+
+async def test_create_step_single_round_trip(mock_chainlit_context, data_layer_factory):
+    data_layer = data_layer_factory()
+
+    async with mock_chainlit_context:
+        await data_layer.create_step(
+            {
+                "id": "step_id",
+                "threadId": "thread_id",
+                "parentId": "parent_id",
+                "type": "assistant_message",
+                "output": "Hello",
+                "createdAt": "2024-01-01T00:00:00.000000Z",
+            }
+        )
+
+    data_layer.execute_query.assert_awaited_once()
+    query, params = data_layer.execute_query.await_args.args
+    assert query == STEP_UPSERT_QUERY
+    assert params["thread_id"] == "thread_id"
+    assert params["parent_id"] == "parent_id"
+
+
+async def test_create_element_single_round_trip(
+    mock_chainlit_context, data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    data_layer = data_layer_factory(storage_client=mock_storage_client)
+
+    async with mock_chainlit_context:
+        element = Text(
+            name="test.txt", content="test content", for_id="step_id", mime="text/plain"
+        )
+        await data_layer.create_element(element)
+
+    mock_storage_client.upload_file.assert_awaited_once()  # type: ignore[attr-defined]
+    data_layer.execute_query.assert_awaited_once()
+    query, _ = data_layer.execute_query.await_args.args
+    assert query == ELEMENT_UPSERT_QUERY
+
+
+async def test_create_element_through_cached_storage_client(
+    mock_chainlit_context, data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    data_layer = data_layer_factory(
+        storage_client=CachedStorageClient(mock_storage_client)
+    )
+
+    async with mock_chainlit_context:
+        element = Text(name="test.txt", content="test content", for_id="step_id")
+        await data_layer.create_element(element)
+
+    args = mock_storage_client.upload_file.await_args.args  # type: ignore[attr-defined]
+    assert args[-1] == 'attachment; filename="test.txt"'
+
+
+async def test_create_element_streams_file_from_disk(
+    mock_chainlit_context, data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    data_layer = data_layer_factory(storage_client=mock_storage_client)
+
+    async with mock_chainlit_context:
+        element = Text(
+            name="test.txt", path="/tmp/test.txt", for_id="step_id", mime="text/plain"
+        )
+        await data_layer.create_element(element)
+
+    mock_storage_client.upload_file.assert_not_awaited()  # type: ignore[attr-defined]
+    mock_storage_client.upload_path.assert_awaited_once()  # type: ignore[attr-defined]
+    kwargs = mock_storage_client.upload_path.await_args.kwargs  # type: ignore[attr-defined]
+    assert kwargs["path"] == "/tmp/test.txt"
+    assert kwargs["mime"] == "text/plain"
+
+
+async def test_delete_thread_purges_files_in_background(
+    data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    mock_storage_client.purge_files = Mock()  # type: ignore[method-assign]
+    data_layer = data_layer_factory(storage_client=mock_storage_client)
+    data_layer.execute_query.return_value = [
+        {"id": "element_a", "objectKey": "a.png"},
+        {"id": "element_b", "objectKey": None},
+        {"id": "element_c", "objectKey": "c.png"},
+    ]
+
+    await data_layer.delete_thread("thread_id")
+
+    query, _ = data_layer.execute_query.await_args.args
+    assert query == 'DELETE FROM "Thread" WHERE id = $1'
+    mock_storage_client.purge_files.assert_called_once_with(["a.png", "c.png"])
+    mock_storage_client.delete_file.assert_not_awaited()  # type: ignore[attr-defined]
+
+
+async def test_buffered_steps_are_coalesced(mock_chainlit_context, data_layer_factory):
+    data_layer = data_layer_factory(buffer_steps=True, step_flush_interval=60)
+    connection = mock_pool(data_layer)
+
+    async with mock_chainlit_context:
+        for output in ["H", "He", "Hello"]:
+            await data_layer.update_step(
+                {
+                    "id": "step_id",
+                    "threadId": "thread_id",
+                    "type": "run",
+                    "output": output,
+                }
+            )
+        await data_layer.create_step(
+            {"id": "other_id", "threadId": "thread_id", "type": "tool"}
+        )
+
+    data_layer.execute_query.assert_not_awaited()
+    connection.executemany.assert_not_awaited()
+
+    await data_layer.close()
+
+    connection.executemany.assert_awaited_once()
+    query, rows = connection.executemany.await_args.args
+    assert query == STEP_UPSERT_QUERY
+    assert [(row[0], row[6]) for row in rows] == [
+        ("step_id", "Hello"),
+        ("other_id", None),
+    ]
+
+
+async def test_pool_settings_from_env(
+    monkeypatch: pytest.MonkeyPatch, data_layer_factory
+):
+    monkeypatch.setenv("DATABASE_POOL_MAX_SIZE", "50")
+    monkeypatch.setenv("DATABASE_STATEMENT_CACHE_SIZE", "0")
+    create_pool = AsyncMock()
+    monkeypatch.setattr(
+        "chainlit.data.chainlit_data_layer.asyncpg.create_pool", create_pool
+    )
+
+    data_layer = data_layer_factory(pool_min_size=5, pool_idle_timeout=30)
+    await data_layer.connect()
+    await data_layer.connect()
+
+    create_pool.assert_awaited_once()
+    assert create_pool.await_args is not None
+    kwargs = create_pool.await_args.kwargs
+    assert kwargs["min_size"] == 5
+    assert kwargs["max_size"] == 50
+    assert kwargs["statement_cache_size"] == 0
+    assert kwargs["max_inactive_connection_lifetime"] == 30.0
+    assert kwargs["init"] == data_layer._init_connection
+
+
+async def test_list_threads_keyset_pagination(data_layer_factory):
+    data_layer = data_layer_factory()
+    updated_at = datetime(2024, 1, 1, 12, 0, 0)
+    data_layer.execute_query.return_value = [
+        {
+            "id": f"thread_{i}",
+            "updatedAt": updated_at,
+            "name": None,
+            "userId": "user_id",
+            "user_identifier": "user",
+            "metadata": {},
+        }
+        for i in range(3)
+    ]
+
+    first_page = await data_layer.list_threads(
+        Pagination(first=2), ThreadFilter(userId="user_id")
+    )
+
+    assert [t["id"] for t in first_page.data] == ["thread_0", "thread_1"]
+    assert first_page.pageInfo.hasNextPage
+    end_cursor = first_page.pageInfo.endCursor
+    assert end_cursor
+    assert decode_cursor(end_cursor) == [updated_at.isoformat(), "thread_1"]
+
+    query, _ = data_layer.execute_query.await_args.args
+    assert "COUNT" not in query
+
+    await data_layer.list_threads(
+        Pagination(first=2, cursor=end_cursor), ThreadFilter(userId="user_id")
+    )
+
+    query, params = data_layer.execute_query.await_args.args
+    assert '(t."updatedAt", t.id) < ($2, $3)' in query
+    assert list(params.values()) == ["user_id", updated_at, "thread_1", 3]
+
+
+@pytest.mark.parametrize(
+    "values", [["only one"], [1, "thread_1"], ["not a date", "thread_1"], [None, {}]]
+)
+async def test_list_threads_ignores_invalid_cursors(data_layer_factory, values):
+    data_layer = data_layer_factory()
+
+    await data_layer.list_threads(
+        Pagination(first=2, cursor=encode_cursor(values)),
+        ThreadFilter(userId="user_id"),
+    )
+
+    query, params = data_layer.execute_query.await_args.args
+    assert '"updatedAt", t.id) <' not in query
+    assert list(params.values()) == ["user_id", 3]
+
+
+async def test_count_threads(data_layer_factory):
+    data_layer = data_layer_factory()
+    data_layer.execute_query.return_value = [{"total": 42}]
+
+    total = await data_layer.count_threads(ThreadFilter(userId="user_id"))
+
+    assert total == 42
+
+
+async def test_list_threads_full_text_search(data_layer_factory):
+    data_layer = data_layer_factory(full_text_search=True)
+    data_layer.execute_query.return_value = [
+        {
+            "id": "thread_id",
+            "updatedAt": datetime(2024, 1, 1),
+            "name": "Chat",
+            "userId": "user_id",
+            "user_identifier": "user",
+            "metadata": {},
+            "search_rank": 0.5,
+            "search_snippet": "Say <mark>hello</mark>",
+        }
+    ]
+
+    result = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId="user_id", search="hello wor")
+    )
+
+    query, params = data_layer.execute_query.await_args.args
+    assert params["tsquery"] == "hello:* & wor:*"
+    assert "ILIKE" not in query
+    # Steps are matched per thread of the user, not across the whole table
+    assert 'WHERE s."threadId" = t.id AND s."searchVector" @@' in query
+    assert result.data[0]["search"] == {
+        "rank": 0.5,
+        "snippet": "Say <mark>hello</mark>",
+    }
+
+
+async def test_update_thread_merges_metadata(data_layer_factory):
+    data_layer = data_layer_factory()
+
+    await data_layer.update_thread("thread_id", name="Chat")
+
+    query, params = data_layer.execute_query.await_args.args
+    assert '"metadata" = COALESCE("Thread"."metadata", \'{}\') || EXCLUDED' in query
+    assert {} in params.values()
+
+
+async def test_get_thread_signs_element_urls_in_bulk(
+    data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    mock_storage_client.get_read_urls.return_value = {  # type: ignore[attr-defined]
+        "a.png": "https://example.com/a.png?signed",
+        "b.png": "https://example.com/b.png?signed",
+    }
+    data_layer = data_layer_factory(storage_client=mock_storage_client)
+    element_rows = [
+        {"id": f"element_{key}", "url": None, "objectKey": key}
+        for key in ["a.png", "b.png"]
+    ] + [{"id": "element_c", "url": "https://example.com/c.png", "objectKey": None}]
+    data_layer.execute_query.side_effect = [
+        [
+            {
+                "id": "thread_id",
+                "createdAt": datetime(2024, 1, 1),
+                "name": "Chat",
+                "userId": None,
+                "user_identifier": None,
+                "tags": [],
+                "metadata": {},
+            }
+        ],
+        [],
+        element_rows,
+    ]
+    data_layer._convert_element_row_to_dict = lambda row: row  # type: ignore[method-assign]
+
+    thread = await data_layer.get_thread("thread_id")
+
+    assert thread
+    mock_storage_client.get_read_urls.assert_awaited_once_with(["a.png", "b.png"])  # type: ignore[attr-defined]
+    mock_storage_client.get_read_url.assert_not_awaited()  # type: ignore[attr-defined]
+    assert [element["url"] for element in thread["elements"]] == [
+        "https://example.com/a.png?signed",
+        "https://example.com/b.png?signed",
+        "https://example.com/c.png",
+    ]
+
+
+async def test_get_thread_keeps_urls_of_unsigned_keys(
+    data_layer_factory, mock_storage_client: BaseStorageClient
+):
+    mock_storage_client.get_read_urls.return_value = {  # type: ignore[attr-defined]
+        "a.png": "https://example.com/a.png?signed",
+    }
+    data_layer = data_layer_factory(storage_client=mock_storage_client)
+    data_layer.execute_query.side_effect = [
+        [
+            {
+                "id": "thread_id",
+                "createdAt": datetime(2024, 1, 1),
+                "name": "Chat",
+                "userId": None,
+                "user_identifier": None,
+                "tags": [],
+                "metadata": {},
+            }
+        ],
+        [],
+        [
+            {"id": f"element_{key}", "url": None, "objectKey": key}
+            for key in ["a.png", "b.png"]
+        ],
+    ]
+    data_layer._convert_element_row_to_dict = lambda row: row  # type: ignore[method-assign]
+
+    thread = await data_layer.get_thread("thread_id")
+
+    assert thread
+    assert [element["url"] for element in thread["elements"]] == [
+        "https://example.com/a.png?signed",
+        None,
+    ]
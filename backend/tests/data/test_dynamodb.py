@@ -0,0 +1,233 @@
+import asyncio
+import os
+import time
+from unittest.mock import AsyncMock, Mock
+
+import boto3  # type: ignore
+import pytest
+from moto import mock_aws
+
+from chainlit.data.dynamodb import DynamoDBDataLayer
+from chainlit.data.storage_clients.base import BaseStorageClient
+from chainlit.types import Pagination, ThreadFilter
+from chainlit.user import User
+
+TABLE_NAME = "chainlit"
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def dynamodb_client(aws_credentials):
+    """Moto mock DynamoDB table with the layout expected by the data layer."""
+    with mock_aws():
+        client = boto3.client("dynamodb", region_name="us-east-1")
+        client.create_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[
+                {"AttributeName": "PK", "AttributeType": "S"},
+                {"AttributeName": "SK", "AttributeType": "S"},
+                {"AttributeName": "UserThreadPK", "AttributeType": "S"},
+                {"AttributeName": "UserThreadSK", "AttributeType": "S"},
+            ],
+            KeySchema=[
+                {"AttributeName": "PK", "KeyType": "HASH"},
+                {"AttributeName": "SK", "KeyType": "RANGE"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "UserThread",
+                    "KeySchema": [
+                        {"AttributeName": "UserThreadPK", "KeyType": "HASH"},
+                        {"AttributeName": "UserThreadSK", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield client
+
+
+@pytest.fixture
+async def data_layer(dynamodb_client):
+    data_layer = DynamoDBDataLayer(table_name=TABLE_NAME, client=dynamodb_client)
+    yield data_layer
+    await data_layer.close()
+
+
+async def test_create_step_and_get_thread(
+    data_layer: DynamoDBDataLayer, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.update_thread("thread_id", name="Chat", user_id="user")
+        await data_layer.create_step(
+            {
+                "id": "step_id",
+                "threadId": "thread_id",
+                "type": "assistant_message",
+                "output": "Hello",
+                "createdAt": "2024-01-01T00:00:00Z",
+            }
+        )
+
+        thread = await data_layer.get_thread("thread_id")
+
+    assert thread
+    assert thread["name"] == "Chat"
+    assert [step["output"] for step in thread["steps"]] == ["Hello"]
+
+
+async def test_get_thread_signs_element_urls_in_bulk(
+    dynamodb_client, mock_chainlit_context
+):
+    storage_provider = AsyncMock(spec=BaseStorageClient)
+    storage_provider.get_read_urls.return_value = {
+        f"{i}.png": f"https://example.com/{i}.png?signed" for i in range(3)
+    }
+    data_layer = DynamoDBDataLayer(
+        table_name=TABLE_NAME,
+        client=dynamodb_client,
+        storage_provider=storage_provider,
+    )
+
+    async with mock_chainlit_context:
+        await data_layer.update_thread("thread_id", name="Chat", user_id="user")
+        for i in range(3):
+            await data_layer._put_item(
+                {
+                    "PK": "THREAD#thread_id",
+                    "SK": f"ELEMENT#element_{i}",
+                    "id": f"element_{i}",
+                    "objectKey": f"{i}.png",
+                }
+            )
+
+        thread = await data_layer.get_thread("thread_id")
+
+    assert thread
+    storage_provider.get_read_urls.assert_awaited_once_with(["0.png", "1.png", "2.png"])
+    storage_provider.get_read_url.assert_not_awaited()
+    assert [element["url"] for element in thread["elements"]] == [
+        f"https://example.com/{i}.png?signed" for i in range(3)
+    ]
+    await data_layer.close()
+
+
+async def test_list_threads_fills_pages(dynamodb_client):
+    client = Mock(wraps=dynamodb_client)
+    data_layer = DynamoDBDataLayer(
+        table_name=TABLE_NAME, client=client, user_thread_limit=2
+    )
+    for i in range(9):
+        name = f"match {i}" if i % 3 == 0 else f"other {i}"
+        await data_layer.update_thread(f"thread_{i}", name=name, user_id="user")
+
+    pages = []
+    cursor = None
+    while True:
+        page = await data_layer.list_threads(
+            Pagination(first=2, cursor=cursor),
+            ThreadFilter(userId="user", search="match"),
+        )
+        pages.append([thread["id"] for thread in page.data])
+        if not page.pageInfo.hasNextPage:
+            break
+        cursor = page.pageInfo.endCursor
+        assert cursor
+        assert "{" not in cursor
+
+    assert pages == [["thread_6", "thread_3"], ["thread_0"]]
+    query_args = client.query.call_args.kwargs
+    assert query_args["ProjectionExpression"] == "PK, UserThreadSK, #name"
+    await data_layer.close()
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not a cursor", "WyJvbmx5IG9uZSJd", "bnVsbA", '{"PK": '],
+)
+async def test_list_threads_ignores_invalid_cursors(dynamodb_client, cursor: str):
+    data_layer = DynamoDBDataLayer(table_name=TABLE_NAME, client=dynamodb_client)
+    for i in range(2):
+        await data_layer.update_thread(f"thread_{i}", name="Chat", user_id="user")
+
+    page = await data_layer.list_threads(
+        Pagination(first=2, cursor=cursor), ThreadFilter(userId="user")
+    )
+
+    assert [thread["id"] for thread in page.data] == ["thread_1", "thread_0"]
+    await data_layer.close()
+
+
+async def test_buffered_writes_are_batched(dynamodb_client, mock_chainlit_context):
+    client = Mock(wraps=dynamodb_client)
+    data_layer = DynamoDBDataLayer(
+        table_name=TABLE_NAME,
+        client=client,
+        buffer_writes=True,
+        write_flush_interval=60,
+    )
+
+    async with mock_chainlit_context:
+        await data_layer.update_thread("thread_id", name="Chat", user_id="user")
+        for i in range(30):
+            step = {
+                "id": f"step_{i:02}",
+                "threadId": "thread_id",
+                "type": "run",
+                "output": "",
+                "createdAt": f"2024-01-01T00:00:{i:02}Z",
+            }
+            await data_layer.create_step(step)  # type: ignore[arg-type]
+            await data_layer.update_step({**step, "output": f"Done {i}"})  # type: ignore[typeddict-item]
+
+        assert client.put_item.call_count == 0
+        assert client.update_item.call_count == 1  # The thread
+
+        thread = await data_layer.get_thread("thread_id")
+
+    # 30 distinct steps, deduplicated and written in chunks of 25
+    assert client.batch_write_item.call_count == 2
+    assert thread
+    assert [step["output"] for step in thread["steps"]] == [
+        f"Done {i}" for i in range(30)
+    ]
+    await data_layer.close()
+
+
+async def test_calls_do_not_block_the_event_loop(test_user: User):
+    def slow_put_item(**kwargs):
+        time.sleep(0.2)
+
+    client = Mock()
+    client.put_item.side_effect = slow_put_item
+    data_layer = DynamoDBDataLayer(table_name=TABLE_NAME, client=client)
+
+    lags = []
+
+    async def measure_lag():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    monitor = asyncio.create_task(measure_lag())
+    start = time.perf_counter()
+    await asyncio.gather(*(data_layer.create_user(test_user) for _ in range(10)))
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+    await data_layer.close()
+
+    assert client.put_item.call_count == 10
+    # The writes ran concurrently while the event loop kept ticking
+    assert elapsed < 1
+    assert max(lags) < 0.1
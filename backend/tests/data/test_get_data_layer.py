@@ -1,6 +1,10 @@
 from unittest.mock import AsyncMock, Mock
 
+import pytest
+
 from chainlit.data import get_data_layer
+from chainlit.data.chainlit_data_layer import ChainlitDataLayer
+from chainlit.data.literalai import LiteralDataLayer
 
 
 async def test_get_data_layer(
@@ -16,3 +20,42 @@ async def test_get_data_layer(
     assert mock_data_layer == get_data_layer()
 
     mock_get_data_layer.assert_called_once()
+
+
+async def test_get_data_layer_buffers_steps_from_env(
+    test_config, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr("chainlit.data._data_layer", None)
+    monkeypatch.setattr("chainlit.data._data_layer_initialized", False)
+    # Don't let the data layer hook into the test process' exit and signals
+    monkeypatch.setattr("chainlit.data.chainlit_data_layer.atexit.register", Mock())
+    monkeypatch.setattr("chainlit.data.chainlit_data_layer.signal.signal", Mock())
+    monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/chainlit")
+    monkeypatch.delenv("BUCKET_NAME", raising=False)
+    monkeypatch.setenv("DATA_LAYER_BUFFER_STEPS", "true")
+    monkeypatch.setenv("DATA_LAYER_STEP_BUFFER_SIZE", "20")
+    monkeypatch.setenv("DATA_LAYER_STEP_FLUSH_INTERVAL", "2")
+
+    data_layer = get_data_layer()
+
+    assert isinstance(data_layer, ChainlitDataLayer)
+    assert data_layer.step_buffer is not None
+    assert data_layer.step_buffer.max_size == 20
+    assert data_layer.step_buffer.flush_interval == 2.0
+
+
+async def test_get_literal_data_layer_buffers_steps_from_env(
+    test_config, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr("chainlit.data._data_layer", None)
+    monkeypatch.setattr("chainlit.data._data_layer_initialized", False)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("LITERAL_API_KEY", "fake_api_key")
+    monkeypatch.setenv("LITERAL_API_URL", "https://fake.server")
+    monkeypatch.setenv("DATA_LAYER_BUFFER_STEPS", "1")
+
+    data_layer = get_data_layer()
+
+    assert isinstance(data_layer, LiteralDataLayer)
+    assert data_layer.step_buffer is not None
+    assert data_layer.step_buffer.max_size == 100
@@ -1,8 +1,10 @@
 import datetime
 import uuid
+from typing import Dict, List
 from unittest.mock import ANY, AsyncMock, Mock, patch
 
 import pytest
+from aiohttp import web
 from httpx import HTTPStatusError, RequestError
 from literalai import (
     AsyncLiteralClient,
@@ -827,6 +829,60 @@ def test_score_to_feedbackdict():
     assert feedback_dict["forId"] == ""
 
 
+async def test_buffered_steps_are_sent_in_batches(
+    mock_chainlit_context, test_step_dict: StepDict
+):
+    requests: List[Dict] = []
+
+    async def graphql(request: web.Request) -> web.Response:
+        requests.append((await request.json())["variables"])
+        return web.json_response({"data": {}})
+
+    # Local stand-in for the Literal AI API
+    app = web.Application()
+    app.router.add_post("/api/graphql", graphql)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    data_layer = LiteralDataLayer(
+        api_key="fake_api_key",
+        server=f"http://127.0.0.1:{port}",
+        buffer_steps=True,
+        step_buffer_size=3,
+        step_flush_interval=60,
+    )
+    try:
+        async with mock_chainlit_context:
+            for output in ["H", "He", "Hello"]:
+                await data_layer.update_step({**test_step_dict, "output": output})
+            await data_layer.create_step({**test_step_dict, "id": "other_id"})
+            assert requests == []
+
+            # The third distinct step fills the buffer
+            await data_layer.create_step({**test_step_dict, "id": "third_id"})
+            assert len(requests) == 1
+            assert [requests[0][f"id_{i}"] for i in range(3)] == [
+                "test_step_id",
+                "other_id",
+                "third_id",
+            ]
+            assert requests[0]["output_0"] == {"content": "Hello"}
+
+            await data_layer.update_step(
+                {**test_step_dict, "id": "other_id", "output": "Done"}
+            )
+    finally:
+        await data_layer.close()
+        await runner.cleanup()
+
+    assert len(requests) == 2
+    assert requests[1]["id_0"] == "other_id"
+    assert requests[1]["output_0"] == {"content": "Done"}
+
+
 def test_step_to_stepdict():
     literal_step = LiteralStep.from_dict(
         {
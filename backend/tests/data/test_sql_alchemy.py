@@ -1,14 +1,22 @@
+import asyncio
+import json
+import sqlite3
 import uuid
 from pathlib import Path
+from typing import Optional
+from unittest.mock import Mock
 
 import pytest
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine
 
+import chainlit.data
 from chainlit import User
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from chainlit.data.sqlite_writer import SQLiteWriter
 from chainlit.data.storage_clients.base import BaseStorageClient
 from chainlit.element import Text
+from chainlit.types import Pagination, ThreadFilter
 
 
 @pytest.fixture
@@ -117,10 +125,14 @@ async def data_layer(mock_storage_client: BaseStorageClient, tmp_path: Path):
             )
         )
 
+    await engine.dispose()
+
     # Create SQLAlchemyDataLayer instance
     data_layer = SQLAlchemyDataLayer(conninfo, storage_provider=mock_storage_client)
 
-    return data_layer
+    yield data_layer
+
+    await data_layer.close()
 
 
 async def test_create_and_get_element(
@@ -186,6 +198,42 @@ async def test_update_thread(test_user: User, data_layer: SQLAlchemyDataLayer):
     await data_layer.update_thread("test_thread")
 
 
+async def test_update_thread_merges_metadata(
+    test_user: User, data_layer: SQLAlchemyDataLayer
+):
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    assert await data_layer.update_thread(
+        "test_thread",
+        user_id=persisted_user.id,
+        metadata={"chat_profile": "a", "chat_settings": {"x": 1}, "env": {}},
+    )
+    assert await data_layer.update_thread(
+        "test_thread",
+        metadata={"chat_settings": {"y": 2}, "counter": 1, "env": None},
+    )
+    await data_layer.update_thread("test_thread", name="Renamed")
+
+    thread = await data_layer.get_thread("test_thread")
+    assert thread
+    assert thread["name"] == "Renamed"
+    metadata = thread["metadata"]
+    assert isinstance(metadata, str)
+    assert json.loads(metadata) == {
+        "chat_profile": "a",
+        "chat_settings": {"y": 2},
+        "counter": 1,
+        "env": {},
+    }
+
+
+async def test_update_thread_reports_failed_writes(data_layer: SQLAlchemyDataLayer):
+    await data_layer.execute_sql("ALTER TABLE threads RENAME TO old_threads", {})
+
+    assert not await data_layer.update_thread("test_thread", metadata={"counter": 1})
+
+
 async def test_get_thread_author(test_user: User, data_layer: SQLAlchemyDataLayer):
     persisted_user = await data_layer.create_user(test_user)
     assert persisted_user
@@ -216,3 +264,322 @@ async def test_delete_thread(test_user: User, data_layer: SQLAlchemyDataLayer):
     await data_layer.delete_thread("test_thread")
     thread = await data_layer.get_thread("test_thread")
     assert thread is None
+
+
+async def insert_thread_with_step(
+    data_layer: SQLAlchemyDataLayer,
+    user_id: str,
+    thread_id: str,
+    created_at: str,
+    output: str,
+    feedback_value: Optional[int] = None,
+):
+    await data_layer.update_thread(thread_id, name=thread_id, user_id=user_id)
+    step_id = str(uuid.uuid4())
+    await data_layer.execute_sql(
+        """
+        INSERT INTO steps ("id", "name", "type", "threadId", "disableFeedback", "streaming", "output", "createdAt")
+        VALUES (:id, 'step', 'assistant_message', :thread_id, false, false, :output, :created_at)
+        """,
+        {
+            "id": step_id,
+            "thread_id": thread_id,
+            "output": output,
+            "created_at": created_at,
+        },
+    )
+    if feedback_value is not None:
+        await data_layer.execute_sql(
+            """
+            INSERT INTO feedbacks ("id", "forId", "threadId", "value")
+            VALUES (:id, :step_id, :thread_id, :value)
+            """,
+            {
+                "id": str(uuid.uuid4()),
+                "step_id": step_id,
+                "thread_id": thread_id,
+                "value": feedback_value,
+            },
+        )
+
+
+async def test_list_threads(test_user: User, data_layer: SQLAlchemyDataLayer):
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    for i, output in enumerate(["Hello world", "100% sure", "Goodbye", "Hello"]):
+        await insert_thread_with_step(
+            data_layer,
+            persisted_user.id,
+            f"thread_{i}",
+            f"2024-01-0{i + 1}T00:00:00Z",
+            output,
+            feedback_value=1 if i % 2 else None,
+        )
+
+    filters = ThreadFilter(userId=persisted_user.id)
+    first_page = await data_layer.list_threads(Pagination(first=3), filters)
+    assert [t["id"] for t in first_page.data] == ["thread_3", "thread_2", "thread_1"]
+    assert first_page.data[0]["steps"] == []
+    assert first_page.pageInfo.hasNextPage
+
+    second_page = await data_layer.list_threads(
+        Pagination(first=3, cursor=first_page.pageInfo.endCursor), filters
+    )
+    assert [t["id"] for t in second_page.data] == ["thread_0"]
+    assert not second_page.pageInfo.hasNextPage
+
+    # Legacy cursors holding a thread id are still accepted
+    legacy_page = await data_layer.list_threads(
+        Pagination(first=3, cursor="thread_2"), filters
+    )
+    assert [t["id"] for t in legacy_page.data] == ["thread_1", "thread_0"]
+
+    search = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId=persisted_user.id, search="hello")
+    )
+    assert [t["id"] for t in search.data] == ["thread_3", "thread_0"]
+
+    # LIKE wildcards in the search term are matched literally
+    search = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId=persisted_user.id, search="0%")
+    )
+    assert [t["id"] for t in search.data] == ["thread_1"]
+
+    feedback = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId=persisted_user.id, feedback=1)
+    )
+    assert [t["id"] for t in feedback.data] == ["thread_3", "thread_1"]
+
+
+async def test_list_threads_full_text_search(
+    test_user: User, mock_storage_client: BaseStorageClient, tmp_path: Path
+):
+    db_file = tmp_path / "test_fts.sqlite"
+    schema = Path(chainlit.data.__file__).parent / "sqlite_schema.sql"
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(schema.read_text())
+    data_layer = SQLAlchemyDataLayer(
+        f"sqlite+aiosqlite:///{db_file}", storage_provider=mock_storage_client
+    )
+
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    for i, output in enumerate(["Hello world", "Nothing here", "Say hello again"]):
+        await insert_thread_with_step(
+            data_layer,
+            persisted_user.id,
+            f"thread_{i}",
+            f"2024-01-0{i + 1}T00:00:00Z",
+            output,
+        )
+    await data_layer.update_thread("thread_1", name="Helloworld plans")
+
+    search = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId=persisted_user.id, search="hell")
+    )
+
+    assert data_layer.full_text_search
+    # Matches keep the chronological order of the thread history
+    assert [t["id"] for t in search.data] == ["thread_2", "thread_1", "thread_0"]
+    assert search.data[0]["search"]["snippet"] == "Say <mark>hello</mark> again"
+    assert search.data[1]["search"]["snippet"] == "<mark>Helloworld</mark> plans"
+    assert all(t["search"]["rank"] > 0 for t in search.data)
+
+    # Updated steps are reindexed
+    await data_layer.execute_sql(
+        "UPDATE steps SET \"output\" = 'Goodbye' WHERE \"threadId\" = 'thread_0'", {}
+    )
+    search = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId=persisted_user.id, search="hello")
+    )
+    assert [t["id"] for t in search.data] == ["thread_2", "thread_1"]
+
+    await data_layer.close()
+
+
+def test_sqlite_schema_rebuilds_the_search_indexes_once(tmp_path: Path):
+    schema = (Path(chainlit.data.__file__).parent / "sqlite_schema.sql").read_text()
+    search = "SELECT rowid FROM steps_fts WHERE steps_fts MATCH 'hello'"
+    with sqlite3.connect(tmp_path / "test_fts.sqlite") as conn:
+        conn.executescript(schema)
+        conn.execute("""INSERT INTO threads ("id") VALUES ('thread')""")
+        conn.execute(
+            """INSERT INTO steps ("id", "name", "type", "threadId", "output")
+            VALUES ('step_1', 'step', 'run', 'thread', 'Hello'),
+            ('step_2', 'step', 'run', 'thread', 'Goodbye')"""
+        )
+        # Leave a row out of the index, as a rebuild would bring it back
+        conn.execute(
+            """INSERT INTO steps_fts(steps_fts, rowid, "output")
+            SELECT 'delete', rowid, "output" FROM steps WHERE "id" = 'step_1'"""
+        )
+        conn.executescript(schema)
+        assert conn.execute(search).fetchall() == []
+
+        # Existing rows are indexed when the search tables are created
+        conn.execute("DROP TABLE steps_fts")
+        conn.executescript(schema)
+        assert conn.execute(search).fetchall() == [(1,)]
+
+
+async def test_get_all_user_threads_chunks_thread_ids(
+    test_user: User, data_layer: SQLAlchemyDataLayer, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr("chainlit.data.sql_alchemy.MAX_BOUND_PARAMETERS", 2)
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    for i in range(5):
+        await insert_thread_with_step(
+            data_layer,
+            persisted_user.id,
+            f"thread_{i}",
+            f"2024-01-0{i + 1}T00:00:00Z",
+            f"output {i}",
+        )
+
+    threads = await data_layer.get_all_user_threads(user_id=persisted_user.id)
+
+    assert threads is not None
+    assert len(threads) == 5
+    assert all(
+        [step["output"] for step in thread["steps"]] == [f"output {thread['id'][-1]}"]
+        for thread in threads
+    )
+
+
+async def test_sqlite_writer_groups_concurrent_writes(
+    test_user: User, data_layer: SQLAlchemyDataLayer
+):
+    assert data_layer.sqlite_writer
+    journal_mode = await data_layer.execute_sql("PRAGMA journal_mode", {})
+    assert journal_mode == [{"journal_mode": "wal"}]
+
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    results = await asyncio.gather(
+        *(
+            data_layer.update_thread(f"thread_{i}", user_id=persisted_user.id)
+            for i in range(20)
+        ),
+        # A failing statement doesn't roll back the others of its transaction
+        data_layer.execute_sql("INSERT INTO missing_table VALUES (1)", {}),
+    )
+
+    assert results[-1] is None
+    threads = await data_layer.execute_sql("SELECT COUNT(*) AS total FROM threads", {})
+    assert threads == [{"total": 20}]
+
+
+@pytest.mark.parametrize("failing_event", ["begin", "commit"])
+async def test_sqlite_writer_fails_every_caller_when_transaction_fails(
+    tmp_path: Path, failing_event: str
+):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writer.sqlite'}")
+    writer = SQLiteWriter(engine)
+    await writer.execute("CREATE TABLE items (id INTEGER)", {})
+
+    def fail(connection):
+        raise RuntimeError("disk I/O error")
+
+    event.listen(engine.sync_engine, failing_event, fail)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                writer.execute("INSERT INTO items VALUES (:id)", {"id": i})
+                for i in range(5)
+            ),
+            return_exceptions=True,
+        ),
+        5,
+    )
+
+    assert len(results) == 5
+    assert all(isinstance(result, RuntimeError) for result in results)
+    event.remove(engine.sync_engine, failing_event, fail)
+    await writer.close()
+
+
+async def test_unit_of_work_commits_once(
+    test_user: User, data_layer: SQLAlchemyDataLayer, monkeypatch: pytest.MonkeyPatch
+):
+    data_layer = SQLAlchemyDataLayer(
+        str(data_layer.engine.url),
+        storage_provider=data_layer.storage_provider,
+        sqlite_writer=False,
+    )
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+    for i in range(3):
+        await insert_thread_with_step(
+            data_layer,
+            persisted_user.id,
+            f"thread_{i}",
+            f"2024-01-0{i + 1}T00:00:00Z",
+            f"output {i}",
+        )
+    sessions = Mock(wraps=data_layer.async_session)
+    monkeypatch.setattr(data_layer, "async_session", sessions)
+
+    async with data_layer.unit_of_work():
+        for i in range(3):
+            await data_layer.update_thread(f"thread_{i}", name=f"renamed {i}")
+        # Spawned writes join the unit of work
+        asyncio.create_task(data_layer.update_thread("thread_0", name="renamed"))
+        assert sessions.call_count == 0
+
+    assert sessions.call_count == 1
+    thread = await data_layer.get_thread("thread_0")
+    assert thread
+    assert thread["name"] == "renamed"
+
+    async with data_layer.unit_of_work():
+        await data_layer.update_thread("thread_1", name="renamed")
+        # Reads commit the pending writes first
+        thread = await data_layer.get_thread("thread_1")
+        assert thread
+        assert thread["name"] == "renamed"
+
+    await data_layer.close()
+
+
+@pytest.mark.parametrize("sqlite_writer", [True, False])
+async def test_unit_of_work_is_atomic(
+    test_user: User, data_layer: SQLAlchemyDataLayer, sqlite_writer: bool
+):
+    data_layer = SQLAlchemyDataLayer(
+        str(data_layer.engine.url),
+        storage_provider=data_layer.storage_provider,
+        sqlite_writer=sqlite_writer,
+    )
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    insert = 'INSERT INTO threads ("id", "userId") VALUES (:id, :user_id)'
+
+    async with data_layer.unit_of_work():
+        await data_layer.execute_sql(
+            insert, {"id": "thread_a", "user_id": persisted_user.id}
+        )
+        await data_layer.execute_sql("INSERT INTO missing_table VALUES (1)", {})
+        await data_layer.execute_sql(
+            insert, {"id": "thread_b", "user_id": persisted_user.id}
+        )
+
+    # The failing statement rolled the others back
+    threads = await data_layer.execute_sql("SELECT COUNT(*) AS total FROM threads", {})
+    assert threads == [{"total": 0}]
+
+    async with data_layer.unit_of_work():
+        for thread_id in ("thread_a", "thread_b"):
+            await data_layer.execute_sql(
+                insert, {"id": thread_id, "user_id": persisted_user.id}
+            )
+
+    threads = await data_layer.execute_sql("SELECT COUNT(*) AS total FROM threads", {})
+    assert threads == [{"total": 2}]
+    await data_layer.close()
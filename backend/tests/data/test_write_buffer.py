@@ -0,0 +1,76 @@
+import asyncio
+from typing import Dict, List
+
+from chainlit.data.write_buffer import WriteBuffer, merge_non_null
+
+
+async def test_coalesces_writes_by_key():
+    batches: List[List[Dict]] = []
+
+    async def flush(items: List[Dict]):
+        batches.append(items)
+
+    buffer: WriteBuffer[Dict] = WriteBuffer(
+        flush, max_size=10, flush_interval=60, merge_fn=merge_non_null
+    )
+
+    await buffer.put("a", {"id": "a", "output": "", "parentId": "p"})
+    await buffer.put("b", {"id": "b", "output": "b"})
+    await buffer.put("a", {"id": "a", "output": "hello", "parentId": None})
+    assert len(buffer) == 2
+
+    await buffer.close()
+
+    assert batches == [
+        [
+            {"id": "b", "output": "b"},
+            {"id": "a", "output": "hello", "parentId": "p"},
+        ]
+    ]
+    assert len(buffer) == 0
+
+
+async def test_flushes_when_full():
+    batches: List[List[int]] = []
+
+    async def flush(items: List[int]):
+        batches.append(items)
+
+    buffer: WriteBuffer[int] = WriteBuffer(flush, max_size=2, flush_interval=60)
+
+    await buffer.put("a", 1)
+    assert batches == []
+    await buffer.put("b", 2)
+    assert batches == [[1, 2]]
+
+    await buffer.close()
+
+
+async def test_flushes_after_interval():
+    flushed = asyncio.Event()
+
+    async def flush(items: List[int]):
+        flushed.set()
+
+    buffer: WriteBuffer[int] = WriteBuffer(flush, max_size=10, flush_interval=0.01)
+
+    await buffer.put("a", 1)
+    await asyncio.wait_for(flushed.wait(), timeout=1)
+    assert len(buffer) == 0
+
+
+async def test_discard_and_failed_flush():
+    async def flush(items: List[int]):
+        raise RuntimeError("database unavailable")
+
+    buffer: WriteBuffer[int] = WriteBuffer(flush, max_size=10, flush_interval=60)
+
+    await buffer.put("a", 1)
+    await buffer.put("b", 2)
+    buffer.discard(lambda key, _: key == "a")
+    assert "a" not in buffer
+    assert "b" in buffer
+
+    # Errors are logged, the batch is dropped so the buffer stays bounded
+    await buffer.close()
+    assert len(buffer) == 0
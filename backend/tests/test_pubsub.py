@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import socketio
+from aiohttp import web
+
+import chainlit
+from chainlit.pubsub import get_client_manager
+
+# Another worker, in its own process, with no client connected
+WORKER = """
+import asyncio
+import sys
+
+import socketio
+
+
+async def main(url, sid):
+    manager = socketio.AsyncRedisManager(url, channel="chainlit:socketio", write_only=True)
+    await manager.emit("hello", "from another worker", room=sid)
+
+
+asyncio.run(main(*sys.argv[1:]))
+"""
+
+
+def test_get_client_manager(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("CHAINLIT_PUBSUB_URL", raising=False)
+    assert get_client_manager() is None
+
+    monkeypatch.setenv("CHAINLIT_PUBSUB_URL", "redis://localhost:6379/0")
+    manager = get_client_manager()
+    assert isinstance(manager, socketio.AsyncRedisManager)
+    assert manager.channel == "chainlit:socketio"
+
+
+async def test_events_reach_clients_of_other_workers(
+    redis_server, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("CHAINLIT_PUBSUB_URL", redis_server.url)
+    sio = socketio.AsyncServer(
+        async_mode="aiohttp", client_manager=get_client_manager()
+    )
+    app = web.Application()
+    sio.attach(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    connected: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @sio.on("connect")
+    async def connect(sid, environ, auth):
+        connected.set_result(sid)
+
+    client = socketio.AsyncClient()
+    received: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @client.on("hello")
+    async def hello(data):
+        received.set_result(data)
+
+    try:
+        await client.connect(f"http://127.0.0.1:{port}")
+        sid = await asyncio.wait_for(connected, 10)
+        # The server listens to the other workers from its first connection
+        while [b"SUBSCRIBE", b"chainlit:socketio"] not in redis_server.commands:
+            await asyncio.sleep(0.05)
+
+        worker = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            WORKER,
+            redis_server.url,
+            sid,
+            cwd=tmp_path,
+            env={**os.environ, "PYTHONPATH": str(Path(chainlit.__file__).parents[1])},
+        )
+        assert await asyncio.wait_for(worker.wait(), 60) == 0
+
+        assert await asyncio.wait_for(received, 10) == "from another worker"
+    finally:
+        await client.disconnect()
+        await sio.shutdown()
+        await runner.cleanup()
+        # The listener of the manager runs until the process exits
+        sio.manager.thread.cancel()
+        await asyncio.gather(sio.manager.thread, return_exceptions=True)
+        await sio.manager.pubsub.aclose()
+        await sio.manager.redis.aclose()
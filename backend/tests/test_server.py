@@ -1103,3 +1103,52 @@ def test_share_thread_endpoint_sets_flags(
     del _app.dependency_overrides[_get_current_user]
     data_mod._data_layer = None
     data_mod._data_layer_initialized = False
+
+
+@pytest.fixture
+def local_storage_client(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    from chainlit.data.storage_clients.local import LocalStorageClient
+
+    monkeypatch.setattr(
+        "chainlit.data.storage_clients.local._local_storage_client", None
+    )
+    return LocalStorageClient(root=str(tmp_path), secret="secret")
+
+
+async def test_get_storage_file(test_client: TestClient, local_storage_client):
+    uploaded = await local_storage_client.upload_file(
+        "threads/1/files/a",
+        b"0123456789",
+        mime="video/mp4",
+        content_disposition='attachment; filename="a.mp4"',
+    )
+
+    response = test_client.get(uploaded["url"])
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.headers["content-disposition"] == 'attachment; filename="a.mp4"'
+
+    response = test_client.get(uploaded["url"], headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+
+
+async def test_get_storage_file_invalid_signature(
+    test_client: TestClient, local_storage_client
+):
+    uploaded = await local_storage_client.upload_file("a", b"data")
+
+    response = test_client.get(uploaded["url"].replace("signature=", "signature=0"))
+    assert response.status_code == 403
+
+
+def test_get_storage_file_without_local_storage(
+    test_client: TestClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(
+        "chainlit.data.storage_clients.local._local_storage_client", None
+    )
+
+    response = test_client.get("/storage/a?expires=1&signature=0")
+    assert response.status_code == 404
@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+import chainlit.session_registry
+from chainlit.chat_context import chat_contexts
+from chainlit.config import config
+from chainlit.context import init_ws_context
+from chainlit.message import Message
+from chainlit.server import app
+from chainlit.session import WebsocketSession, ws_sessions_id, ws_sessions_sid
+from chainlit.session_registry import SessionRegistry, approximate_size
+from chainlit.user_session import user_sessions
+
+
+@pytest.fixture
+async def registry(monkeypatch: pytest.MonkeyPatch):
+    registry = SessionRegistry()
+    monkeypatch.setattr("chainlit.session_registry.session_registry", registry)
+    monkeypatch.setattr(config.project, "max_sessions", None)
+    monkeypatch.setattr(config.project, "max_sessions_memory", None)
+    yield registry
+    await registry.close()
+    for session_id in list(ws_sessions_id):
+        user_sessions.pop(session_id, None)
+        chat_contexts.pop(session_id, None)
+    ws_sessions_id.clear()
+    ws_sessions_sid.clear()
+
+
+def create_session(session_id: str, content: str = "") -> WebsocketSession:
+    session = WebsocketSession(
+        id=session_id,
+        socket_id=f"socket_{session_id}",
+        emit=lambda event, data: None,
+        emit_call=lambda event, data, timeout: None,
+        user_env={},
+        client_type="webapp",
+    )
+    user_sessions[session_id] = {"id": session_id, "history": [content]}
+    init_ws_context(session)
+    chat_contexts[session_id] = [Message(content=content)]
+    return session
+
+
+def test_approximate_size():
+    shared = object()
+    text = "x" * 1000
+
+    assert approximate_size([text]) > 1000
+    assert approximate_size({"a": [text], "b": {"c": text}}) < 2000
+    assert approximate_size(shared) == sys.getsizeof(shared)
+
+    cycle: list = []
+    cycle.append(cycle)
+    assert approximate_size(cycle) == sys.getsizeof(cycle)
+
+
+async def test_measure_session(registry: SessionRegistry):
+    session = create_session("session_a", "x" * 1000)
+    usage = registry.measure(session)
+
+    assert usage.chat_context > 1000
+    assert usage.user_session > 1000
+    assert registry.memory == usage.total
+
+    registry.forget(session.id)
+    assert registry.memory == 0
+
+
+async def test_evicts_least_recently_disconnected_sessions(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(config.project, "max_sessions", 2)
+    first, second = create_session("session_a"), create_session("session_b")
+    registry.mark_disconnected(second, 60)
+    registry.mark_disconnected(first, 60)
+
+    create_session("session_c")
+    await registry.enforce_limits()
+
+    assert list(ws_sessions_id) == ["session_a", "session_c"]
+    assert "session_b" not in user_sessions
+    assert "session_b" not in chat_contexts
+    assert registry.evicted == 1
+
+
+async def test_evicts_sessions_over_the_memory_budget(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch
+):
+    first = create_session("session_a", "x" * 10000)
+    second = create_session("session_b", "x" * 10000)
+    registry.measure(first)
+    registry.mark_disconnected(second, 60)
+    monkeypatch.setattr(config.project, "max_sessions_memory", 10000)
+
+    await registry.enforce_limits()
+
+    # Connected sessions are kept even over the budget
+    assert list(ws_sessions_id) == ["session_a"]
+    assert registry.memory == registry.usage["session_a"].total
+
+
+async def test_reconnected_sessions_are_not_evicted(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(config.project, "max_sessions", 1)
+    session = create_session("session_a")
+    registry.mark_disconnected(session, 60)
+    registry.mark_connected(session.id)
+
+    create_session("session_b")
+    await registry.enforce_limits()
+
+    assert list(ws_sessions_id) == ["session_a", "session_b"]
+
+
+async def test_expired_sessions_are_cleared_together(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setattr("chainlit.session_registry.EXPIRY_RESOLUTION", 0.05)
+    monkeypatch.setattr("chainlit.config.FILES_DIRECTORY", tmp_path)
+    first, second = create_session("session_a"), create_session("session_b")
+    first.files_dir.mkdir()
+    (first.files_dir / "file").write_text("content")
+    cleared = []
+    clear_sessions = chainlit.session_registry.clear_sessions
+
+    async def record_clear_sessions(sessions):
+        cleared.append([session.id for session in sessions])
+        await clear_sessions(sessions)
+
+    monkeypatch.setattr(
+        "chainlit.session_registry.clear_sessions", record_clear_sessions
+    )
+
+    registry.mark_disconnected(first, 0.1)
+    registry.mark_disconnected(second, 0.1)
+    create_session("session_c")
+    registry.mark_disconnected(ws_sessions_id["session_c"], 60)
+    await asyncio.sleep(0.3)
+
+    assert cleared == [["session_a", "session_b"]]
+    assert list(ws_sessions_id) == ["session_c"]
+    assert not first.files_dir.exists()
+    assert "session_a" not in user_sessions
+    assert registry.deadlines.keys() == {"session_c"}
+
+
+async def test_reconnecting_cancels_the_expiry(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr("chainlit.session_registry.EXPIRY_RESOLUTION", 0.05)
+    session = create_session("session_a")
+    registry.mark_disconnected(session, 0.05)
+    registry.mark_connected(session.id)
+    await asyncio.sleep(0.2)
+
+    assert list(ws_sessions_id) == ["session_a"]
+
+    # The task wakes up for an expiry earlier than the one it waits for
+    other = create_session("session_b")
+    registry.mark_disconnected(session, 60)
+    registry.mark_disconnected(other, 0.05)
+    await asyncio.sleep(0.2)
+
+    assert list(ws_sessions_id) == ["session_a"]
+
+
+async def test_admin_sessions_endpoint(
+    registry: SessionRegistry, monkeypatch: pytest.MonkeyPatch
+):
+    create_session("session_a", "x" * 1000)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        assert (await client.get("/admin/sessions")).status_code == 404
+
+        monkeypatch.setenv("CHAINLIT_ADMIN_TOKEN", "admin")
+        assert (await client.get("/admin/sessions")).status_code == 401
+        response = await client.get(
+            "/admin/sessions", headers={"Authorization": "Bearer other"}
+        )
+        assert response.status_code == 401
+
+        response = await client.get(
+            "/admin/sessions", headers={"Authorization": "Bearer admin"}
+        )
+        assert response.status_code == 200
+        report = response.json()
+        assert report["sessions"] == 1
+        assert report["items"][0]["id"] == "session_a"
+        assert report["items"][0]["connected"]
+        assert report["items"][0]["messages"] == 1
+        assert report["items"][0]["memory"]["chat_context"] > 1000
+        assert registry.memory == report["memory"]
@@ -0,0 +1,241 @@
+import asyncio
+
+import pytest
+from redis.exceptions import RedisError
+
+from chainlit.chat_context import chat_contexts
+from chainlit.context import init_ws_context
+from chainlit.message import Message
+from chainlit.session import WebsocketSession, ws_sessions_id, ws_sessions_sid
+from chainlit.session_registry import clear_session
+from chainlit.session_store import (
+    WORKER_ID,
+    InMemorySessionStore,
+    RedisSessionStore,
+    get_session_store,
+    load_session_state,
+    save_session,
+)
+from chainlit.user_session import user_sessions
+
+
+@pytest.fixture
+async def redis_store(redis_server, monkeypatch: pytest.MonkeyPatch):
+    store = RedisSessionStore(redis_server.url)
+    monkeypatch.setattr("chainlit.session_store._session_store", store)
+    yield store
+    await store.close()
+
+
+@pytest.fixture
+def websocket_session():
+    session = WebsocketSession(
+        id="session_id",
+        socket_id="socket_id",
+        emit=lambda event, data: None,
+        emit_call=lambda event, data, timeout: None,
+        user_env={"OPENAI_API_KEY": "key"},
+        client_type="webapp",
+    )
+    yield session
+    ws_sessions_id.pop(session.id, None)
+    ws_sessions_sid.clear()
+    user_sessions.pop(session.id, None)
+    chat_contexts.pop(session.id, None)
+
+
+async def test_in_memory_store_expires_states():
+    store = InMemorySessionStore()
+    await store.set("session_id", {"id": "session_id"}, ttl=60)
+    await store.set("expired_id", {"id": "expired_id"}, ttl=0)
+
+    assert await store.get("session_id") == {"id": "session_id"}
+    assert await store.get("expired_id") is None
+
+    await store.delete("session_id")
+    assert await store.get("session_id") is None
+
+
+async def test_in_memory_store_deletes_owned_states():
+    store = InMemorySessionStore()
+    await store.set("session_id", {"owner": "worker"}, ttl=60)
+
+    await store.delete("session_id", owner="other")
+    assert await store.get("session_id") == {"owner": "worker"}
+
+    await store.delete("session_id", owner="worker")
+    assert await store.get("session_id") is None
+
+
+async def test_in_memory_store_purges_expired_states_on_write():
+    store = InMemorySessionStore()
+    store.purge_interval = 0
+    await store.set("expired_id", {"id": "expired_id"}, ttl=0)
+    await store.set("session_id", {"id": "session_id"}, ttl=60)
+
+    assert list(store._states) == ["session_id"]
+
+
+async def test_sessions_are_not_saved_without_store(
+    websocket_session: WebsocketSession, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.delenv("CHAINLIT_SESSION_STORE_URL", raising=False)
+    monkeypatch.setattr("chainlit.session_store._session_store", None)
+    await save_session(websocket_session)
+
+    assert get_session_store() is None
+    assert await load_session_state(websocket_session.id) is None
+
+
+async def test_cleared_sessions_are_deleted_from_store(
+    websocket_session: WebsocketSession, monkeypatch: pytest.MonkeyPatch
+):
+    store = InMemorySessionStore()
+    monkeypatch.setattr("chainlit.session_store._session_store", store)
+    await save_session(websocket_session)
+    assert await store.get(websocket_session.id)
+
+    await clear_session(websocket_session)
+
+    assert await store.get(websocket_session.id) is None
+
+
+async def test_sessions_taken_over_are_kept_in_store(
+    websocket_session: WebsocketSession, monkeypatch: pytest.MonkeyPatch
+):
+    store = InMemorySessionStore()
+    monkeypatch.setattr("chainlit.session_store._session_store", store)
+    await save_session(websocket_session)
+    # The client reconnected to another worker, which saved the session since
+    state = {**websocket_session.to_state(), "owner": "other_worker"}
+    await store.set(websocket_session.id, state, ttl=60)
+
+    # The stale copy of this worker expires
+    await clear_session(websocket_session)
+
+    assert await store.get(websocket_session.id) == state
+
+
+async def test_redis_store_round_trip(redis_store: RedisSessionStore, redis_server):
+    await redis_store.set("session_id", {"values": [1, "é"]}, ttl=60)
+
+    assert await redis_store.get("session_id") == {"values": [1, "é"]}
+    assert await redis_store.get("unknown_id") is None
+    assert [b"AUTH", b"secret"] in redis_server.commands
+    assert [b"SELECT", b"2"] in redis_server.commands
+    set_command = next(c for c in redis_server.commands if c[0] == b"SET")
+    assert set_command[1] == b"chainlit:session:session_id"
+    assert set_command[3:] == [b"EX", b"60"]
+
+    await redis_store.delete("session_id")
+    assert await redis_store.get("session_id") is None
+
+
+async def test_redis_store_deletes_owned_states(redis_store: RedisSessionStore):
+    await redis_store.set("session_id", {"owner": "worker"}, ttl=60)
+
+    await redis_store.delete("session_id", owner="other")
+    assert await redis_store.get("session_id") == {"owner": "worker"}
+
+    await redis_store.delete("session_id", owner="worker")
+    assert await redis_store.get("session_id") is None
+
+
+async def test_redis_store_keeps_states_saved_while_deleting(
+    redis_store: RedisSessionStore, redis_server
+):
+    await redis_store.set("session_id", {"owner": "worker"}, ttl=60)
+    get = redis_server.reply
+
+    def take_over_after_get(command, writer, authenticated):
+        reply = get(command, writer, authenticated)
+        if command[0] == b"GET":
+            # Another worker saves the session between the read and the delete
+            redis_server.data[command[1]] = (b'{"owner": "other"}', None)
+            redis_server.touch(command[1])
+        return reply
+
+    redis_server.reply = take_over_after_get
+    await redis_store.delete("session_id", owner="worker")
+    redis_server.reply = get
+
+    assert await redis_store.get("session_id") == {"owner": "other"}
+
+
+async def test_redis_store_raises_errors(redis_server):
+    store = RedisSessionStore(redis_server.url.replace("secret", "wrong"))
+
+    with pytest.raises(RedisError):
+        await store.get("session_id")
+    await store.close()
+
+
+async def test_session_state_round_trip(websocket_session: WebsocketSession):
+    init_ws_context(websocket_session)
+    websocket_session.has_first_interaction = True
+    websocket_session.chat_settings = {"model": "gpt-4o"}
+    user_sessions[websocket_session.id] = {
+        "counter": 3,
+        "lock": asyncio.Lock(),
+        "user": None,
+    }
+    chat_contexts[websocket_session.id] = [
+        Message(content="Hello", author="User", type="user_message")
+    ]
+
+    state = websocket_session.to_state()
+
+    assert state["user_session"] == {"counter": 3}
+    assert [step["output"] for step in state["chat_context"]] == ["Hello"]
+
+    # Another worker rebuilds the session from the snapshot
+    ws_sessions_id.clear()
+    user_sessions.clear()
+    chat_contexts.clear()
+    session = WebsocketSession.from_state(
+        state,
+        socket_id="new_socket_id",
+        emit=lambda event, data: None,
+        emit_call=lambda event, data, timeout: None,
+    )
+
+    assert WebsocketSession.get("new_socket_id") is session
+    assert session.restored
+    assert session.thread_id == websocket_session.thread_id
+    assert session.thread_id_to_resume is None
+    assert session.has_first_interaction
+    assert session.user_env == {"OPENAI_API_KEY": "key"}
+    assert session.chat_settings == {"model": "gpt-4o"}
+    assert user_sessions[session.id] == {"counter": 3}
+    assert [message.content for message in chat_contexts[session.id]] == ["Hello"]
+    assert chat_contexts[session.id][0].thread_id == session.thread_id
+
+
+async def test_reconnect_hydrates_session_from_store(
+    redis_store: RedisSessionStore, websocket_session: WebsocketSession
+):
+    from chainlit.socket import connect
+
+    user_sessions[websocket_session.id] = {"counter": 3}
+    state = {**websocket_session.to_state(), "owner": "other_worker"}
+    await redis_store.set(websocket_session.id, state, ttl=60)
+
+    # The session only lives in the store, as if it had been created elsewhere
+    ws_sessions_id.clear()
+    ws_sessions_sid.clear()
+    user_sessions.clear()
+
+    assert await connect(
+        "new_socket_id", {}, {"sessionId": websocket_session.id, "clientType": "webapp"}
+    )
+
+    session = WebsocketSession.get("new_socket_id")
+    assert session
+    assert session.id == websocket_session.id
+    assert session.restored
+    assert session.thread_id == websocket_session.thread_id
+    assert user_sessions[session.id] == {"counter": 3}
+    # This worker owns the snapshot from now on
+    stored = await redis_store.get(session.id)
+    assert stored
+    assert stored["owner"] == WORKER_ID
@@ -0,0 +1,32 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from chainlit.socket import persist_user_session
+
+
+async def test_persist_user_session_resends_keys_of_failed_writes(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    data_layer = Mock(merges_thread_metadata=True)
+    data_layer.update_thread = AsyncMock(side_effect=[False, True, True])
+    monkeypatch.setattr("chainlit.socket.get_data_layer", lambda: data_layer)
+    session = Mock(thread_id="thread_id", persisted_metadata={})
+    session.to_persistable.return_value = {"chat_profile": "a", "counter": 1}
+
+    await persist_user_session(session)
+    assert session.persisted_metadata == {}
+
+    await persist_user_session(session)
+    assert session.persisted_metadata == {"chat_profile": "a", "counter": 1}
+
+    session.to_persistable.return_value = {"chat_profile": "a", "counter": 2}
+    await persist_user_session(session)
+
+    assert [
+        call.kwargs["metadata"] for call in data_layer.update_thread.await_args_list
+    ] == [
+        {"chat_profile": "a", "counter": 1},
+        {"chat_profile": "a", "counter": 1},
+        {"counter": 2},
+    ]
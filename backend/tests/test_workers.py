@@ -0,0 +1,167 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import chainlit
+from chainlit.cli.workers import get_affinity_key
+
+SUPERVISOR = """
+import os
+import sys
+
+import uvicorn
+
+from chainlit.cli.workers import Supervisor
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            else:
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["path"] == "/exit":
+        os._exit(1)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+
+config = uvicorn.Config(app, host="127.0.0.1", port=int(sys.argv[1]), log_level="error")
+Supervisor(config, 2).run()
+"""
+
+
+def test_get_affinity_key():
+    assert (
+        get_affinity_key(
+            b"GET /ws/socket.io/?EIO=4&transport=polling HTTP/1.1\r\n"
+            b"Host: localhost\r\n"
+            b"Cookie: theme=dark; X-Chainlit-Session-id=abc\r\n\r\n"
+        )
+        == "abc"
+    )
+    assert (
+        get_affinity_key(
+            b"GET /ws/socket.io/?sessionId=def&EIO=4 HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        )
+        == "def"
+    )
+    assert (
+        get_affinity_key(b"POST /project/file?session_id=ghi HTTP/1.1\r\n\r\n") == "ghi"
+    )
+    # The socket of a tab wins over the cookie shared by the browser tabs
+    assert (
+        get_affinity_key(
+            b"GET /ws/socket.io/?sessionId=tab&EIO=4 HTTP/1.1\r\n"
+            b"Cookie: X-Chainlit-Session-id=browser\r\n\r\n"
+        )
+        == "tab"
+    )
+    assert get_affinity_key(b"GET /project/settings HTTP/1.1\r\n\r\n") is None
+
+
+@pytest.fixture
+def supervisor(tmp_path: Path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, "-c", SUPERVISOR, str(port)],
+        cwd=tmp_path,
+        env={
+            **os.environ,
+            "PYTHONPATH": str(Path(chainlit.__file__).parents[1]),
+            "CHAINLIT_AUTH_SECRET": "secret",
+        },
+    )
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            get(port, "/")
+            break
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+    yield port
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(30) == 0
+
+
+def get(port: int, path: str, cookie: str = "") -> str:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request("GET", path, headers={"Cookie": cookie} if cookie else {})
+        return connection.getresponse().read().decode()
+    finally:
+        connection.close()
+
+
+def test_requests_of_a_session_stick_to_a_worker(supervisor: int):
+    for session_id in ("session_a", "session_b", "session_c"):
+        cookie = f"X-Chainlit-Session-id={session_id}"
+        pids = {get(supervisor, "/", cookie) for _ in range(5)}
+        pids |= {get(supervisor, f"/?sessionId={session_id}") for _ in range(5)}
+        assert len(pids) == 1
+
+    # Requests without session are spread over the workers
+    assert len({get(supervisor, "/") for _ in range(4)}) == 2
+
+
+def test_sessions_are_spread_over_the_workers(supervisor: int):
+    pids = {}
+    for i in range(20):
+        session_id = f"session_{i}"
+        pids[session_id] = get(supervisor, "/", f"X-Chainlit-Session-id={session_id}")
+        assert get(supervisor, f"/?sessionId={session_id}") == pids[session_id]
+
+    assert len(set(pids.values())) == 2
+
+
+def test_kept_alive_connections_are_routed_per_request(supervisor: int):
+    pids = {
+        session_id: get(supervisor, f"/?sessionId={session_id}")
+        for session_id in ("session_a", "session_b", "session_c", "session_d")
+    }
+    assert len(set(pids.values())) == 2
+
+    # A client, or a proxy, reusing its connection for several sessions
+    connection = http.client.HTTPConnection("127.0.0.1", supervisor, timeout=10)
+    try:
+        for session_id in [*pids, *pids]:
+            connection.request("GET", f"/?sessionId={session_id}")
+            response = connection.getresponse()
+            assert response.getheader("Connection") == "close"
+            assert response.read().decode() == pids[session_id]
+    finally:
+        connection.close()
+
+
+def test_dead_workers_are_restarted(supervisor: int):
+    pids = {get(supervisor, "/") for _ in range(4)}
+
+    with pytest.raises(http.client.RemoteDisconnected):
+        get(supervisor, "/exit")
+
+    deadline = time.monotonic() + 10
+    new_pids = pids
+    while new_pids == pids and time.monotonic() < deadline:
+        time.sleep(0.2)
+        new_pids = {get(supervisor, "/") for _ in range(4)}
+
+    assert len(new_pids) == 2
+    assert len(new_pids & pids) == 1
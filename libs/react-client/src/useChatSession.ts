@@ -118,6 +118,8 @@ const useChatSession = () => {
         path,
         withCredentials: true,
         transports,
+        // Lets a multi-worker server route the requests of the session
+        query: { sessionId },
         auth: {
           clientType: client.type,
           sessionId,